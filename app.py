@@ -1,27 +1,62 @@
-from flask import Flask, render_template, request, redirect, flash, send_file, jsonify, session, url_for
+from flask import (Flask, render_template, request, redirect, flash, send_file, jsonify, session, url_for,
+                   stream_with_context)
 import os
 import json
-from datetime import datetime
-from invoice_generator import process_invoices, send_invoices_email
-import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import urlencode
+from invoice_generator import zip_invoices
+from batches import current_batch_dir
+from generation import EXCEL_FILE, OUTPUT_FOLDER, RENDER_MODE
+import invoice_index
+import jobs
+import storage
 from functools import wraps
 from werkzeug.utils import secure_filename
-import shutil
+import tempfile
 from database import (
-    get_all_invoices,
+    ensure_schema,
     get_invoice_stats,
     update_invoice_status,
-    delete_invoice
+    update_invoice_statuses,
+    delete_invoice,
+    delete_invoices,
+    get_invoice_changes,
+    get_invoice_events,
+    get_render_batch_progress,
+    retry_render_batch,
+    VALID_STATUSES
 )
 from flask import send_from_directory
+from reports import REPORTS, run_report, to_csv
+from export import FORMATS, ledger_filters, stream_ledger
+from maintenance import report as maintenance_report
+from scheduler import start_background_scheduler
+from logs import get_logger
+import metrics
+import cache
+from profiling import PROFILE_FOLDER, PROFILE_GENERATION, latest_summary, load_summary
+from reconcile import reconcile_upload
 
 app = Flask(__name__)
 app.secret_key = 'velvet-lavender-secret-key-2025-secure'
+logger = get_logger(__name__)
 
-# Configuration
-EXCEL_FILE = 'Anainvoices.xlsx'
-LOGO_PATH = 'image.jpg'
-OUTPUT_FOLDER = 'generated_invoices'
+# Request latency and /metrics when METRICS_ENABLED is set
+metrics.init_app(app)
+
+
+@app.before_request
+def _start_up():
+    """Apply the database schema and start the scheduler on the first request (flag checks afterwards)
+
+    Done here rather than at import, so importing app (tests, asgi.py,
+    scripts) opens no database and starts no thread.
+    """
+    ensure_schema()
+    start_background_scheduler()
+
+# Configuration - file locations and RENDER_MODE are shared with velvet.py through generation
 EMAIL_CONFIG_FILE = 'email_config.json'  # Store email config persistently
 
 # ====================================================
@@ -33,13 +68,11 @@ LOGIN_PASSWORD = 'anamoux'
 # ====================================================
 
 def load_email_config():
-    """Load email configuration from file"""
-    if os.path.exists(EMAIL_CONFIG_FILE):
-        try:
-            with open(EMAIL_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
+    """Load email configuration from storage"""
+    try:
+        return json.loads(storage.get_bytes(EMAIL_CONFIG_FILE))
+    except:
+        pass
     return {
         'sender_email': '',
         'sender_password': '',
@@ -49,13 +82,13 @@ def load_email_config():
 
 
 def save_email_config(config):
-    """Save email configuration to file"""
+    """Save email configuration to storage"""
     try:
-        with open(EMAIL_CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=4)
+        storage.put_bytes(EMAIL_CONFIG_FILE, json.dumps(config, indent=4).encode())
+        cache.invalidate('config')
         return True
     except Exception as e:
-        print(f"Error saving config: {e}")
+        logger.error("Error saving config: %s", e)
         return False
 
 
@@ -78,6 +111,36 @@ def login_required(f):
 
 # Add this with other configurations (after OUTPUT_FOLDER)
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+INVOICES_PER_PAGE = 200
+
+
+def _excel_cache_key():
+    """Cache key that changes whenever the workbook is replaced (on any node)"""
+    return f'count:{storage.version(EXCEL_FILE)}'
+
+
+def _count_excel_rows():
+    """Number of invoice rows in the workbook"""
+    import io
+    import pandas as pd
+    return len(pd.read_excel(io.BytesIO(storage.get_bytes(EXCEL_FILE))))
+
+
+def _validate_workbook_bytes(data):
+    """Validation report for an uploaded workbook"""
+    import io
+    import pandas as pd
+    from validation import validate_workbook
+    return validate_workbook(pd.read_excel(io.BytesIO(data)))
+
+
+def _send_stored(key, **kwargs):
+    """Send a stored artifact straight from disk or from object storage"""
+    path = storage.local_path(key)
+    if path:
+        return send_file(os.path.abspath(path), **kwargs)
+    import io
+    return send_file(io.BytesIO(storage.get_bytes(key)), download_name=os.path.basename(key), **kwargs)
 
 
 def allowed_file(filename):
@@ -117,12 +180,13 @@ def logout():
 @login_required
 def index():
     """Main page - protected by login"""
-    # Reload email config from file
+    # Email config is re-read only after it changes (the version covers other nodes)
     global email_config
-    email_config = load_email_config()
+    email_config = cache.get_or_compute('config', f'email:{storage.version(EMAIL_CONFIG_FILE)}',
+                                        load_email_config)
 
     # Check if Excel file exists
-    excel_exists = os.path.exists(EXCEL_FILE)
+    excel_exists = storage.exists(EXCEL_FILE)
 
     # Get current date info
     today = datetime.now()
@@ -132,15 +196,16 @@ def index():
     # Count existing invoices
     invoice_count = 0
     if excel_exists:
-        import pandas as pd
-        df = pd.read_excel(EXCEL_FILE)
-        invoice_count = len(df)
+        invoice_count = cache.get_or_compute('excel', _excel_cache_key(), _count_excel_rows)
 
     # Get just the filename (not the full path)
     excel_filename = os.path.basename(EXCEL_FILE)
 
     # Get invoice statistics
-    stats = get_invoice_stats()
+    stats = cache.get_or_compute('invoices', 'stats', get_invoice_stats)
+
+    # Outcome of the newest batch left to the render workers
+    render_batch = get_render_batch_progress() if RENDER_MODE == 'queue' else None
 
     return render_template('index.html',
                            excel_exists=excel_exists,
@@ -149,7 +214,9 @@ def index():
                            current_month=current_month,
                            invoice_count=invoice_count,
                            email_config=email_config,
-                           stats=stats)  # Add this line
+                           stats=stats,
+                           render_batch=render_batch,
+                           profile=latest_summary())
 
 
 @app.route('/configure-email', methods=['POST'])
@@ -202,38 +269,59 @@ def reset_email():
 def generate():
     """Generate all invoices with template selection"""
     send_email = request.form.get('send_email') == 'on'
+    profile_run = PROFILE_GENERATION or request.form.get('profile') == 'on'
     template = 'classic'  # Always use classic
 
     try:
-        # Clear old PDFs before generating new ones
-        if os.path.exists(OUTPUT_FOLDER):
-            for file in os.listdir(OUTPUT_FOLDER):
-                if file.endswith('.pdf'):
-                    try:
-                        os.remove(os.path.join(OUTPUT_FOLDER, file))
-                    except:
-                        pass
-
-        # Generate invoices with selected template
-        pdf_files = process_invoices(
-            EXCEL_FILE,
-            OUTPUT_FOLDER,
-            LOGO_PATH,
-            email_config if send_email else None,
-            template=template
-        )
-
-        flash(f'✅ Successfully generated {len(pdf_files)} invoice(s) using {template.title()} template!', 'success')
-
-        if send_email and email_config.get('configured') and email_config['sender_email']:
-            today = datetime.now()
-            month_year = f"{today.strftime('%B')} {today.year}"
-            send_invoices_email(pdf_files, email_config['recipient_email'], month_year, email_config)
-            flash(f'📧 Invoices sent to {email_config["recipient_email"]}', 'success')
+        # Runs here, or on the node already generating once it is done
+        job = jobs.submit('generate', {'send_email': send_email, 'profile': profile_run, 'template': template})
+
+        if job['status'] == 'queued':
+            flash(f'⏳ Another generation is running - job {job["id"]} is queued and will run right after it',
+                  'success')
+        elif job['status'] == 'failed':
+            flash(f'❌ Error: {job["error"]}', 'error')
+        elif job['result'].get('render_batch'):
+            result = job['result']
+            flash(f'✅ Queued {result["generated"]} invoice(s) for the render workers '
+                  f'(batch {result["render_batch"]}) - they appear once every PDF is rendered', 'success')
+        else:
+            result = job['result']
+            flash(f'✅ Successfully generated {result["generated"]} invoice(s) using {template.title()} template!',
+                  'success')
+            if result.get('profile_id'):
+                flash(f'🔬 Profile saved: {result["profile_id"]} - see the hotspots below', 'success')
+            if result.get('emailed_to'):
+                flash(f'📧 Invoices sent to {result["emailed_to"]}', 'success')
 
     except Exception as e:
         flash(f'❌ Error: {str(e)}', 'error')
+    finally:
+        # The workbook was rewritten with the new invoice numbers
+        cache.invalidate('excel')
+
+    return redirect(url_for('index'))
 
+
+@app.route('/api/render-batches/<batch_id>')
+@login_required
+def render_batch_progress(batch_id):
+    """Progress of a batch rendered by worker.py"""
+    progress = get_render_batch_progress(batch_id)
+    if progress is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    return jsonify(progress)
+
+
+@app.route('/render-batches/<batch_id>/retry', methods=['POST'])
+@login_required
+def retry_render_batch_route(batch_id):
+    """Queue the failed tasks of a partial or failed batch again"""
+    requeued = retry_render_batch(batch_id)
+    if requeued:
+        flash(f'🔁 {requeued} failed invoice(s) of batch {batch_id} queued for the render workers again', 'success')
+    else:
+        flash(f'❌ Batch {batch_id} has no failed invoices', 'error')
     return redirect(url_for('index'))
 
 
@@ -241,29 +329,30 @@ def generate():
 @login_required
 def download_all():
     """Download all generated PDFs as ZIP"""
-    if not os.path.exists(OUTPUT_FOLDER):
+    # Published batches never change, so the ZIP is built once per batch
+    current_folder = current_batch_dir(OUTPUT_FOLDER)
+    pdf_keys = [key for key in storage.list_keys(current_folder)
+                if key.endswith('.pdf') and key.count('/') == current_folder.count('/') + 1]
+    if not pdf_keys:
         flash('❌ No invoices generated yet!', 'error')
         return redirect(url_for('index'))
 
-    # Create ZIP file
-    zip_filename = f"Invoices_{datetime.now().strftime('%Y%m%d')}.zip"
-    zip_path = os.path.join(OUTPUT_FOLDER, zip_filename)
-
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for file in os.listdir(OUTPUT_FOLDER):
-            if file.endswith('.pdf'):
-                zipf.write(os.path.join(OUTPUT_FOLDER, file), file)
+    zip_key = f"{current_folder}/Invoices_{datetime.now().strftime('%Y%m%d')}.zip"
+    if not storage.exists(zip_key):
+        with storage.local_copies(pdf_keys) as pdf_files, tempfile.TemporaryDirectory() as workdir:
+            zip_path = zip_invoices(pdf_files, os.path.join(workdir, os.path.basename(zip_key)))
+            storage.put_file(zip_key, zip_path)
 
-    return send_file(zip_path, as_attachment=True)
+    return _send_stored(zip_key, as_attachment=True)
 
 
 @app.route('/preview/<filename>')
 @login_required
 def preview(filename):
     """Preview a specific PDF"""
-    pdf_path = os.path.join(OUTPUT_FOLDER, filename)
-    if os.path.exists(pdf_path):
-        return send_file(pdf_path)
+    pdf_key = f'{current_batch_dir(OUTPUT_FOLDER)}/{filename}'
+    if storage.exists(pdf_key):
+        return _send_stored(pdf_key)
     return "PDF not found", 404
 
 
@@ -271,7 +360,16 @@ def preview(filename):
 @login_required
 def preview_pdf(filename):
     """Serve PDF for preview"""
-    return send_from_directory(OUTPUT_FOLDER, filename)
+    return preview(filename)
+
+
+@app.route('/profiles/<job_id>.prof')
+@login_required
+def download_profile(job_id):
+    """Download a stored cProfile file"""
+    if not load_summary(job_id):
+        return "Profile not found", 404
+    return send_from_directory(os.path.abspath(PROFILE_FOLDER), f'{job_id}.prof', as_attachment=True)
 
 
 @app.route('/upload-excel', methods=['POST'])
@@ -290,15 +388,29 @@ def upload_excel():
 
     if file and allowed_file(file.filename):
         try:
-            # Backup old file if exists
-            if os.path.exists(EXCEL_FILE):
-                backup_name = f"Ana-s-invoices-backup-{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                shutil.copy(EXCEL_FILE, backup_name)
-
-            # Save new file
-            file.save(EXCEL_FILE)
-            flash('✅ Excel file uploaded successfully!', 'success')
-
+            data = file.read()
+            # Refuse a workbook that generation would reject, before it replaces the current one
+            report = _validate_workbook_bytes(data)
+            if report['errors']:
+                from validation import format_report
+                flash(f'❌ Workbook not uploaded: {format_report(report)}', 'error')
+                return redirect(url_for('index'))
+
+            # A generation on any node rewrites the workbook - hold its job slot while replacing it
+            with jobs.exclusive('generate', {'action': 'upload-excel'}):
+                # Backup old file if exists
+                if storage.exists(EXCEL_FILE):
+                    backup_name = f"Ana-s-invoices-backup-{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                    storage.copy(EXCEL_FILE, backup_name)
+
+                # Save new file
+                storage.put_bytes(EXCEL_FILE, data)
+            cache.invalidate('excel')
+            warnings = ''.join(f" ⚠️ Row {w['row']}: {w['message']}" for w in report['warnings'][:5])
+            flash(f'✅ Excel file uploaded successfully!{warnings}', 'success')
+
+        except jobs.JobRunning:
+            flash('⏳ A generation is running - upload the workbook again once it has finished', 'error')
         except Exception as e:
             flash(f'❌ Error uploading file: {str(e)}', 'error')
     else:
@@ -312,32 +424,142 @@ def upload_excel():
 def delete_excel():
     """Delete current Excel file"""
     try:
-        if os.path.exists(EXCEL_FILE):
-            # Create backup before deleting
-            backup_name = f"Ana-s-invoices-deleted-{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            shutil.copy(EXCEL_FILE, backup_name)
-            os.remove(EXCEL_FILE)
+        with jobs.exclusive('generate', {'action': 'delete-excel'}):
+            deleted = storage.exists(EXCEL_FILE)
+            if deleted:
+                # Create backup before deleting
+                backup_name = f"Ana-s-invoices-deleted-{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                storage.copy(EXCEL_FILE, backup_name)
+                storage.delete(EXCEL_FILE)
+
+        if deleted:
+            cache.invalidate('excel')
             flash('✅ Excel file removed. Backup created.', 'success')
         else:
             flash('❌ No Excel file to delete', 'error')
+    except jobs.JobRunning:
+        flash('⏳ A generation is running - delete the workbook once it has finished', 'error')
     except Exception as e:
         flash(f'❌ Error deleting file: {str(e)}', 'error')
 
     return redirect(url_for('index'))
 
 
+def invoice_list_args(args):
+    """(page, status, search, sort) from the query string of the invoice list"""
+    try:
+        page = max(int(args.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    status = args.get('status') if args.get('status') in VALID_STATUSES else None
+    search = (args.get('q') or '').strip() or None
+    sort = args.get('sort') if args.get('sort') in invoice_index.SORTS else 'newest'
+    return page, status, search, sort
+
+
+def list_invoices_page(args):
+    """(page, records on it, number matching, filters) for the invoice list"""
+    page, status, search, sort = invoice_list_args(args)
+    invoices_list, total = invoice_index.list_invoices(INVOICES_PER_PAGE, (page - 1) * INVOICES_PER_PAGE,
+                                                       status, search, sort)
+    filters = {name: value for name, value in (('status', status), ('q', search), ('sort', sort))
+               if value and value != 'newest'}
+    return page, invoices_list, total, filters
+
+
 @app.route('/invoices')
 @login_required
 def invoices():
     """Invoice list page with status management"""
-    invoices_list = get_all_invoices()
-    stats = get_invoice_stats()
+    page, invoices_list, total, filters = list_invoices_page(request.args)
+    stats = cache.get_or_compute('invoices', 'stats', get_invoice_stats)
 
     return render_template('invoices.html',
                            invoices=invoices_list,
+                           total_invoices=total,
+                           page=page,
+                           pages=max((total + INVOICES_PER_PAGE - 1) // INVOICES_PER_PAGE, 1),
+                           filters=filters,
+                           filter_query=urlencode(filters),
                            stats=stats)
 
 
+def invoices_page_json(invoices_list, total, page):
+    """Body of /api/invoices"""
+    return {
+        'invoices': [invoice.as_dict() for invoice in invoices_list],
+        'total': total,
+        'page': page,
+        'pages': max((total + INVOICES_PER_PAGE - 1) // INVOICES_PER_PAGE, 1),
+    }
+
+
+@app.route('/api/invoices')
+@login_required
+def invoices_api():
+    """One page of invoices as JSON; status, q (invoice number or client) and sort filter it"""
+    page, invoices_list, total, _ = list_invoices_page(request.args)
+    return jsonify(invoices_page_json(invoices_list, total, page))
+
+
+@app.route('/api/stats')
+@login_required
+def stats_api():
+    """Dashboard invoice statistics as JSON"""
+    return jsonify(cache.get_or_compute('invoices', 'stats', get_invoice_stats))
+
+
+# Changes per database round trip while streaming /api/changes
+CHANGES_PAGE_SIZE = 500
+
+
+def _json_value(value):
+    """json.dumps default for Postgres dates and decimals"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+@app.route('/api/changes')
+@login_required
+def changes_api():
+    """Invoices written, deleted or archived after ?since=<cursor>, streamed as NDJSON
+
+    One line per change ({"seq", "op": "upsert", "invoice"}, {"seq", "op":
+    "delete", "invoice_id", "invoice_number", "deleted_at"} or {"seq", "op":
+    "archive", "invoice_id", "invoice_number", "archived_at"}), oldest first,
+    then a last line {"cursor", "more"}. Pass that cursor as since on
+    the next call; since=0 returns every invoice.
+    """
+    since = max(request.args.get('since', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 10000, type=int), 1), 100000)
+
+    def stream():
+        cursor, sent, more = since, 0, True
+        while more and sent < limit:
+            changes, cursor, more = get_invoice_changes(cursor, min(CHANGES_PAGE_SIZE, limit - sent))
+            for change in changes:
+                yield json.dumps(change, default=_json_value) + '\n'
+            sent += len(changes)
+        yield json.dumps({'cursor': cursor, 'more': more}) + '\n'
+
+    return app.response_class(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/invoices/<invoice_number>/events')
+@login_required
+def invoice_events_api(invoice_number):
+    """Status history of one invoice (number with or without the leading #), oldest first"""
+    if not invoice_number.startswith('#'):
+        invoice_number = f'#{invoice_number}'
+    events = get_invoice_events(invoice_number)
+    if events is None:
+        return jsonify({'error': f'Invoice {invoice_number} not found'}), 404
+    return jsonify({'invoice_number': invoice_number, 'events': events})
+
+
 @app.route('/update-status', methods=['POST'])
 @login_required
 def update_status():
@@ -374,6 +596,174 @@ def delete_invoice_route():
     return redirect(url_for('invoices'))
 
 
+# Largest number of invoices accepted by one bulk request
+MAX_BULK_ITEMS = 10000
+
+
+@app.route('/api/invoices/status', methods=['POST'])
+@login_required
+def bulk_update_status():
+    """Apply many status changes in one transaction
+
+    Body: {"changes": [{"invoice_number": "#12", "status": "paid", "payment_date": "2026-10-01"}, ...]}
+    or {"invoice_numbers": ["#12", "#13"], "status": "paid"}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    if 'changes' in data:
+        entries = data['changes']
+    else:
+        numbers = data.get('invoice_numbers')
+        if not isinstance(numbers, list):
+            return jsonify({'error': 'No changes given'}), 400
+        entries = [{'invoice_number': number, 'status': data.get('status'),
+                    'payment_date': data.get('payment_date')}
+                   for number in numbers]
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'No changes given'}), 400
+    if len(entries) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'At most {MAX_BULK_ITEMS} changes per request'}), 400
+
+    changes = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return jsonify({'error': 'Each change must be a JSON object'}), 400
+        if not entry.get('invoice_number'):
+            return jsonify({'error': 'Each change needs an invoice_number'}), 400
+        status = entry.get('status')
+        payment_date = entry.get('payment_date') or (today if status == 'paid' else None)
+        changes.append((str(entry['invoice_number']), status, payment_date))
+
+    try:
+        return jsonify(update_invoice_statuses(changes))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/delete', methods=['POST'])
+@login_required
+def bulk_delete():
+    """Delete many invoices in one transaction
+
+    Body: {"invoice_numbers": ["#12", "#13"]}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    invoice_numbers = data.get('invoice_numbers')
+
+    if not isinstance(invoice_numbers, list) or not invoice_numbers:
+        return jsonify({'error': 'No invoice_numbers given'}), 400
+    if len(invoice_numbers) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'At most {MAX_BULK_ITEMS} invoices per request'}), 400
+
+    try:
+        return jsonify(delete_invoices([str(number) for number in invoice_numbers]))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/reconcile', methods=['POST'])
+@login_required
+def reconcile_statement():
+    """Mark invoices paid from an uploaded bank statement CSV"""
+    file = request.files.get('statement')
+    if not file or file.filename == '':
+        flash('❌ No statement selected', 'error')
+        return redirect(url_for('invoices'))
+
+    try:
+        result = reconcile_upload(file, dry_run=request.form.get('dry_run') == 'on')
+    except Exception as e:
+        flash(f'❌ Error reading statement: {str(e)}', 'error')
+        return redirect(url_for('invoices'))
+
+    flash(f"🏦 {result['transactions']} payment(s) read: {len(result['matched'])} matched, "
+          f"{result['updated']} marked paid, {len(result['unmatched'])} unmatched", 'success')
+    for line in result['unmatched'][:10]:
+        flash(f"⚠️ Line {line['line']}: €{line['amount']:.2f} {line['description']} - {line['reason']}", 'error')
+    return redirect(url_for('invoices'))
+
+
+@app.route('/api/reconcile', methods=['POST'])
+@login_required
+def reconcile_statement_json():
+    """Reconcile an uploaded bank statement CSV and return the full match report"""
+    file = request.files.get('statement')
+    if not file or file.filename == '':
+        return jsonify({'error': 'No statement uploaded'}), 400
+
+    try:
+        return jsonify(reconcile_upload(file, dry_run=request.values.get('dry_run') in ('1', 'true', 'on')))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/reports/<name>')
+@login_required
+def report_json(name):
+    """Revenue / aging / days-to-pay report as JSON"""
+    if name not in REPORTS:
+        return jsonify({'error': f'Unknown report: {name}', 'reports': sorted(REPORTS)}), 404
+
+    try:
+        rows = run_report(name, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'report': name, 'rows': rows})
+
+
+@app.route('/reports/<name>.csv')
+@login_required
+def report_csv(name):
+    """Revenue / aging / days-to-pay report as a CSV download"""
+    if name not in REPORTS:
+        return f"Unknown report: {name}", 404
+
+    try:
+        rows = run_report(name, request.args)
+    except ValueError as e:
+        return str(e), 400
+
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d')}.csv"
+    return app.response_class(to_csv(rows), mimetype='text/csv',
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.route('/api/maintenance/report')
+@login_required
+def maintenance_report_json():
+    """Table / index sizes, missing or unused indexes and slow queries of this process"""
+    return jsonify(maintenance_report())
+
+
+@app.route('/export/invoices.<fmt>')
+@login_required
+def export_invoices(fmt):
+    """Invoice ledger as a streamed CSV / NDJSON / Excel download
+
+    Optional filters: start and end (issue dates, YYYY-MM-DD), status and
+    client (part of the client name).
+    """
+    if fmt not in FORMATS:
+        return f"Unknown export format: {fmt} (use {', '.join(FORMATS)})", 404
+
+    try:
+        filters = ledger_filters(request.args)
+    except ValueError as e:
+        return str(e), 400
+
+    mimetype, extension = FORMATS[fmt]
+    filename = f"invoices_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    return app.response_class(stream_with_context(stream_ledger(fmt, filters)), mimetype=mimetype,
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("🌸 VELVET LAVENDER INVOICE GENERATOR")
@@ -0,0 +1,161 @@
+"""ASGI entry point: async read endpoints in front of the Flask app.
+
+    uvicorn asgi:app --workers 4
+
+The dashboard reads that are polled while a generation runs - /api/invoices
+(list, status filter, ?q= search, sort), /api/stats and /preview/<filename>
+- are async handlers here. The list is served from the in-memory invoice
+index, stats use async database access (asyncpg on Postgres, aiosqlite on
+SQLite) and PDFs are streamed in chunks without holding a thread. Every other
+route, including all the forms, is the Flask app unchanged, run in a thread
+pool by a2wsgi, so a slow /generate or /download-all only occupies one of
+those threads instead of a whole gunicorn worker.
+
+The WSGI deployment (gunicorn app:app) serves the same URLs synchronously;
+benchmarks/bench_concurrent_reads.py --compare measures both.
+"""
+import os
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response
+from starlette.routing import Mount, Route
+
+import cache
+import storage
+from app import OUTPUT_FOLDER, app as flask_app, invoices_page_json, list_invoices_page
+from batches import current_batch_dir
+from database import INVOICE_STATS_SQL, USE_POSTGRES, ensure_schema, summarize_invoice_stats
+from logs import get_logger
+from scheduler import start_background_scheduler
+
+logger = get_logger(__name__)
+
+# Threads running Flask views, and async Postgres connections per process
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 10))
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 10))
+
+if USE_POSTGRES:
+    import asyncpg
+    from database import DATABASE_URL
+else:
+    import aiosqlite
+    from database import DATABASE
+
+_pool = None
+
+
+def _pg(query):
+    """? placeholders to asyncpg's $1, $2, ..."""
+    parts = query.split('?')
+    return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], 1))
+
+
+async def fetch(query, params=()):
+    """Rows of a ? placeholder query; rows index by position and by column name"""
+    if USE_POSTGRES:
+        async with _pool.acquire() as conn:
+            return await conn.fetch(_pg(query), *params)
+
+    async with aiosqlite.connect(DATABASE) as conn:
+        conn.row_factory = aiosqlite.Row
+        async with conn.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+
+async def get_invoice_stats():
+    """database.get_invoice_stats without blocking the event loop"""
+    try:
+        return summarize_invoice_stats(await fetch(INVOICE_STATS_SQL))
+    except Exception as e:
+        logger.error("Error getting stats: %s", e)
+        return summarize_invoice_stats([])
+
+
+def logged_in(request):
+    """True when the request carries the Flask session cookie of a logged-in user"""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not serializer or not cookie:
+        return False
+    try:
+        session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return False
+    return bool(session.get('logged_in'))
+
+
+def login_required(endpoint):
+    """Send anonymous requests to the Flask login page"""
+
+    async def guarded(request):
+        if not logged_in(request):
+            return RedirectResponse('/login', status_code=302)
+        return await endpoint(request)
+
+    return guarded
+
+
+@login_required
+async def invoices_api(request):
+    """One page of invoices as JSON; status, q (invoice number or client) and sort filter it"""
+    # Served from the in-memory invoice index; only its periodic catch-up query touches the database
+    page, invoices_list, total, _ = await run_in_threadpool(list_invoices_page, request.query_params)
+    return JSONResponse(invoices_page_json(invoices_list, total, page))
+
+
+@login_required
+async def stats_api(request):
+    """Dashboard invoice statistics as JSON"""
+    return JSONResponse(await cache.get_or_compute_async('invoices', 'stats', get_invoice_stats))
+
+
+@login_required
+async def preview(request):
+    """Stream a PDF of the current batch"""
+    filename = request.path_params['filename']
+    if filename != os.path.basename(filename) or filename.startswith('.'):
+        return PlainTextResponse("PDF not found", status_code=404)
+
+    key = f'{await run_in_threadpool(current_batch_dir, OUTPUT_FOLDER)}/{filename}'
+    path = storage.local_path(key)
+    if path:
+        if not await run_in_threadpool(os.path.isfile, path):
+            return PlainTextResponse("PDF not found", status_code=404)
+        # Read in chunks on anyio's thread pool, sent as they arrive
+        return FileResponse(path, media_type='application/pdf')
+
+    try:
+        data = await run_in_threadpool(storage.get_bytes, key)
+    except FileNotFoundError:
+        return PlainTextResponse("PDF not found", status_code=404)
+    return Response(data, media_type='application/pdf')
+
+
+@asynccontextmanager
+async def lifespan(starlette_app):
+    global _pool
+    await run_in_threadpool(ensure_schema)
+    start_background_scheduler()
+    if USE_POSTGRES:
+        _pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=ASYNC_DB_POOL_SIZE)
+    try:
+        yield
+    finally:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+
+
+app = Starlette(
+    routes=[
+        Route('/api/invoices', invoices_api),
+        Route('/api/stats', stats_api),
+        Route('/preview/{filename}', preview),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
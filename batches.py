@@ -0,0 +1,178 @@
+"""Per-batch output directories and the generation lock.
+
+Each /generate run renders into a hidden staging directory under
+OUTPUT_FOLDER/batches, which is renamed into place only when every PDF is
+written. With a remote storage backend the PDFs are uploaded at that point.
+A CURRENT pointer (itself replaced atomically) then names the published
+batch, so readers always see a complete batch - the previous one until the
+new one is published. Published batches are never modified afterwards.
+
+A file lock around generation serializes runs across threads, gunicorn
+workers and CLI processes sharing the same folder.
+"""
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import storage
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+# Published batches kept on disk (older ones are deleted after a publish)
+BATCH_KEEP = int(os.environ.get('BATCH_KEEP', 5))
+
+# Seconds a generation waits for a running one before giving up
+GENERATION_LOCK_TIMEOUT = float(os.environ.get('GENERATION_LOCK_TIMEOUT', 30))
+
+POINTER_FILE = 'CURRENT'
+STAGING_PREFIX = '.staging-'
+
+
+class GenerationInProgress(RuntimeError):
+    """Another process holds the generation lock"""
+
+
+def _try_lock(f):
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f):
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def generation_lock(output_root, timeout=GENERATION_LOCK_TIMEOUT):
+    """Hold the cross-process lock for output_root, waiting up to timeout seconds"""
+    os.makedirs(output_root, exist_ok=True)
+    deadline = time.monotonic() + timeout
+
+    with open(os.path.join(output_root, '.generate.lock'), 'a+') as f:
+        while not _try_lock(f):
+            if time.monotonic() >= deadline:
+                raise GenerationInProgress('Another invoice generation is still running')
+            time.sleep(0.2)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def _batches_dir(output_root):
+    return os.path.join(output_root, 'batches')
+
+
+def _current_batch_id(output_root):
+    try:
+        return storage.get_bytes(f'{output_root}/{POINTER_FILE}').decode().strip()
+    except FileNotFoundError:
+        return None
+
+
+def current_batch_dir(output_root):
+    """Storage folder of the last published batch (output_root itself before the first one)"""
+    batch_id = _current_batch_id(output_root)
+    if not batch_id:
+        return output_root
+
+    path = batch_folder(output_root, batch_id)
+    if not storage.is_remote() and not os.path.isdir(path):
+        return output_root
+    return path
+
+
+@contextmanager
+def staged_batch(output_root):
+    """Yield (staging folder, final folder) and publish the batch on success
+
+    Call with generation_lock held. On an exception, or when nothing was
+    written, the staging folder is removed and the previously published
+    batch stays current.
+    """
+    batch_id = new_batch_id()
+    batches = _batches_dir(output_root)
+    staging = os.path.join(batches, STAGING_PREFIX + batch_id)
+    final = os.path.join(batches, batch_id)
+    os.makedirs(staging)
+
+    try:
+        yield staging, final
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if not os.listdir(staging):
+        # Nothing new (e.g. an incremental run) - keep the current batch
+        shutil.rmtree(staging, ignore_errors=True)
+        logger.info("Batch %s is empty, not publishing", batch_id)
+        return
+
+    os.rename(staging, final)
+    if storage.is_remote():
+        for name in os.listdir(final):
+            storage.put_file(f'{batch_folder(output_root, batch_id)}/{name}', os.path.join(final, name))
+    publish_batch(output_root, batch_id)
+
+
+def new_batch_id():
+    """Batch ids sort in creation order"""
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+
+def batch_folder(output_root, batch_id):
+    """Storage folder of a batch"""
+    return f'{output_root}/batches/{batch_id}'
+
+
+def publish_batch(output_root, batch_id):
+    """Point readers at batch_id once every file of it is stored"""
+    current = _current_batch_id(output_root)
+    if current and current > batch_id:
+        # A newer batch finished first (render workers) - keep it current
+        logger.info("Batch %s finished after newer batch %s, not publishing", batch_id, current)
+        return
+    storage.put_bytes(f'{output_root}/{POINTER_FILE}', batch_id.encode())
+    logger.info("Published batch %s", batch_id)
+    prune_batches(output_root)
+
+
+def prune_batches(output_root, keep=BATCH_KEEP):
+    """Delete published batches beyond the newest keep, and abandoned staging folders"""
+    current = _current_batch_id(output_root)
+    batches = _batches_dir(output_root)
+
+    if os.path.isdir(batches):
+        published = sorted((name for name in os.listdir(batches) if not name.startswith('.')), reverse=True)
+        stale = [name for name in published[keep:] if name != current]
+        # Only one generation runs at a time, so any other staging folder is left from a crash
+        stale += [name for name in os.listdir(batches) if name.startswith(STAGING_PREFIX)]
+        for name in stale:
+            shutil.rmtree(os.path.join(batches, name), ignore_errors=True)
+
+    if storage.is_remote():
+        prefix = f'{output_root}/batches/'
+        keys = storage.list_keys(prefix)
+        published = sorted({key[len(prefix):].split('/', 1)[0] for key in keys}, reverse=True)
+        stale = {name for name in published[keep:] if name != current}
+        for key in keys:
+            if key[len(prefix):].split('/', 1)[0] in stale:
+                storage.delete(key)
@@ -0,0 +1,155 @@
+"""Write throughput with and without the change_seq counter of the change feed.
+
+Every invoice write bumps the single invoice_changes row in counters inside
+its own transaction, so writers queue on that row until the previous writer
+commits. This measures what that costs: --writers threads keep updating the
+status of their own invoices for --duration seconds, alone and while one
+more thread inserts batches of --batch invoices (like a generation run), once
+with the change feed triggers and once with them dropped.
+
+SQLite serializes writers anyway, so the difference shows on Postgres:
+
+    python benchmarks/bench_change_feed.py                                  # scratch SQLite file
+    DATABASE_URL=postgresql://.../scratch python benchmarks/bench_change_feed.py --writers 1 4 8
+
+The database is modified (and the triggers recreated at the end) - point
+DATABASE_URL at a scratch database.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CLIENTS = 300
+
+
+def invoice(number):
+    return {
+        'invoice_number': f'#{number}', 'client_name': f'Client {number % CLIENTS} Ltd',
+        'client_address_2': 'Main Street', 'vat_number': f'CY{number % CLIENTS:08d}X',
+        'date_issued': '01 October, 2026', 'description': 'Content Creation', 'quantity': '1',
+        'month': 'October', 'total': '100', 'tax': '19', 'total_amount': '119',
+    }
+
+
+def set_change_feed(database, enabled):
+    """Create or drop the triggers numbering invoice writes"""
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    if enabled:
+        database._create_change_feed(cursor)
+    elif database.USE_POSTGRES:
+        cursor.execute('DROP TRIGGER IF EXISTS trg_invoices_change_seq ON invoices')
+    else:
+        for name in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS trg_invoices_change_{name}')
+    conn.commit()
+    conn.close()
+
+
+def writer(database, numbers, stop, latencies):
+    statuses = ('paid', 'pending')
+    i = 0
+    while not stop.is_set():
+        number = numbers[i % len(numbers)]
+        started = time.perf_counter()
+        database.update_invoice_status(f'#{number}', statuses[(i // len(numbers)) % 2], '2026-10-01')
+        latencies.append(time.perf_counter() - started)
+        i += 1
+
+
+def inserter(database, size, stop, counts):
+    """Store batches of new invoices the way a generation run does"""
+    while not stop.is_set():
+        first = database.allocate_invoice_numbers(size)
+        database.add_invoices([invoice(n) for n in range(first, first + size)])
+        counts['inserted'] += size
+
+
+def run(database, writers, seeded, duration, batch):
+    """One phase: writers updating disjoint seeded invoices, plus the batch inserter when batch > 0"""
+    stop = threading.Event()
+    per_writer = len(seeded) // writers
+    latencies = [[] for _ in range(writers)]
+    counts = {'inserted': 0}
+    threads = [threading.Thread(target=writer, args=(database, seeded[w * per_writer:(w + 1) * per_writer],
+                                                     stop, latencies[w]))
+               for w in range(writers)]
+    if batch:
+        threads.append(threading.Thread(target=inserter, args=(database, batch, stop, counts)))
+
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    samples = sorted(sample for per_thread in latencies for sample in per_thread)
+    pick = lambda q: round(samples[min(int(len(samples) * q), len(samples) - 1)] * 1000, 2)
+    return {
+        'writes_per_s': round(len(samples) / duration, 1),
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'mean_ms': round(statistics.mean(samples) * 1000, 2),
+        'inserted_per_s': round(counts['inserted'] / duration, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent invoice writers with and without the change counter')
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--invoices', type=int, default=2000, help='invoices seeded for the writers')
+    parser.add_argument('--batch', type=int, default=200, help='invoices per insert transaction')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    workdir = None
+    if not os.environ.get('DATABASE_URL'):
+        workdir = tempfile.TemporaryDirectory(prefix='velvet-feed-')
+        os.chdir(workdir.name)
+    import logging
+    import database
+
+    # One log line per invoice written would dominate the timings
+    logging.getLogger('database.rows').setLevel(logging.WARNING)
+
+    database.ensure_schema()
+    first = database.allocate_invoice_numbers(args.invoices)
+    database.add_invoices([invoice(n) for n in range(first, first + args.invoices)])
+    seeded = list(range(first, first + args.invoices))
+
+    results = {}
+    try:
+        for feed in (True, False):
+            set_change_feed(database, feed)
+            for writers in args.writers:
+                for batch in (0, args.batch):
+                    name = f"{'feed' if feed else 'no feed'} {writers}w{' +batch' if batch else ''}"
+                    results[name] = run(database, writers, seeded, args.duration, batch)
+    finally:
+        set_change_feed(database, True)
+
+    print(f"   {'phase':<22}{'writes/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'inserted/s':>12}")
+    for name, row in results.items():
+        print(f"   {name:<22}{row['writes_per_s']:>10}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['inserted_per_s']:>12}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'backend': 'postgres' if database.USE_POSTGRES else 'sqlite', 'results': results}, f,
+                      indent=2)
+    if workdir:
+        os.chdir(ROOT)
+        workdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Load-test dashboard reads, alone and while a generation runs.
+
+Logs in, then keeps --readers concurrent clients polling the read endpoints
+for --duration seconds, twice: on an idle server, and again while one client
+runs POST /generate and another keeps downloading /download-all. Latency
+percentiles per phase show how much the slow requests hold up the reads.
+Run it against each serving mode on the same machine and data:
+
+    gunicorn -w 4 app:app                      # sync workers
+    uvicorn asgi:app --workers 4               # async read endpoints
+
+    python benchmarks/bench_concurrent_reads.py --url http://localhost:8000 --readers 32
+
+Generation writes real invoices - point it at a scratch database.
+
+With --compare the script does that itself: it seeds a scratch directory
+with --invoices invoices and the sample workbook, starts each serving mode
+there in turn with --workers processes and prints both side by side.
+
+    python benchmarks/bench_concurrent_reads.py --compare [--workers 2] [--invoices 5000]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READ_PATHS = ['/api/invoices', '/api/stats', '/api/invoices?q=ltd']
+
+# Serving modes for --compare, started from the scratch directory
+SERVERS = {
+    'wsgi': ['-m', 'gunicorn', '--pythonpath', ROOT, '-w', '{workers}', '-b', '127.0.0.1:{port}', 'app:app'],
+    'asgi': ['-m', 'uvicorn', '--app-dir', ROOT, '--workers', '{workers}', '--port', '{port}', '--log-level',
+             'warning', 'asgi:app'],
+}
+
+
+def login(url, password):
+    """urllib opener carrying a logged-in session cookie"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(f'{url}/login', urllib.parse.urlencode({'password': password}).encode()).read()
+    return opener
+
+
+def reader(opener, url, paths, stop, latencies, errors):
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            with opener.open(f'{url}{path}', timeout=60) as response:
+                response.read()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors.append(path)
+
+
+def busy_client(opener, url, stop, counts):
+    """One generation, then back-to-back ZIP downloads until the phase ends"""
+    opener.open(f'{url}/generate', b'', timeout=600).read()
+    counts['generate'] += 1
+    while not stop.is_set():
+        opener.open(f'{url}/download-all', timeout=600).read()
+        counts['download_all'] += 1
+
+
+def run_phase(url, password, readers, duration, with_generation):
+    stop = threading.Event()
+    latencies, errors = [], []
+    counts = {'generate': 0, 'download_all': 0}
+    threads = [threading.Thread(target=reader, args=(login(url, password), url, READ_PATHS, stop, latencies, errors))
+               for _ in range(readers)]
+    if with_generation:
+        threads.append(threading.Thread(target=busy_client, args=(login(url, password), url, stop, counts),
+                                        daemon=True))
+
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads[:readers]:
+        thread.join()
+
+    latencies.sort()
+    pick = lambda q: round(latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000, 1)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': pick(0.50) if latencies else None,
+        'p95_ms': pick(0.95) if latencies else None,
+        'p99_ms': pick(0.99) if latencies else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+        **(counts if with_generation else {}),
+    }
+
+
+def run_phases(url, args):
+    return {
+        'idle': run_phase(url, args.password, args.readers, args.duration, False),
+        'during_generation': run_phase(url, args.password, args.readers, args.duration, True),
+    }
+
+
+def seed(workdir, count):
+    """Scratch directory with count invoices in invoices.db and the sample workbook and logo"""
+    for name in ('Anainvoices.xlsx', 'image.jpg'):
+        shutil.copy(os.path.join(ROOT, name), workdir)
+    code = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+import database
+database.ensure_schema()
+database.add_invoices([{{
+    'invoice_number': f'#{{i}}', 'client_name': f'Client {{i % 300}} Ltd', 'client_address_2': 'Main Street',
+    'vat_number': f'CY{{i % 300:08d}}X', 'date_issued': '01 October, 2026', 'description': 'Content Creation',
+    'quantity': '1', 'month': 'October', 'total': '100', 'tax': '19', 'total_amount': '119',
+}} for i in range(1, {count} + 1)])
+"""
+    subprocess.run([sys.executable, '-c', code], cwd=workdir, env=_scratch_env(), check=True, capture_output=True)
+
+
+def _scratch_env():
+    return {k: v for k, v in os.environ.items() if k not in ('DATABASE_URL', 'RENDER_MODE')}
+
+
+def serve(mode, workdir, workers, port):
+    """Start a serving mode and wait until it answers"""
+    command = [sys.executable] + [arg.format(workers=workers, port=port) for arg in SERVERS[mode]]
+    server = subprocess.Popen(command, cwd=workdir, env=_scratch_env(), stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=5).read()
+            return server
+        except (urllib.error.URLError, ConnectionError):
+            if server.poll() is not None:
+                raise SystemExit(f"{mode} server exited with {server.returncode}: {' '.join(command)}")
+            time.sleep(0.5)
+    server.terminate()
+    raise SystemExit(f"{mode} server did not start")
+
+
+def compare(args):
+    """Both serving modes on the same scratch data, one after the other"""
+    results = {}
+    for mode in SERVERS:
+        with tempfile.TemporaryDirectory(prefix='velvet-serve-') as workdir:
+            seed(workdir, args.invoices)
+            server = serve(mode, workdir, args.workers, args.port)
+            try:
+                results[mode] = run_phases(f'http://127.0.0.1:{args.port}', args)
+            finally:
+                server.terminate()
+                server.wait(30)
+    return results
+
+
+def print_table(results):
+    print(f"   {'phase':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, row in results.items():
+        print(f"   {name:<28}{row['rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent dashboard reads during a generation run')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--password', default='anamoux')
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--compare', action='store_true', help='start and compare both serving modes')
+    parser.add_argument('--workers', type=int, default=2, help='server processes with --compare')
+    parser.add_argument('--invoices', type=int, default=5000, help='invoices seeded with --compare')
+    parser.add_argument('--port', type=int, default=8765, help='server port with --compare')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    if args.compare:
+        results = compare(args)
+        print_table({f'{mode} {phase}': row for mode, phases in results.items() for phase, row in phases.items()})
+        report = {'workers': args.workers, 'invoices': args.invoices}
+    else:
+        url = args.url.rstrip('/')
+        results = run_phases(url, args)
+        print_table(results)
+        report = {'url': url}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({**report, 'readers': args.readers, 'duration': args.duration, 'results': results}, f,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Peak memory of sending the invoices email, whole-message against streamed.
+
+Sends the same synthetic PDFs twice to a local SMTP stand-in (EHLO, MAIL,
+RCPT, DATA, QUIT; no TLS, no login), tracing allocations with tracemalloc:
+
+- legacy: the MIME tree with every PDF base64-encoded in memory, flattened
+  with as_string() and handed to sendmail(), as send_invoices_email did
+  before the message was streamed;
+- streamed: invoice_generator.send_invoices_email, which writes the message
+  to a spooled temp file and sends it from there in chunks.
+
+With --verify one more streamed message is sent, kept by the server,
+parsed, and every attachment checked against the PDF it came from.
+
+Usage:
+    python benchmarks/bench_email.py [--files 50] [--size-kb 200] [--verify]
+"""
+import argparse
+import email
+import email.policy
+import os
+import smtplib
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept one message per connection"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 bench ready')
+        while line := self.rfile.readline():
+            command = line.strip().upper()
+            if command.startswith((b'EHLO', b'HELO')):
+                self.reply('250 bench')
+            elif command.startswith((b'MAIL', b'RCPT', b'RSET', b'NOOP')):
+                self.reply('250 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.receive()
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+    def receive(self):
+        size, lines = 0, []
+        keep = self.server.keep
+        while (line := self.rfile.readline()) != b'.\r\n':
+            if not line:
+                return
+            size += len(line)
+            if keep:
+                lines.append(line[1:] if line.startswith(b'..') else line)
+        self.server.received.append((size, b''.join(lines)))
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, keep=False):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.keep = keep
+        self.received = []
+
+
+def legacy_send(pdf_files, recipient_email, invoice_month, email_config, host, port):
+    """send_invoices_email as it was: the whole message built and flattened in memory"""
+    msg = MIMEMultipart()
+    msg['From'] = email_config['sender_email']
+    msg['To'] = recipient_email
+    msg['Subject'] = f"Velvet Lavender Invoices - {invoice_month}"
+    msg.attach(MIMEText(f'Total invoices: {len(pdf_files)}', 'plain'))
+    for pdf_file in pdf_files:
+        with open(pdf_file, 'rb') as attachment:
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(attachment.read())
+            encoders.encode_base64(part)
+            part.add_header('Content-Disposition', f'attachment; filename= {os.path.basename(pdf_file)}')
+            msg.attach(part)
+    server = smtplib.SMTP(host, port)
+    try:
+        server.sendmail(email_config['sender_email'], recipient_email, msg.as_string())
+    finally:
+        server.quit()
+
+
+def traced(fn):
+    """(seconds, peak traced bytes) of fn()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        fn()
+        return time.perf_counter() - started, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def make_pdfs(workdir, count, size):
+    paths = []
+    for n in range(count):
+        path = os.path.join(workdir, f'Invoice_{n + 1:05d}.pdf')
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4\n' + os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def verify(message, pdf_files):
+    parsed = email.message_from_bytes(message, policy=email.policy.default)
+    attachments = [part for part in parsed.iter_attachments()]
+    assert len(attachments) == len(pdf_files), (len(attachments), len(pdf_files))
+    for part, pdf_file in zip(attachments, pdf_files):
+        assert part.get_filename() == os.path.basename(pdf_file), part.get_filename()
+        with open(pdf_file, 'rb') as f:
+            assert part.get_content() == f.read(), pdf_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Email send peak memory, legacy vs streamed')
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--size-kb', type=int, default=200)
+    parser.add_argument('--verify', action='store_true', help='check the streamed message decodes back to the PDFs')
+    args = parser.parse_args()
+
+    server = SMTPServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    os.environ.update(SMTP_HOST=host, SMTP_PORT=str(port), SMTP_STARTTLS='0', LOG_LEVEL='ERROR')
+    import invoice_generator
+
+    config = {'sender_email': 'bench@example.com', 'sender_password': ''}
+    with tempfile.TemporaryDirectory(prefix='velvet-email-') as workdir:
+        pdf_files = make_pdfs(workdir, args.files, args.size_kb * 1024)
+        total = args.files * args.size_kb * 1024
+        print(f"   {args.files} attachments, {total / 2**20:.1f} MB")
+
+        runs = {
+            'legacy': lambda: legacy_send(pdf_files, 'to@example.com', 'bench', config, host, port),
+            'streamed': lambda: invoice_generator.send_invoices_email(pdf_files, 'to@example.com', 'bench', config),
+        }
+        for name, fn in runs.items():
+            seconds, peak = traced(fn)
+            size, _ = server.received[-1]
+            print(f"   {name:<10} {seconds:7.2f}s  peak {peak / 2**20:8.1f} MB  sent {size / 2**20:6.1f} MB")
+
+        if args.verify:
+            # A separate, untraced send: the copy the server keeps would count towards the peak
+            server.keep = True
+            runs['streamed']()
+            verify(server.received[-1][1], pdf_files)
+            print('   ✅ streamed message decodes back to every PDF')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
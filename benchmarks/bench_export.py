@@ -0,0 +1,79 @@
+"""Time to first byte, throughput and peak memory of the streaming ledger export.
+
+Fills a scratch SQLite database with synthetic invoices, then drains
+export.stream_ledger for each format, recording when the first chunk was
+ready and the total time, then streams it once more to measure the peak
+memory allocated while streaming. Peak memory should stay flat as
+--invoices grows; compare --invoices 100000 with --invoices 1000000.
+
+Usage:
+    python benchmarks/bench_export.py [--invoices 100000] [--formats csv,ndjson,xlsx] [--output report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from bench_invoice_index import fill  # noqa: E402
+
+
+def drain(fmt):
+    """Stream one export, return its timings, size and peak memory"""
+    from export import stream_ledger
+
+    started = time.perf_counter()
+    first, size = None, 0
+    for chunk in stream_ledger(fmt):
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+
+    # Again under tracemalloc, which slows everything down too much to time
+    tracemalloc.start()
+    for _ in stream_ledger(fmt):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'first_chunk_ms': round(first * 1000, 1),
+        'total_s': round(total, 2),
+        'mb': round(size / 1e6, 1),
+        'peak_memory_mb': round(peak / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming ledger export')
+    parser.add_argument('--invoices', type=int, default=100000)
+    parser.add_argument('--formats', default='csv,ndjson,xlsx')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='velvet-export-') as workdir:
+        os.chdir(workdir)
+        os.environ.pop('DATABASE_URL', None)
+        fill(args.invoices)
+        results = {fmt: drain(fmt) for fmt in args.formats.split(',')}
+        os.chdir(ROOT)
+
+    print(f"   {args.invoices:,} invoices")
+    print(f"   {'format':<8}{'first chunk':>13}{'total':>9}{'size':>10}{'peak mem':>11}")
+    for fmt, row in results.items():
+        print(f"   {fmt:<8}{row['first_chunk_ms']:>10} ms{row['total_s']:>7} s{row['mb']:>7} MB"
+              f"{row['peak_memory_mb']:>8} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'invoices': args.invoices, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
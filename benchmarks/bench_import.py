@@ -0,0 +1,93 @@
+"""Guard the web app's cold-start import time.
+
+Imports each module in a fresh interpreter (in a temporary directory, so no
+database file is created), reports the -X importtime cumulative time and
+fails if a module goes over its budget or drags in a heavy dependency that
+should only load on first use.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 5] [--budget-ms 400]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['app', 'database', 'invoice_generator', 'reports']
+
+# Must not be imported just by importing the modules above
+HEAVY_MODULES = ['pandas', 'numpy', 'reportlab', 'PIL', 'openpyxl']
+
+DEFAULT_BUDGET_MS = 400
+
+PROBE = """
+import json, sys
+sys.path.insert(0, {root!r})
+import {module}
+print(json.dumps([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+
+def measure(module, workdir):
+    """Return (cumulative import ms, heavy modules loaded) for one fresh import"""
+    code = PROBE.format(root=ROOT, module=module, heavy=HEAVY_MODULES)
+    env = {k: v for k, v in os.environ.items() if k != 'DATABASE_URL'}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{proc.stderr}")
+
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and line.rstrip().endswith(f'| {module}'):
+            cumulative_us = int(line.split('|')[1])
+    return cumulative_us / 1000, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold import time of the app modules')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='fail when a module median exceeds this')
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    failures = []
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='velvet-import-') as workdir:
+        for module in MODULES:
+            samples, heavy = [], []
+            for _ in range(args.repeat):
+                ms, heavy = measure(module, workdir)
+                samples.append(ms)
+            median = statistics.median(samples)
+            results[module] = {'median_ms': round(median, 1), 'min_ms': round(min(samples), 1),
+                               'heavy_modules': heavy}
+            print(f"   {module:<20} median {median:8.1f} ms   min {min(samples):8.1f} ms"
+                  + (f"   heavy: {', '.join(heavy)}" if heavy else ''))
+
+            if median > args.budget_ms:
+                failures.append(f"{module} takes {median:.0f} ms (budget {args.budget_ms:.0f} ms)")
+            if heavy:
+                failures.append(f"{module} imports {', '.join(heavy)} eagerly")
+            if os.path.exists(os.path.join(workdir, 'invoices.db')):
+                failures.append(f"{module} touches the database at import time")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        raise SystemExit(1)
+    print("✅ Import times within budget")
+
+
+if __name__ == '__main__':
+    main()
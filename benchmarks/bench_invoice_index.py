@@ -0,0 +1,134 @@
+"""Memory and latency of the in-memory invoice index against the database path.
+
+Fills a scratch SQLite database with synthetic invoices, then compares
+holding the list as full row dicts (get_all_invoices) with holding it as
+InvoiceRecords (invoice_index), and times a list page, a search, a status
+filter, a sort and the index catching up after a write. The list routes read
+only the index, so there is no database page query to time against.
+
+Usage:
+    python benchmarks/bench_invoice_index.py [--invoices 20000] [--output report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGE = 200
+CLIENTS = 150
+
+
+def fill(count):
+    """Insert count synthetic invoices through plain SQL"""
+    from database import ensure_schema, get_connection
+
+    ensure_schema()
+    rows = []
+    for i in range(count):
+        subtotal = 300 + (i % 20) * 25
+        year, month = 2020 + i // 1200, (i // 100) % 12 + 1
+        rows.append((
+            f'#{i + 1}', f'Client {i % CLIENTS} Ltd', f'Office {i % 40}, Makarios Avenue\n1076 Nicosia',
+            subtotal, round(subtotal * 0.19, 2), round(subtotal * 1.19, 2), round(subtotal * 119),
+            f'01 {month:02d}, {year}', f'{year}-{month:02d}-01', f'{month:02d}', year,
+            ('pending', 'paid', 'paid', 'overdue')[i % 4],
+            f'generated_invoices/batches/{year}{month:02d}01_090000_000000/Invoice_Client_{i % CLIENTS}_Ltd.pdf',
+        ))
+
+    conn = get_connection()
+    conn.executemany('''
+        INSERT INTO invoices (invoice_number, client_name, client_address, amount, tax, total_amount, total_cents,
+                              issue_date, issue_date_iso, month, year, status, pdf_filename)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+def held_bytes(load):
+    """Bytes still allocated by load()'s result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = load()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, result
+
+
+def timed_ms(fn, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - started) / repeat * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice index memory and query latency')
+    parser.add_argument('--invoices', type=int, default=20000)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='velvet-index-') as workdir:
+        os.chdir(workdir)
+        os.environ.pop('DATABASE_URL', None)
+        import invoice_index
+        from database import get_all_invoices, update_invoice_status
+
+        fill(args.invoices)
+
+        dict_bytes, _ = held_bytes(get_all_invoices)
+        record_bytes, _ = held_bytes(lambda: invoice_index.list_invoices(PAGE))
+        index = invoice_index._index
+
+        def catch_up():
+            update_invoice_status(f'#{args.invoices // 2}', 'paid', '2026-01-01')
+            invoice_index.list_invoices(PAGE)
+
+        results = {
+            'invoices': args.invoices,
+            'bytes_per_invoice': {
+                'row_dicts': round(dict_bytes / args.invoices),
+                'index_records': round(record_bytes / args.invoices),
+            },
+            'ms': {
+                'first_page': {
+                    'index': timed_ms(lambda: invoice_index.list_invoices(PAGE)),
+                },
+                'search': {
+                    'index': timed_ms(lambda: invoice_index.list_invoices(PAGE, search='client 7')),
+                },
+                'status_filter': {
+                    'index': timed_ms(lambda: invoice_index.list_invoices(PAGE, status='overdue')),
+                },
+                'catch_up_after_write': {
+                    'index': timed_ms(catch_up),
+                },
+                'sort_by_amount': {
+                    # First call sorts, later ones reuse the order until the next change
+                    'index_cold': timed_ms(lambda: (index.sorted.clear(),
+                                                    invoice_index.list_invoices(PAGE, sort='amount'))),
+                    'index_warm': timed_ms(lambda: invoice_index.list_invoices(PAGE, sort='amount')),
+                },
+            },
+        }
+        os.chdir(ROOT)
+
+    memory = results['bytes_per_invoice']
+    print(f"   bytes per invoice   row dicts {memory['row_dicts']:>7,}   index {memory['index_records']:>7,}"
+          f"   ({memory['row_dicts'] / memory['index_records']:.1f}x smaller)")
+    for name, timings in results['ms'].items():
+        print(f"   {name:<16} " + '   '.join(f"{way} {ms:8.3f} ms" for way, ms in timings.items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
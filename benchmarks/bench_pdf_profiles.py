@@ -0,0 +1,87 @@
+"""Compare invoice PDF output profiles by size and render time.
+
+Renders the same sample invoices under every profile in
+invoice_generator.PDF_PROFILES and reports bytes per invoice, the saving
+against the legacy (ReportLab default) output and the render time, so a
+profile can be picked on numbers.
+
+Usage:
+    python benchmarks/bench_pdf_profiles.py [--invoices 20] [--logo image.jpg] [--output report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def sample_invoice(i):
+    """Invoice data dict like build_invoice_data produces, with a euro-heavy footer"""
+    subtotal = 300 + (i % 20) * 25
+    tax = round(subtotal * 0.19, 2)
+    return {
+        'client_name': f'Client {i} Ltd',
+        'client_address_2': f'Office {i % 40}, Makarios Avenue',
+        'client_address_3': '1076 Nicosia, Cyprus',
+        'client_address_4': '',
+        'vat_number': f'{10000000 + i}X',
+        'invoice_number': f'#{i + 1}',
+        'date_issued': datetime.now().strftime('%d %B, %Y'),
+        'description': 'Content Creation',
+        'quantity': '1',
+        'month': datetime.now().strftime('%B'),
+        'total': f'{subtotal:.2f}',
+        'subtotal': f'{subtotal:.2f}',
+        'tax': f'{tax:.2f}',
+        'total_amount': f'{subtotal + tax:.2f}',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes per invoice under each PDF profile')
+    parser.add_argument('--invoices', type=int, default=20)
+    parser.add_argument('--logo', default=os.path.join(ROOT, 'image.jpg'))
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    from invoice_generator import PDF_PROFILES, create_invoice_pdf
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='velvet-pdf-') as workdir:
+        for name in PDF_PROFILES:
+            # First render pays for font registration and logo processing
+            create_invoice_pdf(sample_invoice(0), os.path.join(workdir, 'warmup.pdf'), args.logo, profile=name)
+
+            sizes = []
+            started = time.perf_counter()
+            for i in range(args.invoices):
+                path = os.path.join(workdir, f'{name}_{i}.pdf')
+                create_invoice_pdf(sample_invoice(i), path, args.logo, profile=name)
+                sizes.append(os.path.getsize(path))
+            elapsed = time.perf_counter() - started
+
+            results[name] = {
+                'bytes_per_invoice': round(sum(sizes) / len(sizes)),
+                'ms_per_invoice': round(elapsed / args.invoices * 1000, 1),
+                'seven_year_mb_per_100_monthly': round(sum(sizes) / len(sizes) * 100 * 12 * 7 / 1e6, 1),
+            }
+
+    legacy = results.get('legacy', {}).get('bytes_per_invoice')
+    print(f"   {'profile':<14}{'bytes/invoice':>15}{'vs legacy':>12}{'ms/invoice':>12}{'7y MB @100/mo':>16}")
+    for name, row in results.items():
+        ratio = f"{legacy / row['bytes_per_invoice']:.1f}x" if legacy else '-'
+        print(f"   {name:<14}{row['bytes_per_invoice']:>15,}{ratio:>12}{row['ms_per_invoice']:>12}"
+              f"{row['seven_year_mb_per_100_monthly']:>16}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Benchmark the invoice pipeline stage by stage.
+
+Generates synthetic workbooks with the Anainvoices.xlsx column layout and
+times each stage separately: Excel load, row normalization, logo processing,
+PDF rendering, database insert, ZIP and email MIME building. Results are
+written as JSON so runs can be compared and regressions caught.
+
+Usage:
+    python benchmarks/bench_pipeline.py --rows 10 1000 100000
+    python benchmarks/bench_pipeline.py --postgres-url postgresql://localhost/velvet_bench
+    python benchmarks/bench_pipeline.py --compare bench_results/baseline.json
+
+Each backend runs in its own subprocess and temporary working directory, so
+the local invoices.db is never touched. Benchmark rows written to Postgres
+use a BENCH- invoice number prefix and are deleted afterwards.
+"""
+import argparse
+import json
+import io
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COLUMNS = ['Issued to', 'VAT Number', 'Invoice No:', 'Date Issued:', 'Description',
+           'Quantity', 'Month', 'Total', 'Subtotal', 'Tax(19%)', 'Total.1']
+
+# Fail --compare when a stage's per-item time grows by more than this
+DEFAULT_THRESHOLD = 0.20
+
+# Stages faster than this are too noisy to flag as regressions
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def make_workbook(path, rows):
+    """Write a synthetic workbook with the production column layout"""
+    import pandas as pd
+
+    records = []
+    for i in range(rows):
+        subtotal = 300 + (i % 20) * 25
+        tax = round(subtotal * 0.19, 2)
+        records.append({
+            'Issued to': f"Client {i} Ltd\nOffice {i % 40}, Makarios Avenue\n1076 Nicosia, Cyprus",
+            'VAT Number': f"{10000000 + i}X",
+            'Invoice No:': f'#{i + 1}',
+            'Date Issued:': datetime.now().strftime('%d %B, %Y'),
+            'Description': 'Content Creation',
+            'Quantity': 1,
+            'Month': datetime.now().strftime('%B'),
+            'Total': subtotal,
+            'Subtotal': subtotal,
+            'Tax(19%)': tax,
+            'Total.1': subtotal + tax,
+        })
+    pd.DataFrame(records, columns=COLUMNS).to_excel(path, index=False)
+
+
+def timed(results, rows, stage, items, func):
+    """Run func once and record its duration"""
+    started = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - started
+    results.append({
+        'rows': rows,
+        'stage': stage,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'per_item_ms': round(seconds * 1000 / max(items, 1), 4),
+    })
+    print(f"   {rows:>7} rows  {stage:<24} {seconds:9.3f}s  ({items} items)")
+    return value
+
+
+def run_stages(rows_list, render_limit, workdir):
+    """Time every stage for each workbook size (runs inside the backend subprocess)"""
+    import pandas as pd
+    import database
+    from invoice_generator import (
+        build_invoice_data,
+        create_invoice_pdf,
+        invoice_pdf_filename,
+        remove_white_background,
+        write_invoices_email,
+        zip_invoices
+    )
+
+    database.ensure_schema()
+    logo_path = os.path.join(ROOT, 'image.jpg')
+    results = []
+    invoice_date = datetime.now().strftime('%d %B, %Y')
+    month = datetime.now().strftime('%B')
+
+    for rows in rows_list:
+        excel_path = os.path.join(workdir, f'bench_{rows}.xlsx')
+        output_folder = os.path.join(workdir, f'pdfs_{rows}')
+        os.makedirs(output_folder, exist_ok=True)
+        make_workbook(excel_path, rows)
+
+        df = timed(results, rows, 'excel_load', rows, lambda: pd.read_excel(excel_path))
+
+        invoices = timed(results, rows, 'normalize', rows, lambda: [
+            build_invoice_data(row, f'BENCH-{rows}-{index}', invoice_date, month)
+            for index, row in df.iterrows()
+        ])
+
+        logo_out = os.path.join(workdir, 'logo.png')
+        timed(results, rows, 'remove_white_background', 1,
+              lambda: remove_white_background(logo_path, logo_out))
+
+        # Rendering is the slowest stage - cap it so 100k-row runs stay practical
+        to_render = invoices[:render_limit]
+        pdf_files = [invoice_pdf_filename(output_folder, data, month, index)
+                     for index, data in enumerate(to_render)]
+
+        def render():
+            for data, pdf_file in zip(to_render, pdf_files):
+                create_invoice_pdf(data, pdf_file, logo_path)
+
+        timed(results, rows, 'create_invoice_pdf', len(to_render), render)
+
+        for data in invoices:
+            data['invoice_number'] = data['invoice_number'].replace('#', '')
+        timed(results, rows, 'add_invoice', rows, lambda: [database.add_invoice(data) for data in invoices])
+        database.delete_invoices([data['invoice_number'] for data in invoices])
+
+        zip_path = os.path.join(workdir, f'bench_{rows}.zip')
+        timed(results, rows, 'zip', len(pdf_files), lambda: zip_invoices(pdf_files, zip_path))
+
+        config = {'sender_email': 'bench@example.com', 'sender_password': ''}
+        timed(results, rows, 'email_mime', len(pdf_files),
+              lambda: write_invoices_email(io.BytesIO(), pdf_files, 'bench@example.com', month, config))
+
+    return results
+
+
+def run_backend(backend, rows_list, render_limit, postgres_url=None):
+    """Run the stages in a subprocess for one database backend"""
+    env = dict(os.environ)
+    env.pop('DATABASE_URL', None)
+    if backend == 'postgres':
+        env['DATABASE_URL'] = postgres_url
+
+    with tempfile.TemporaryDirectory(prefix='velvet-bench-') as workdir:
+        out_file = os.path.join(workdir, 'results.json')
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', out_file,
+               '--render-limit', str(render_limit), '--rows', *map(str, rows_list)]
+        print(f"\n=== {backend} ===")
+        # The worker's stdout carries the per-invoice prints - keep only our summary lines
+        proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+        for line in proc.stdout.splitlines():
+            if line.startswith('   ') and 'rows' in line:
+                print(line)
+        if proc.returncode != 0:
+            print(proc.stderr)
+            raise SystemExit(f"{backend} benchmark failed")
+        with open(out_file) as f:
+            results = json.load(f)
+
+    for result in results:
+        result['backend'] = backend
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline, threshold):
+    """Print per-stage changes against a baseline run, return the regressions"""
+    base = {(r['backend'], r['rows'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n=== Compared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}) ===")
+    for result in current['results']:
+        old = base.get((result['backend'], result['rows'], result['stage']))
+        if not old or not old['per_item_ms']:
+            continue
+        change = result['per_item_ms'] / old['per_item_ms'] - 1
+        regressed = change > threshold and result['seconds'] >= NOISE_FLOOR_SECONDS
+        flag = '⚠️ ' if regressed else '  '
+        print(f"{flag}{result['backend']:<9} {result['rows']:>7} {result['stage']:<24} "
+              f"{old['per_item_ms']:10.4f} -> {result['per_item_ms']:10.4f} ms/item ({change:+.0%})")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the invoice pipeline')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--render-limit', type=int, default=200,
+                        help='render at most this many PDFs per workbook size')
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCH_POSTGRES_URL'),
+                        help='also run against this Postgres database')
+    parser.add_argument('--output', help='result file (default bench_results/<timestamp>.json)')
+    parser.add_argument('--compare', help='baseline result file to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_stages(args.rows, args.render_limit, os.getcwd())
+        with open(args.worker, 'w') as f:
+            json.dump(results, f)
+        return
+
+    results = run_backend('sqlite', args.rows, args.render_limit)
+    if args.postgres_url:
+        results += run_backend('postgres', args.rows, args.render_limit, args.postgres_url)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': args.rows,
+            'render_limit': args.render_limit,
+        },
+        'results': results,
+    }
+
+    output = args.output or os.path.join(ROOT, 'bench_results',
+                                         f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            raise SystemExit(f"❌ {len(regressions)} stage(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
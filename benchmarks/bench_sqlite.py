@@ -0,0 +1,132 @@
+"""Read and write throughput of the SQLite backend, plain against tuned.
+
+Runs the same workload twice, each time in a fresh interpreter on a scratch
+database: SQLITE_TUNED=0 (rollback journal, synchronous=FULL, a new
+connection per call) and SQLITE_TUNED=1 (WAL, synchronous=NORMAL, page
+cache, mmap and a reused connection per thread). The workload is:
+
+- single-thread lookups (get_invoice_by_number) and status updates
+  (update_invoice_statuses, one transaction each);
+- then --processes worker processes, half updating and half reading, for
+  --duration seconds, like gunicorn workers. Calls that fail, e.g.
+  'database is locked', are counted as errors.
+
+Usage:
+    python benchmarks/bench_sqlite.py [--invoices 20000] [--ops 2000] [--processes 4] [--duration 5]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+
+def per_second(fn, count):
+    started = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return round(count / (time.perf_counter() - started))
+
+
+def worker(role, invoices, duration, results):
+    from database import get_invoice_by_number, update_invoice_statuses
+
+    done = errors = 0
+    stop = time.monotonic() + duration
+    i = os.getpid()
+    while time.monotonic() < stop:
+        i += 7919
+        number = f'#{i % invoices + 1}'
+        try:
+            if role == 'write':
+                update_invoice_statuses([(number, ('pending', 'paid', 'overdue')[i % 3], None)])
+            elif get_invoice_by_number(number) is None:
+                # get_invoice_by_number logs and swallows database errors
+                raise RuntimeError(number)
+            done += 1
+        except Exception:
+            errors += 1
+    results.put((role, done, errors))
+
+
+def run(args):
+    """Fill a scratch database and measure; called in a child interpreter per mode"""
+    with tempfile.TemporaryDirectory(prefix='velvet-sqlite-') as workdir:
+        os.chdir(workdir)
+        from bench_invoice_index import fill
+        from database import get_invoice_by_number, update_invoice_statuses
+
+        fill(args.invoices)
+        result = {
+            'reads_per_s': per_second(lambda i: get_invoice_by_number(f'#{i % args.invoices + 1}'), args.ops),
+            'writes_per_s': per_second(
+                lambda i: update_invoice_statuses([(f'#{i % args.invoices + 1}', 'paid', None)]), args.ops),
+        }
+
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=('write' if n % 2 == 0 else 'read', args.invoices,
+                                                          args.duration, results))
+                     for n in range(args.processes)]
+        for process in processes:
+            process.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in processes:
+            role, done, errors = results.get()
+            totals[role][0] += done
+            totals[role][1] += errors
+        for process in processes:
+            process.join()
+
+        result['concurrent'] = {
+            'reads_per_s': round(totals['read'][0] / args.duration),
+            'writes_per_s': round(totals['write'][0] / args.duration),
+            'read_errors': totals['read'][1],
+            'write_errors': totals['write'][1],
+        }
+        os.chdir(ROOT)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite plain vs tuned throughput')
+    parser.add_argument('--invoices', type=int, default=20000)
+    parser.add_argument('--ops', type=int, default=2000, help='single-thread reads and writes per mode')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--mode', choices=['plain', 'tuned'], help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='write results as JSON')
+    args = parser.parse_args()
+
+    if args.mode:
+        return run(args)
+
+    results = {}
+    for mode, tuned in (('plain', '0'), ('tuned', '1')):
+        env = dict(os.environ, SQLITE_TUNED=tuned, LOG_LEVEL='ERROR')
+        env.pop('DATABASE_URL', None)
+        child = subprocess.run([sys.executable, __file__, '--mode', mode] + sys.argv[1:],
+                               env=env, capture_output=True, text=True, check=True)
+        results[mode] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    print(f"   {'':<8}{'reads/s':>10}{'writes/s':>10}   concurrent ({args.processes} processes)"
+          f"{'reads/s':>10}{'writes/s':>10}{'errors':>8}")
+    for mode, row in results.items():
+        both = row['concurrent']
+        print(f"   {mode:<8}{row['reads_per_s']:>10,}{row['writes_per_s']:>10,}{'':>34}"
+              f"{both['reads_per_s']:>10,}{both['writes_per_s']:>10,}{both['read_errors'] + both['write_errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'invoices': args.invoices, 'processes': args.processes, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Cache for the dashboard's computed fragments, invalidated by writes.
+
+Entries live in namespaces ('invoices', 'excel', 'config'). Every write
+that changes a namespace bumps its generation, and cache keys include the
+generation, so a stale entry can never be served after a write.
+
+By default generations and entries live in an in-process LRU. Set
+CACHE_BACKEND=sqlite (and optionally CACHE_PATH) to share them through a
+small SQLite file, so a write handled by one gunicorn worker invalidates the
+fragments cached by every other worker. database.ensure_schema() registers
+the invalidation in every process that writes invoices; CACHE_TTL is only a
+safety net for writes made outside the app's code.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from database import on_write
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_PATH = os.environ.get('CACHE_PATH', 'cache.db')
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 256))
+
+
+class MemoryBackend:
+    """Generations and entries held by this process only"""
+
+    def __init__(self):
+        self.generations = {}
+
+    def generation(self, namespace):
+        return self.generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        self.generations[namespace] = self.generations.get(namespace, 0) + 1
+
+    def load(self, key):
+        return None
+
+    def store(self, key, value, expires):
+        pass
+
+
+class SQLiteBackend:
+    """Generations and entries shared by every process using the same file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS generations (namespace TEXT PRIMARY KEY, gen INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def generation(self, namespace):
+        row = self._conn().execute('SELECT gen FROM generations WHERE namespace = ?', (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace):
+        conn = self._conn()
+        conn.execute('''
+            INSERT INTO generations (namespace, gen) VALUES (?, 1)
+            ON CONFLICT (namespace) DO UPDATE SET gen = gen + 1
+        ''', (namespace,))
+        # Entries of older generations can never be read again
+        conn.execute('DELETE FROM entries WHERE key LIKE ? OR expires < ?', (f'{namespace}:%', time.time()))
+
+    def load(self, key):
+        row = self._conn().execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row and row[1] > time.time():
+            return row
+        return None
+
+    def store(self, key, value, expires):
+        self._conn().execute('INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)',
+                             (key, pickle.dumps(value), expires))
+
+
+def _make_backend():
+    if CACHE_BACKEND == 'sqlite':
+        try:
+            return SQLiteBackend(CACHE_PATH)
+        except sqlite3.Error as e:
+            logger.warning("Shared cache unavailable (%s), using in-process cache", e)
+    return MemoryBackend()
+
+
+_backend = _make_backend()
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _lookup(namespace, key):
+    """(full key, (value,) on a hit or None)"""
+    full_key = f'{namespace}:{_backend.generation(namespace)}:{key}'
+
+    with _lock:
+        hit = _entries.get(full_key)
+        if hit and hit[0] > time.time():
+            _entries.move_to_end(full_key)
+            return full_key, (hit[1],)
+
+    shared = _backend.load(full_key)
+    if shared:
+        value, expires = pickle.loads(shared[0]), shared[1]
+        _remember(full_key, value, expires)
+        return full_key, (value,)
+    return full_key, None
+
+
+def _remember(full_key, value, expires):
+    with _lock:
+        _entries[full_key] = (expires, value)
+        _entries.move_to_end(full_key)
+        while len(_entries) > CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def get_or_compute(namespace, key, compute, ttl=CACHE_TTL):
+    """Return the cached value for key in namespace, computing it on a miss"""
+    full_key, hit = _lookup(namespace, key)
+    if hit:
+        return hit[0]
+
+    value, expires = compute(), time.time() + ttl
+    _backend.store(full_key, value, expires)
+    _remember(full_key, value, expires)
+    return value
+
+
+async def get_or_compute_async(namespace, key, compute, ttl=CACHE_TTL):
+    """get_or_compute for a coroutine function compute (the ASGI endpoints)"""
+    full_key, hit = _lookup(namespace, key)
+    if hit:
+        return hit[0]
+
+    value, expires = await compute(), time.time() + ttl
+    _backend.store(full_key, value, expires)
+    _remember(full_key, value, expires)
+    return value
+
+
+def invalidate(*namespaces):
+    """Drop every cached fragment in the given namespaces"""
+    with _lock:
+        for namespace in namespaces:
+            _backend.bump(namespace)
+            prefix = f'{namespace}:'
+            for key in [k for k in _entries if k.startswith(prefix)]:
+                del _entries[key]
+
+
+_listening = False
+
+
+def listen_for_writes():
+    """Invalidate 'invoices' after every invoice write committed by this process
+
+    Any write changes stats and the invoice list. Called by
+    database.ensure_schema(), which every entry point runs first.
+    """
+    global _listening
+    with _lock:
+        if _listening:
+            return
+        _listening = True
+    on_write(lambda event: invalidate('invoices'))
@@ -0,0 +1,207 @@
+"""Streaming export of the invoice ledger as CSV, NDJSON or Excel.
+
+Rows come from database.iter_ledger a batch at a time and each writer turns
+them into chunks of at most EXPORT_CHUNK_BYTES as it goes, so an export of a
+million invoices holds one batch in memory and its first bytes leave as soon
+as the first batch is read.
+
+The .xlsx writer does not use openpyxl, which can only save a finished
+workbook: it writes the few fixed parts of a one-sheet workbook and the
+sheet XML straight into a zip stream (zip64, data descriptors), with text as
+inline strings and dates and amounts as formatted numbers.
+"""
+import csv
+import io
+import json
+import os
+import re
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+
+from database import LEDGER_COLUMNS, VALID_STATUSES, iter_ledger
+
+EXPORT_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', 64 * 1024))
+
+# Ledger columns as exported: amounts in euros
+EXPORT_COLUMNS = ['invoice_number', 'issue_date', 'due_date', 'period', 'client_name', 'vat_number',
+                  'amount', 'tax', 'total', 'status', 'payment_date']
+_AMOUNTS = {LEDGER_COLUMNS.index(name) for name in ('amount_cents', 'tax_cents', 'total_cents')}
+_DATES = {LEDGER_COLUMNS.index(name) for name in ('issue_date', 'due_date', 'payment_date')}
+
+# Format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def ledger_filters(args):
+    """start / end (YYYY-MM-DD issue dates), status and client from a request args mapping
+
+    Raises ValueError for a malformed date or unknown status.
+    """
+    filters = {name: (args.get(name) or '').strip() or None for name in ('start', 'end', 'status', 'client')}
+    for name in ('start', 'end'):
+        if filters[name]:
+            filters[name] = date.fromisoformat(filters[name]).isoformat()
+    if filters['status'] and filters['status'] not in VALID_STATUSES:
+        raise ValueError(f"Unknown status: {filters['status']}")
+    return filters
+
+
+def _euros(cents):
+    return f'{int(cents or 0) / 100:.2f}'
+
+
+def iter_csv(rows):
+    """CSV text chunks: header, then one line per ledger row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_euros(value) if i in _AMOUNTS else value for i, value in enumerate(row)])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    """NDJSON text chunks: one object per ledger row, amounts as numbers"""
+    lines, size = [], 0
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        for i in _AMOUNTS:
+            record[EXPORT_COLUMNS[i]] = round(int(row[i] or 0) / 100, 2)
+        line = json.dumps(record, default=str) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(lines)
+            lines, size = [], 0
+    yield ''.join(lines)
+
+
+_XLSX_PARTS = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/workbook.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Invoices" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>',
+    # Cell style 1: built-in date format 14, style 2: built-in #,##0.00
+    'xl/styles.xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>',
+}
+
+_EXCEL_EPOCH = date(1899, 12, 30).toordinal()
+
+# Characters XML 1.0 does not allow even escaped - one in a client name would make Excel reject the file
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+class _Chunks:
+    """Write-only file object that hands back what was written since the last take()"""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def _text_cell(value):
+    return f'<c t="inlineStr"><is><t>{escape(_XML_ILLEGAL.sub("", str(value)))}</t></is></c>'
+
+
+def _xlsx_cell(i, value):
+    if value is None or value == '':
+        return '<c/>'
+    if i in _AMOUNTS:
+        return f'<c s="2"><v>{int(value) / 100:.2f}</v></c>'
+    if i in _DATES:
+        try:
+            return f'<c s="1"><v>{date.fromisoformat(str(value)[:10]).toordinal() - _EXCEL_EPOCH}</v></c>'
+        except ValueError:
+            pass
+    return _text_cell(value)
+
+
+def iter_xlsx(rows):
+    """.xlsx bytes chunks: a one-sheet workbook with a header row and one row per ledger row"""
+    out = _Chunks()
+    # out has no tell(), so zipfile streams: sizes go in data descriptors after each member
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, xml in _XLSX_PARTS.items():
+            workbook.writestr(name, xml)
+        # Deflate holds sheet data back until it has a block - send the fixed parts now
+        yield out.take()
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                         '<row>' + ''.join(_text_cell(name) for name in EXPORT_COLUMNS) + '</row>').encode())
+            for row in rows:
+                sheet.write(('<row>' + ''.join(_xlsx_cell(i, value) for i, value in enumerate(row)) +
+                             '</row>').encode())
+                if out.size >= EXPORT_CHUNK_BYTES:
+                    yield out.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield out.take()
+
+
+WRITERS = {'csv': iter_csv, 'ndjson': iter_ndjson, 'xlsx': iter_xlsx}
+
+
+def stream_ledger(fmt, filters=None):
+    """Chunks (str for csv/ndjson, bytes for xlsx) of the filtered ledger in format fmt"""
+    return WRITERS[fmt](iter_ledger(**(filters or {})))
@@ -0,0 +1,138 @@
+"""The 'generate' job: turn the workbook into one batch of invoices.
+
+The dashboard and velvet.py both submit it with jobs.submit, so a run
+started from cron queues behind one started from the dashboard (and the
+other way round) and runs on whichever node claims it.
+
+Payload keys, all optional:
+    send_email    email the PDFs once published (queue mode: once rendered)
+    profile       run under cProfile and return the profile id
+    template      invoice template name
+    pdf_profile   key of invoice_generator.PDF_PROFILES
+    workers       render processes
+    incremental   skip rows whose client already has an invoice this month
+    render_mode   'inline' or 'queue', default RENDER_MODE
+    package       'zip' or 'merged' - also store the batch as one file
+    excel, logo   workbook key and logo path, default EXCEL_FILE / LOGO_PATH
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import jobs
+import storage
+from batches import batch_folder, generation_lock, new_batch_id, staged_batch
+from database import enqueue_render_batch
+from invoice_generator import (PDF_PROFILE, create_invoice_pdf, create_invoices_pdf, load_email_settings,
+                               process_invoices, send_invoices_email, zip_invoices)
+from profiling import run_profiled
+
+EXCEL_FILE = 'Anainvoices.xlsx'
+LOGO_PATH = 'image.jpg'
+OUTPUT_FOLDER = 'generated_invoices'
+
+# 'inline' renders PDFs in the job, 'queue' leaves them to worker.py processes
+RENDER_MODE = os.environ.get('RENDER_MODE', 'inline')
+
+
+def _render_one(task):
+    data, path, logo_path, profile = task
+    create_invoice_pdf(data, path, logo_path, profile)
+    return path
+
+
+def render_parallel(tasks, workers):
+    """Render (data, path, logo_path, profile) tasks in worker processes"""
+    if workers <= 1:
+        return [_render_one(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Several invoices per round trip keeps the pickling overhead small
+        return list(pool.map(_render_one, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+
+@jobs.handler('generate')
+def run_generation(payload):
+    """Generate every invoice in the workbook as one batch"""
+    send_email = payload.get('send_email', False)
+    email_settings = load_email_settings() if send_email else None
+    queued = payload.get('render_mode', RENDER_MODE) == 'queue'
+    pdf_profile = payload.get('pdf_profile')
+    workers = payload.get('workers', 1)
+    kwargs = {'only_new': payload.get('incremental', False)}
+
+    # The workbook with the new invoice numbers is stored back once the batch is rendered or queued
+    with generation_lock(OUTPUT_FOLDER), storage.checkout(payload.get('excel', EXCEL_FILE)) as excel_path:
+        if queued:
+            # Rows and numbers are written here - worker.py renders and publishes the batch
+            batch_id = new_batch_id()
+            publish_folder = batch_folder(OUTPUT_FOLDER, batch_id)
+            tasks = []
+
+            def queue_render(invoice_data, path, logo_path):
+                # Resolved here: workers on other nodes may have another PDF_PROFILE default
+                tasks.append((f'{publish_folder}/{os.path.basename(path)}',
+                              {'invoice': invoice_data, 'logo_path': logo_path,
+                               'pdf_profile': pdf_profile or PDF_PROFILE}))
+
+            pdf_files, profile_id = _generate_into(payload, excel_path, publish_folder, email_settings,
+                                                   render=queue_render, **kwargs)
+            if tasks:
+                enqueue_render_batch(batch_id, OUTPUT_FOLDER, tasks, send_email=send_email)
+        else:
+            invoices = []
+
+            def render_all(items):
+                invoices.extend(item[0] for item in items)
+                render_parallel([item + (pdf_profile,) for item in items], workers)
+
+            # Render into a fresh batch folder that replaces the current one only when complete
+            with staged_batch(OUTPUT_FOLDER) as (staging, publish_folder):
+                pdf_files, profile_id = _generate_into(payload, excel_path, staging, email_settings,
+                                                       publish_folder=publish_folder, render_all=render_all, **kwargs)
+
+    result = {'generated': len(pdf_files), 'batch': publish_folder, 'profile_id': profile_id}
+    if queued:
+        result['render_batch'] = batch_id if pdf_files else None
+        return result
+    if not pdf_files:
+        return result
+
+    # Published PDFs may live in remote storage
+    with storage.local_copies(list(dict.fromkeys(pdf_files))) as local_files:
+        if payload.get('package'):
+            result['package'] = _package(local_files, invoices, payload['package'], publish_folder,
+                                         payload.get('logo', LOGO_PATH), pdf_profile)
+        if send_email and email_settings:
+            today = datetime.now()
+            month_year = f"{today.strftime('%B')} {today.year}"
+            send_invoices_email(local_files, email_settings['recipient_email'], month_year, email_settings)
+            result['emailed_to'] = email_settings['recipient_email']
+    return result
+
+
+def _generate_into(payload, excel_path, output_folder, email_settings, **kwargs):
+    """Run process_invoices (profiled when asked), return (pdf paths, profile id or None)"""
+    generate_args = (excel_path, output_folder, payload.get('logo', LOGO_PATH), email_settings)
+    kwargs['template'] = payload.get('template', 'classic')
+    if payload.get('profile'):
+        return run_profiled('generate', process_invoices, *generate_args, **kwargs)
+    return process_invoices(*generate_args, **kwargs), None
+
+
+def _package(pdf_files, invoices, package, folder, logo_path, profile):
+    """Store the batch as one ZIP or merged PDF, return its storage key
+
+    Packages live outside the batch folder, so the merged PDF is not listed
+    (or zipped) as one more invoice.
+    """
+    name = f"Invoices_{datetime.now().strftime('%Y%m%d')}.{'zip' if package == 'zip' else 'pdf'}"
+    key = f'{OUTPUT_FOLDER}/packages/{os.path.basename(folder)}/{name}'
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, name)
+        if package == 'zip':
+            zip_invoices(pdf_files, path)
+        else:
+            create_invoices_pdf(invoices, path, logo_path, profile)
+        storage.put_file(key, path)
+    return key
@@ -1,21 +1,27 @@
-from database import add_invoice
-import pandas as pd
+from storage import atomic_path
+from database import add_invoices, allocate_invoice_numbers, get_invoiced_clients, release_invoice_numbers
+from logs import get_logger, get_row_logger
+from metrics import stage_timer
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.colors import HexColor
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from PIL import Image
 import os
+import base64
+import email.policy
 import smtplib
+import tempfile
+import uuid
+import zipfile
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
+
+logger = get_logger(__name__)
+row_logger = get_row_logger(__name__)
 
 
 def remove_white_background(logo_path, output_path="temp_logo_transparent.png"):
     """Remove white background from logo"""
+    from PIL import Image
+
     try:
         img = Image.open(logo_path)
         img = img.convert('RGBA')
@@ -33,47 +39,188 @@ def remove_white_background(logo_path, output_path="temp_logo_transparent.png"):
         img.save(output_path, "PNG")
         return True
     except Exception as e:
-        print(f"Error processing logo: {e}")
+        logger.error("Error processing logo: %s", e)
         return False
 
 
-def create_invoice_pdf(data, output_path, logo_path="image.jpg"):
+# Output profiles - benchmarks/bench_pdf_profiles.py reports bytes per invoice under each
+#   legacy:   ReportLab defaults (base-14 Helvetica, full-size transparent logo)
+#   compact:  logo downsampled to logo_dpi and flattened to JPEG, base-14 fonts
+#   embedded: compact with an embedded subset TTF font, so the euro sign and
+#             non-Latin client names render the same in every viewer
+#   metadata: embedded with no transparency, PDF 1.4, a document language and
+#             title/subject/author. This is NOT PDF/A: there is no XMP packet and
+#             no ICC output intent, so it will not pass a PDF/A validator
+PDF_PROFILES = {
+    'legacy': {'compress': True, 'embed_font': False, 'logo_dpi': None, 'logo_format': 'png', 'metadata': False},
+    'uncompressed': {'compress': False, 'embed_font': False, 'logo_dpi': None, 'logo_format': 'png',
+                     'metadata': False},
+    'compact': {'compress': True, 'embed_font': False, 'logo_dpi': 150, 'logo_format': 'jpeg',
+                'jpeg_quality': 85, 'metadata': False},
+    'embedded': {'compress': True, 'embed_font': True, 'logo_dpi': 150, 'logo_format': 'jpeg',
+                 'jpeg_quality': 85, 'metadata': False},
+    'metadata': {'compress': True, 'embed_font': True, 'logo_dpi': 150, 'logo_format': 'jpeg',
+                 'jpeg_quality': 85, 'metadata': True},
+}
+PDF_PROFILE = os.environ.get('PDF_PROFILE', 'legacy')
+
+# TTF fonts tried in order; ReportLab embeds only the glyphs used (subsetting)
+PDF_FONT_CANDIDATES = [
+    (os.environ.get('PDF_FONT', ''), os.environ.get('PDF_FONT_BOLD', '')),
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/Library/Fonts/Arial Unicode.ttf', '/Library/Fonts/Arial Bold.ttf'),
+    ('C:/Windows/Fonts/arial.ttf', 'C:/Windows/Fonts/arialbd.ttf'),
+]
+
+CREAM = '#F5F2E8'
+
+EMAIL_CONFIG_FILE = 'email_config.json'
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1').lower() not in ('0', 'false', 'no')
+# Attachment bytes read (and base64 lines sent) per step, and the size past
+# which the outgoing message spills from memory to a temp file
+EMAIL_CHUNK_BYTES = int(os.environ.get('EMAIL_CHUNK_BYTES', 57 * 1024))
+EMAIL_SPOOL_BYTES = int(os.environ.get('EMAIL_SPOOL_BYTES', 1024 * 1024))
+
+LOGO_BOTTOM_WIDTH = 220
+LOGO_BOTTOM_HEIGHT = 195
+
+_fonts = {}
+_logos = {}
+_logo_dir = None
+
+
+def _pdf_fonts(embed):
+    """(regular, bold) font names for the canvas, registering the TTF pair once"""
+    if not embed:
+        return 'Helvetica', 'Helvetica-Bold'
+    if 'embedded' not in _fonts:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        import reportlab
+
+        # Bitstream Vera ships with ReportLab, so there is always a fallback
+        vera = os.path.join(os.path.dirname(reportlab.__file__), 'fonts')
+        candidates = PDF_FONT_CANDIDATES + [(os.path.join(vera, 'Vera.ttf'), os.path.join(vera, 'VeraBd.ttf'))]
+        regular, bold = next((pair for pair in candidates if all(pair) and all(map(os.path.exists, pair))))
+
+        pdfmetrics.registerFont(TTFont('InvoiceSans', regular))
+        pdfmetrics.registerFont(TTFont('InvoiceSans-Bold', bold))
+        _fonts['embedded'] = ('InvoiceSans', 'InvoiceSans-Bold')
+        logger.info("Embedding fonts %s / %s", regular, bold)
+    return _fonts['embedded']
+
+
+def prepare_logo(logo_path, profile):
+    """Path of the logo processed for a profile, built once per process and logo version"""
+    from PIL import Image
+    import tempfile
+    global _logo_dir
+
+    key = (os.path.abspath(logo_path), os.stat(logo_path).st_mtime_ns, profile['logo_dpi'],
+           profile['logo_format'], profile.get('jpeg_quality'))
+    cached = _logos.get(key)
+    if cached and os.path.exists(cached):
+        return cached
+
+    if _logo_dir is None:
+        _logo_dir = tempfile.mkdtemp(prefix='velvet-logo-')
+    output_path = os.path.join(_logo_dir, f'logo_{len(_logos)}.png')
+    if not remove_white_background(logo_path, output_path):
+        return logo_path
+
+    img = Image.open(output_path)
+    if profile['logo_dpi']:
+        # No point storing more pixels than the printed size needs
+        scale = min(1.0, LOGO_BOTTOM_WIDTH / 72 * profile['logo_dpi'] / img.width,
+                    LOGO_BOTTOM_HEIGHT / 72 * profile['logo_dpi'] / img.height)
+        if scale < 1.0:
+            img = img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+
+    if profile['logo_format'] == 'jpeg':
+        # JPEG has no alpha - flatten onto the page colour so it looks the same
+        flat = Image.new('RGB', img.size, CREAM)
+        flat.paste(img, mask=img.split()[3])
+        output_path = output_path[:-4] + '.jpg'
+        flat.save(output_path, 'JPEG', quality=profile.get('jpeg_quality', 85), optimize=True)
+    else:
+        img.save(output_path, 'PNG', optimize=True)
+
+    _logos[key] = output_path
+    return output_path
+
+
+def create_invoice_pdf(data, output_path, logo_path="image.jpg", profile=None):
     """Create PDF invoice"""
-    LOGO_BOTTOM_WIDTH = 220
-    LOGO_BOTTOM_HEIGHT = 195
+    create_invoices_pdf([data], output_path, logo_path, profile)
+
+
+def create_invoices_pdf(invoices, output_path, logo_path="image.jpg", profile=None):
+    """Render invoices into one PDF, one page each (fonts and logo are stored once)"""
+    # Heavy imports stay out of module import so the web app boots fast
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    options = PDF_PROFILES[profile or PDF_PROFILE]
+    fonts = _pdf_fonts(options['embed_font'])
+
+    tagged = options['metadata']
+    c = canvas.Canvas(output_path, pagesize=A4, pageCompression=int(options['compress']),
+                      pdfVersion=(1, 4) if tagged else None, lang='en' if tagged else None)
+    if tagged:
+        first, last = invoices[0], invoices[-1]
+        if len(invoices) == 1:
+            c.setTitle(f"Invoice {first['invoice_number']}")
+            c.setSubject(f"Invoice {first['invoice_number']} for {first['client_name']}")
+        else:
+            c.setTitle(f"Invoices {first['invoice_number']}-{last['invoice_number']}")
+            c.setSubject(f"{len(invoices)} invoices for {first['month']}")
+        c.setAuthor("Velvet Lavender")
+        c.setCreator("Velvet Lavender Invoice Generator")
+
+    for data in invoices:
+        _draw_invoice(c, data, logo_path, options, fonts)
+        c.showPage()
+    c.save()
 
-    c = canvas.Canvas(output_path, pagesize=A4)
+
+def _draw_invoice(c, data, logo_path, options, fonts):
+    """Draw one invoice on the current page of canvas c"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.utils import ImageReader
+
+    font, font_bold = fonts
     width, height = A4
 
-    cream = HexColor('#F5F2E8')
+    cream = HexColor(CREAM)
     dark_brown = HexColor('#4A1E1E')
     burgundy = HexColor('#5C2E2E')
 
     c.setFillColor(cream)
     c.rect(0, 0, width, height, fill=1, stroke=0)
 
-    temp_logo = "temp_logo_transparent.png"
-    logo_processed = remove_white_background(logo_path, temp_logo)
-
     # Company details
     c.setFillColor(dark_brown)
-    c.setFont("Helvetica-Bold", 14)
+    c.setFont(font_bold, 14)
     c.drawString(40, height - 40, "VELVET LAVENDER")
-    c.setFont("Helvetica", 9)
+    c.setFont(font, 9)
     c.drawString(40, height - 55, "Oriadon 12, Strovolos, 2037")
     c.drawString(40, height - 68, "Nicosia, Cyprus")
 
     # Title
-    c.setFont("Helvetica-Bold", 36)
+    c.setFont(font_bold, 36)
     title = "I N V O I C E"
-    title_width = c.stringWidth(title, "Helvetica-Bold", 36)
+    title_width = c.stringWidth(title, font_bold, 36)
     c.drawString((width - title_width) / 2, height - 140, title)
 
     # Client info
     left_x, right_x, y_start = 40, 380, height - 200
-    c.setFont("Helvetica-Bold", 10)
+    c.setFont(font_bold, 10)
     c.drawString(left_x, y_start, "Issued to:")
-    c.setFont("Helvetica", 10)
+    c.setFont(font, 10)
     y = y_start - 15
     c.drawString(left_x, y, data['client_name'])
     y -= 13
@@ -87,9 +234,9 @@ def create_invoice_pdf(data, output_path, logo_path="image.jpg"):
         c.drawString(left_x, y, data['client_address_4'])
 
     # Invoice details
-    c.setFont("Helvetica-Bold", 10)
+    c.setFont(font_bold, 10)
     c.drawString(right_x, y_start, "Issued by:")
-    c.setFont("Helvetica", 9)
+    c.setFont(font, 9)
     y = y_start - 15
     c.drawString(right_x, y, "Velvet Lavender")
     y -= 13
@@ -104,14 +251,14 @@ def create_invoice_pdf(data, output_path, logo_path="image.jpg"):
     c.setFillColor(burgundy)
     c.rect(40, table_y, width - 80, 30, fill=1, stroke=0)
     c.setFillColor(cream)
-    c.setFont("Helvetica-Bold", 11)
+    c.setFont(font_bold, 11)
     c.drawString(50, table_y + 10, "Description")
     c.drawCentredString(330, table_y + 10, "Quantity")
     c.drawCentredString(420, table_y + 10, "Month")
     c.drawRightString(width - 50, table_y + 10, "Total")
 
     c.setFillColor(dark_brown)
-    c.setFont("Helvetica", 10)
+    c.setFont(font, 10)
     row_y = table_y - 22
     c.drawString(50, row_y, data['description'])
     c.drawCentredString(330, row_y, str(data['quantity']))
@@ -124,9 +271,9 @@ def create_invoice_pdf(data, output_path, logo_path="image.jpg"):
 
     # Footer
     footer_y = 280
-    c.setFont("Helvetica-Bold", 11)
+    c.setFont(font_bold, 11)
     c.drawString(40, footer_y, "PAYMENT INFO")
-    c.setFont("Helvetica", 8)
+    c.setFont(font, 8)
     payment_y = footer_y - 15
     c.drawString(40, payment_y, "Alpha Bank Cy Ltd.")
     payment_y -= 12
@@ -140,7 +287,7 @@ def create_invoice_pdf(data, output_path, logo_path="image.jpg"):
 
     # Totals
     totals_x, totals_y = width - 50, footer_y
-    c.setFont("Helvetica", 11)
+    c.setFont(font, 11)
     c.drawRightString(totals_x, totals_y, f"Subtotal: €{data['subtotal']}")
     totals_y -= 20
     c.drawRightString(totals_x, totals_y, f"Tax (19%): €{data['tax']}")
@@ -148,35 +295,49 @@ def create_invoice_pdf(data, output_path, logo_path="image.jpg"):
     c.setStrokeColor(dark_brown)
     c.line(totals_x - 120, totals_y, totals_x, totals_y)
     totals_y -= 15
-    c.setFont("Helvetica-Bold", 13)
+    c.setFont(font_bold, 13)
     c.drawRightString(totals_x, totals_y, f"TOTAL: €{data['total_amount']}")
 
     # Logo
     try:
-        if logo_processed and os.path.exists(temp_logo):
-            logo_bottom = ImageReader(temp_logo)
-        else:
-            logo_bottom = ImageReader(logo_path)
+        logo_bottom = ImageReader(prepare_logo(logo_path, options))
         c.drawImage(logo_bottom, (width - LOGO_BOTTOM_WIDTH) / 2, 20,
                     width=LOGO_BOTTOM_WIDTH, height=LOGO_BOTTOM_HEIGHT,
-                    preserveAspectRatio=True, mask='auto')
+                    preserveAspectRatio=True, mask=None if options['logo_format'] == 'jpeg' else 'auto')
     except:
         pass
 
-    c.save()
-    if os.path.exists(temp_logo):
-        try:
-            os.remove(temp_logo)
-        except:
-            pass
 
 
-def send_invoices_email(pdf_files, recipient_email, invoice_month, email_config):
-    """Send invoices via email"""
-    msg = MIMEMultipart()
+def load_email_settings():
+    """Email settings saved from the dashboard, or None when not configured"""
+    import json
+    import storage
+
+    try:
+        settings = json.loads(storage.get_bytes(EMAIL_CONFIG_FILE))
+    except (FileNotFoundError, ValueError):
+        return None
+    return settings if settings.get('configured') and settings.get('sender_email') else None
+
+
+def _email_headers(msg):
+    return b''.join(email.policy.SMTP.fold_binary(name, value) for name, value in msg.items())
+
+
+def write_invoices_email(out, pdf_files, recipient_email, invoice_month, email_config):
+    """Write the MIME message carrying all invoice PDFs to binary file out, with CRLF line endings
+
+    Headers and the text part come from the email package; each PDF is read
+    and base64-encoded EMAIL_CHUNK_BYTES at a time, so memory use does not
+    depend on the number or size of the attachments.
+    """
+    boundary = f'===============velvet{uuid.uuid4().hex}=='
+    msg = MIMEMultipart(boundary=boundary)
     msg['From'] = email_config['sender_email']
     msg['To'] = recipient_email
     msg['Subject'] = f"Velvet Lavender Invoices - {invoice_month}"
+    out.write(_email_headers(msg) + b'\r\n')
 
     body = f"""
 Hello,
@@ -188,29 +349,151 @@ Total invoices: {len(pdf_files)}
 Best regards,
 Velvet Lavender
     """
-    msg.attach(MIMEText(body, 'plain'))
+    out.write(f'--{boundary}\r\n'.encode() + MIMEText(body, 'plain').as_bytes(policy=email.policy.SMTP))
 
+    # A multiple of 57 bytes encodes to whole 76-character base64 lines
+    chunk_size = max(EMAIL_CHUNK_BYTES // 57, 1) * 57
     for pdf_file in pdf_files:
+        part = MIMEBase('application', 'octet-stream')
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', f'attachment; filename= {os.path.basename(pdf_file)}')
+        out.write(f'\r\n--{boundary}\r\n'.encode() + _email_headers(part) + b'\r\n')
         with open(pdf_file, 'rb') as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename= {os.path.basename(pdf_file)}')
-            msg.attach(part)
+            while chunk := attachment.read(chunk_size):
+                out.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+    out.write(f'\r\n--{boundary}--\r\n'.encode())
+
+
+def _send_message_file(server, sender, recipients, message):
+    """One SMTP transaction for the message in binary file message, sent in chunks"""
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(sender)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, response, sender)
+    for recipient in recipients:
+        code, response = server.rcpt(recipient)
+        if code not in (250, 251):
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, response)})
+
+    code, response = server.docmd('data')
+    if code != 354:
+        raise smtplib.SMTPDataError(code, response)
+    lines, size = [], 0
+    for line in message:
+        # Dot-stuffing (RFC 5321 4.5.2) - base64 lines never start with a dot
+        if line.startswith(b'.'):
+            line = b'.' + line
+        lines.append(line)
+        size += len(line)
+        if size >= EMAIL_CHUNK_BYTES:
+            server.send(b''.join(lines))
+            lines, size = [], 0
+    lines.append(b'.\r\n')
+    server.send(b''.join(lines))
+    code, response = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+
+
+def send_invoices_email(pdf_files, recipient_email, invoice_month, email_config):
+    """Send invoices via email
+
+    The message is written to a spooled temp file (moved to disk past
+    EMAIL_SPOOL_BYTES) and streamed to the server from there, never held
+    whole in memory.
+    """
+    with stage_timer('email'), tempfile.SpooledTemporaryFile(max_size=EMAIL_SPOOL_BYTES) as message:
+        write_invoices_email(message, pdf_files, recipient_email, invoice_month, email_config)
+        message.seek(0)
+
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+        try:
+            if SMTP_STARTTLS:
+                server.starttls()
+            if email_config.get('sender_password'):
+                server.login(email_config['sender_email'], email_config['sender_password'])
+            _send_message_file(server, email_config['sender_email'], [recipient_email], message)
+        finally:
+            server.quit()
+
+
+def zip_invoices(pdf_files, zip_path):
+    """Write the given PDFs into a ZIP archive"""
+    with zipfile.ZipFile(zip_path, 'w') as zipf:
+        for pdf_file in pdf_files:
+            zipf.write(pdf_file, os.path.basename(pdf_file))
+    return zip_path
+
+
+def next_invoice_number(df):
+    """Highest invoice number in the sheet plus one"""
+    max_invoice_num = 0
+    for index, row in df.iterrows():
+        current_invoice = str(row['Invoice No:']).replace('#', '')
+        invoice_num = int(current_invoice) if current_invoice.isdigit() else 0
+        if invoice_num > max_invoice_num:
+            max_invoice_num = invoice_num
+    return max_invoice_num + 1
+
+
+def build_invoice_data(row, invoice_number, invoice_date, current_month):
+    """Turn one Excel row into the dict used by the PDF renderer and the database"""
+    client_lines = row['Issued to'].split('\n')
+
+    return {
+        'client_name': client_lines[0] if len(client_lines) > 0 else "",
+        'client_address_2': client_lines[1] if len(client_lines) > 1 else "",
+        'client_address_3': client_lines[2] if len(client_lines) > 2 else "",
+        'client_address_4': client_lines[3] if len(client_lines) > 3 else "",
+        'vat_number': str(row['VAT Number']),
+        'invoice_number': f'#{invoice_number}',
+        'date_issued': invoice_date,
+        'description': str(row['Description']),
+        'quantity': str(row['Quantity']),
+        'month': current_month,
+        'total': str(row['Total']),
+        'subtotal': str(row['Subtotal']),
+        'tax': str(row['Tax(19%)']),
+        'total_amount': str(row['Total.1'])
+    }
 
-    server = smtplib.SMTP('smtp.gmail.com', 587)
-    server.starttls()
-    server.login(email_config['sender_email'], email_config['sender_password'])
-    server.sendmail(email_config['sender_email'], recipient_email, msg.as_string())
-    server.quit()
 
+def invoice_pdf_filename(output_folder, invoice_data, current_month, current_year):
+    """Output path for an invoice PDF"""
+    client_name_clean = invoice_data['client_name'].replace(' ', '_').replace('.', '').replace(',', '')
+    return f"{output_folder}/Invoice_{client_name_clean}_{current_month}_{current_year}.pdf"
+
+
+def process_invoices(excel_file, output_folder, logo_path, email_config=None, template='classic',
+                     publish_folder=None, render=None, only_new=False, render_all=None):
+    """Main processing function with template selection - FIXED VERSION
+
+    PDFs are rendered into output_folder. When that is a staging folder,
+    publish_folder is where they will live once published - the returned and
+    stored paths point there. render(invoice_data, path, logo_path) replaces
+    the PDF renderer, e.g. to queue the invoice for worker.py instead, and
+    render_all(items) renders the whole list of (invoice_data, path,
+    logo_path) at once, e.g. in worker processes.
+    With only_new, rows whose client already has an invoice this month are
+    left as they are. Raises validation.WorkbookInvalid before doing anything
+    when the workbook has errors.
+
+    Every PDF is rendered before anything is stored: the invoice rows are
+    written in one transaction and the workbook afterwards, so a failed
+    render leaves neither rows without PDFs nor renumbered rows behind.
+    """
+    import pandas as pd
+    from validation import check_workbook
 
-def process_invoices(excel_file, output_folder, logo_path, email_config=None, template='classic'):
-    """Main processing function with template selection - FIXED VERSION"""
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    df = pd.read_excel(excel_file)
+    with stage_timer('excel_io'):
+        df = pd.read_excel(excel_file)
+
+    # Reject a bad workbook before any number is allocated or PDF rendered
+    with stage_timer('validate'):
+        check_workbook(df)
     today = datetime.now()
     invoice_date = today.strftime('%d %B, %Y')
     current_month = today.strftime('%B')
@@ -220,30 +503,33 @@ def process_invoices(excel_file, output_folder, logo_path, email_config=None, te
 
     # Select template function
     template_functions = {
-        'classic': create_invoice_pdf,
-        'modern': create_invoice_modern,
-        'dark': create_invoice_dark
+        'classic': create_invoice_pdf
     }
 
-    create_pdf = template_functions.get(template, create_invoice_pdf)
+    create_pdf = render or template_functions.get(template, create_invoice_pdf)
 
-    # FIXED: Find the HIGHEST invoice number across ALL rows
-    max_invoice_num = 0
-    for index, row in df.iterrows():
-        current_invoice = str(row['Invoice No:']).replace('#', '')
-        invoice_num = int(current_invoice) if current_invoice.isdigit() else 0
-        if invoice_num > max_invoice_num:
-            max_invoice_num = invoice_num
+    pending = list(df.index)
+    if only_new:
+        invoiced = get_invoiced_clients(today.strftime('%Y-%m'))
+        pending = [index for index in pending if df.at[index, 'Issued to'].split('\n')[0] not in invoiced]
+        logger.info("%d of %d row(s) not invoiced yet this month", len(pending), len(df))
 
-    # Start incrementing from the highest number
-    next_invoice_num = max_invoice_num + 1
+    if not pending:
+        logger.info("No rows to generate")
+        return generated_pdfs
 
-    print(f"\n=== Generating Invoices ===")
-    print(f"Highest existing invoice: #{max_invoice_num}")
-    print(f"Starting from: #{next_invoice_num}")
-    print(f"Total invoices to generate: {len(df)}\n")
+    # Reserve the whole block in the database so concurrent runs never share
+    # numbers. The sheet's highest number is a floor for legacy workbooks
+    # numbered before the counter existed.
+    highest_in_sheet = next_invoice_number(df) - 1
+    first_invoice_num = next_invoice_num = allocate_invoice_numbers(len(pending), floor=highest_in_sheet)
 
-    for index, row in df.iterrows():
+    logger.info("Generating %d invoice(s) as #%d-#%d (highest in sheet #%d)",
+                len(pending), next_invoice_num, next_invoice_num + len(pending) - 1, highest_in_sheet)
+
+    invoices = []
+    renders = []
+    for index, row in df.loc[pending].iterrows():
         # Use the sequential counter, not the row's current number
         new_invoice_num = next_invoice_num
         next_invoice_num += 1  # Increment for next row
@@ -253,38 +539,37 @@ def process_invoices(excel_file, output_folder, logo_path, email_config=None, te
         df.at[index, 'Date Issued:'] = invoice_date
         df.at[index, 'Month'] = current_month
 
-        client_lines = row['Issued to'].split('\n')
-
-        invoice_data = {
-            'client_name': client_lines[0] if len(client_lines) > 0 else "",
-            'client_address_2': client_lines[1] if len(client_lines) > 1 else "",
-            'client_address_3': client_lines[2] if len(client_lines) > 2 else "",
-            'client_address_4': client_lines[3] if len(client_lines) > 3 else "",
-            'vat_number': str(row['VAT Number']),
-            'invoice_number': f'#{new_invoice_num}',
-            'date_issued': invoice_date,
-            'description': str(row['Description']),
-            'quantity': str(row['Quantity']),
-            'month': current_month,
-            'total': str(row['Total']),
-            'subtotal': str(row['Subtotal']),
-            'tax': str(row['Tax(19%)']),
-            'total_amount': str(row['Total.1'])
-        }
-
-        client_name_clean = invoice_data['client_name'].replace(' ', '_').replace('.', '').replace(',', '')
-        pdf_filename = f"{output_folder}/Invoice_{client_name_clean}_{current_month}_{current_year}.pdf"
-
-        print(f"Generating #{new_invoice_num} for {invoice_data['client_name']}")
-        create_pdf(invoice_data, pdf_filename, logo_path)
+        invoice_data = build_invoice_data(row, new_invoice_num, invoice_date, current_month)
+        render_path = invoice_pdf_filename(output_folder, invoice_data, current_month, current_year)
+        pdf_filename = invoice_pdf_filename(publish_folder or output_folder, invoice_data,
+                                            current_month, current_year)
+
+        row_logger.info("Generating #%d for %s", new_invoice_num, invoice_data['client_name'])
+        renders.append((invoice_data, render_path, logo_path))
 
-        # Save to database
         invoice_data['pdf_filename'] = pdf_filename
         invoice_data['template'] = template
-        add_invoice(invoice_data)
-
+        invoices.append(invoice_data)
         generated_pdfs.append(pdf_filename)
 
-    df.to_excel(excel_file, index=False)
-    print(f"\n✅ Generated {len(generated_pdfs)} invoices\n")
+    try:
+        with stage_timer('render'):
+            if render_all:
+                render_all(renders)
+            else:
+                for item in renders:
+                    create_pdf(*item)
+
+        # Save to database
+        with stage_timer('db_write'):
+            add_invoices(invoices)
+    except BaseException:
+        # Nothing was stored - let the next run use these numbers again
+        release_invoice_numbers(first_invoice_num, len(pending))
+        raise
+
+    # Readers of the workbook see either the old or the new file, never a partial one
+    with stage_timer('excel_io'), atomic_path(excel_file) as tmp_path:
+        df.to_excel(tmp_path, index=False)
+    logger.info("Generated %d invoices", len(generated_pdfs))
     return generated_pdfs
\ No newline at end of file
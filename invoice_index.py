@@ -0,0 +1,152 @@
+"""Compact in-process read model of the invoice list.
+
+The invoices page shows eight invoice columns. Instead of turning every row
+into a full 20-column dict on each request, each worker keeps one
+InvoiceRecord per invoice - __slots__, amounts as integer cents, repeated
+strings (client, dates, status, month) shared - and listing, filtering by
+status, search and sorting run over those records without touching the
+database.
+
+The index loads once per process, then follows the invoice change feed: at
+most every INVOICE_INDEX_REFRESH seconds, and on the next read after a write
+made by this process, it reads the rows written and the tombstones of the
+invoices deleted after the last change_seq it has applied.
+"""
+import os
+import sys
+import threading
+import time
+
+from database import get_invoice_index_changes, invoice_number_value, on_write
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+INVOICE_INDEX_REFRESH = float(os.environ.get('INVOICE_INDEX_REFRESH', 2))
+
+
+def _shared(value):
+    """One string object for every record holding the same text"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _number_key(invoice_number):
+    value = invoice_number_value(invoice_number)
+    return -1 if value is None else value
+
+
+class InvoiceRecord:
+    """One invoice as the list page shows it"""
+
+    __slots__ = ('id', 'invoice_number', 'client_name', 'total_cents', 'issue_date', 'issue_date_iso',
+                 'month', 'status', 'payment_date', 'pdf_filename')
+
+    def __init__(self, row):
+        self.id = row[0]
+        self.invoice_number = row[1]
+        self.client_name = _shared(row[2])
+        self.total_cents = int(row[3] or 0)
+        self.issue_date = _shared(row[4])
+        self.issue_date_iso = _shared(row[5])
+        self.month = _shared(row[6])
+        self.status = _shared(row[7] or 'pending')
+        self.payment_date = _shared(row[8])
+        self.pdf_filename = row[9]
+
+    @property
+    def total_amount(self):
+        return f'{self.total_cents / 100:.2f}'
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_dict(self):
+        """JSON-ready dict of the listed fields"""
+        invoice = dict(zip(self.__slots__, self.values()))
+        invoice['total_amount'] = self.total_cents / 100
+        return invoice
+
+
+# Sort name -> (key, newest/largest first)
+SORTS = {
+    'newest': (lambda record: record.id, True),
+    'number': (lambda record: _number_key(record.invoice_number), True),
+    'client': (lambda record: record.client_name.lower(), False),
+    'amount': (lambda record: record.total_cents, True),
+    'issue_date': (lambda record: record.issue_date_iso or '', True),
+}
+
+
+class InvoiceIndex:
+    """Every invoice of the database as InvoiceRecords, kept current incrementally"""
+
+    def __init__(self):
+        self.records = {}
+        self.sorted = {}
+        self.cursor = 0
+        self.loaded = False
+        self.stale = False
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def mark_stale(self):
+        self.stale = True
+
+    def refresh(self):
+        """Apply the changes made since the last refresh, if a write happened or the interval passed"""
+        if self.loaded and not self.stale and time.monotonic() - self.checked_at < INVOICE_INDEX_REFRESH:
+            return
+
+        with self.lock:
+            if self.loaded and not self.stale and time.monotonic() - self.checked_at < INVOICE_INDEX_REFRESH:
+                return
+            # Cleared before reading, so a write committed meanwhile marks the index again
+            self.stale = False
+            self.checked_at = time.monotonic()
+
+            rows, deleted, self.cursor = get_invoice_index_changes(self.cursor)
+            changed = bool(deleted)
+            for row in rows:
+                record = InvoiceRecord(row)
+                current = self.records.get(record.id)
+                if current is None or current.values() != record.values():
+                    self.records[record.id] = record
+                    changed = True
+            for invoice_id in deleted:
+                self.records.pop(invoice_id, None)
+
+            if changed:
+                self.sorted = {}
+            if not self.loaded:
+                self.loaded = True
+                logger.info("Invoice index loaded: %d invoice(s)", len(self.records))
+
+    def select(self, status=None, search=None, sort='newest'):
+        """Records matching status and search, in sort order"""
+        with self.lock:
+            ordered = self.sorted.get(sort)
+            if ordered is None:
+                key, reverse = SORTS[sort]
+                ordered = self.sorted[sort] = sorted(self.records.values(), key=key, reverse=reverse)
+
+        if status:
+            ordered = [record for record in ordered if record.status == status]
+        if search:
+            search = search.lower()
+            ordered = [record for record in ordered
+                       if search in record.invoice_number.lower() or search in record.client_name.lower()]
+        return ordered
+
+
+_index = InvoiceIndex()
+
+# Writes made by this process show up on the very next read
+on_write(lambda event: _index.mark_stale())
+
+
+def list_invoices(limit=None, offset=0, status=None, search=None, sort='newest'):
+    """(one page of InvoiceRecords, number matching) - filtered and sorted in memory"""
+    _index.refresh()
+    matching = _index.select(status, search, sort)
+    end = offset + limit if limit else None
+    return matching[offset:end], len(matching)
@@ -0,0 +1,87 @@
+"""Run whole-batch jobs (invoice generation) on whichever app node claims them.
+
+Jobs are rows in the jobs table. Nodes claim queued jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, and a partial unique index allows at most
+one running job of each kind across all nodes. The node that submits a job
+runs it straight away when it can. Otherwise the job stays queued and the
+node that finishes the running job picks it up before returning.
+exclusive() takes the same slot for work done inline, e.g. replacing the
+workbook that generation reads and rewrites.
+"""
+import os
+import socket
+from contextlib import contextmanager
+
+from database import claim_job, enqueue_job, finish_job, get_job, start_job
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+NODE_NAME = os.environ.get('NODE_NAME') or f'{socket.gethostname()}:{os.getpid()}'
+
+_handlers = {}
+
+
+class JobRunning(Exception):
+    """Another node is running a job of this kind"""
+
+
+def handler(kind):
+    """Register the function that runs jobs of kind: payload dict -> result dict"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def _run(job):
+    try:
+        result = _handlers[job['kind']](job['payload'] or {})
+    except Exception as e:
+        logger.exception("Job %d (%s) failed on %s", job['id'], job['kind'], NODE_NAME)
+        finish_job(job['id'], error=str(e))
+    else:
+        finish_job(job['id'], result=result)
+        logger.info("Job %d (%s) done on %s", job['id'], job['kind'], NODE_NAME)
+
+
+def drain(kind):
+    """Run queued jobs of kind until none is left or another node takes over"""
+    while True:
+        job = claim_job(kind, NODE_NAME)
+        if job is None:
+            return
+        _run(job)
+
+
+def submit(kind, payload=None):
+    """Queue a job, run it here if no other node is busy with this kind, return its row"""
+    job_id = enqueue_job(kind, payload)
+    job = claim_job(kind, NODE_NAME, job_id)
+    if job is None:
+        logger.info("Job %d (%s) queued behind a running one", job_id, kind)
+        return get_job(job_id)
+
+    _run(job)
+    # Jobs submitted by other nodes while this one was running
+    drain(kind)
+    return get_job(job_id)
+
+
+@contextmanager
+def exclusive(kind, payload=None):
+    """Run the block as a job of kind, so no job of that kind runs meanwhile on any node
+
+    Raises JobRunning when one already runs. Jobs queued behind the block
+    are run afterwards, as submit does.
+    """
+    job_id = start_job(kind, NODE_NAME, payload)
+    if job_id is None:
+        raise JobRunning(f'A {kind} job is running')
+    try:
+        yield
+    except BaseException as e:
+        finish_job(job_id, error=str(e) or type(e).__name__)
+        raise
+    finish_job(job_id, result={})
+    drain(kind)
@@ -0,0 +1,70 @@
+"""Logging setup shared by the app, the pipeline and the batch jobs.
+
+LOG_LEVEL sets the level (default INFO). Per-invoice messages go through
+get_row_logger(), which passes at most ROW_LOG_BURST lines per
+ROW_LOG_WINDOW seconds and then reports how many were suppressed.
+"""
+import logging
+import os
+import threading
+import time
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+ROW_LOG_BURST = int(os.environ.get('ROW_LOG_BURST', 20))
+ROW_LOG_WINDOW = float(os.environ.get('ROW_LOG_WINDOW', 10))
+
+_configured = False
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through `burst` records per `window` seconds, then summarize the rest"""
+
+    def __init__(self, burst=ROW_LOG_BURST, window=ROW_LOG_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.window_start = 0.0
+        self.passed = 0
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.window_start >= self.window:
+                if self.suppressed:
+                    record.msg = f"{record.msg} ({self.suppressed} similar messages suppressed)"
+                self.window_start = now
+                self.passed = 0
+                self.suppressed = 0
+
+            if self.passed < self.burst:
+                self.passed += 1
+                return True
+            self.suppressed += 1
+            return False
+
+
+def _configure():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL, logging.INFO),
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+
+
+def get_logger(name):
+    """Module logger with the shared configuration applied"""
+    _configure()
+    return logging.getLogger(name)
+
+
+def get_row_logger(name):
+    """Rate-limited logger for per-invoice messages"""
+    logger = get_logger(f'{name}.rows')
+    if not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter())
+    return logger
@@ -0,0 +1,256 @@
+"""Database upkeep: indexes, planner statistics, retention and a size report.
+
+    python maintenance.py indexes                # create missing indexes
+    python maintenance.py optimize               # ANALYZE / VACUUM
+    python maintenance.py retention [--days 730] # archive old paid invoices
+    python maintenance.py report [--json]        # table / index sizes, slow queries
+    python maintenance.py all
+
+Every index the app relies on is listed in database.INDEXES; `indexes`
+compares that list with the database and creates what is missing - on
+Postgres with CREATE INDEX CONCURRENTLY, so writes are not blocked while it
+builds. `optimize` runs VACUUM (ANALYZE) on Postgres; on SQLite it runs
+ANALYZE and PRAGMA optimize, and VACUUM only once more than
+VACUUM_FREE_RATIO of the file is free pages.
+
+The scheduler runs `all` every MAINTENANCE_INTERVAL seconds. Retention is
+off unless INVOICE_RETENTION_DAYS is set (see database.archive_paid_invoices).
+"""
+import argparse
+import json
+import os
+import re
+from datetime import datetime
+
+import metrics
+from database import (
+    INDEXES,
+    INVOICE_RETENTION_DAYS,
+    USE_POSTGRES,
+    archive_paid_invoices,
+    ensure_schema,
+    get_connection,
+    record_job_run
+)
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+MAINTENANCE_INTERVAL = int(os.environ.get('MAINTENANCE_INTERVAL', 86400))
+# SQLite: VACUUM once this share of the file is free pages
+VACUUM_FREE_RATIO = float(os.environ.get('VACUUM_FREE_RATIO', 0.2))
+# Database functions slower than this on average are reported
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.1))
+
+_INDEX_NAME = re.compile(r'INDEX IF NOT EXISTS (\w+) ON (\w+)')
+
+
+def expected_indexes():
+    """{index name: (table, CREATE statement)} for every index in database.INDEXES"""
+    expected = {}
+    for statement in INDEXES:
+        name, table = _INDEX_NAME.search(statement).groups()
+        expected[name] = (table, statement)
+    return expected
+
+
+def existing_indexes(cursor):
+    """Names of the indexes in the database"""
+    if USE_POSTGRES:
+        cursor.execute('SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()')
+    else:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def ensure_indexes():
+    """Create every expected index that is missing, return the names created"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        missing = [(name, statement) for name, (_, statement) in expected_indexes().items()
+                   if name not in existing_indexes(cursor)]
+        if USE_POSTGRES:
+            # CONCURRENTLY cannot run inside a transaction block
+            conn.rollback()
+            conn.autocommit = True
+        for name, statement in missing:
+            if USE_POSTGRES:
+                statement = statement.replace(' INDEX IF NOT EXISTS', ' INDEX CONCURRENTLY IF NOT EXISTS')
+            logger.info("Creating missing index %s", name)
+            cursor.execute(statement)
+        if not USE_POSTGRES:
+            conn.commit()
+        return [name for name, _ in missing]
+    finally:
+        conn.close()
+
+
+def optimize():
+    """Refresh planner statistics and reclaim free space, return what was done"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        if USE_POSTGRES:
+            conn.autocommit = True
+            cursor.execute('VACUUM (ANALYZE)')
+            return ['VACUUM (ANALYZE)']
+
+        done = ['ANALYZE', 'PRAGMA optimize']
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+        conn.commit()
+
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA freelist_count')
+        free = cursor.fetchone()[0]
+        if pages and free / pages >= VACUUM_FREE_RATIO:
+            # Rewrites the whole file - only worth it once enough of it is empty
+            conn.isolation_level = None
+            cursor.execute('VACUUM')
+            done.append(f'VACUUM ({free} of {pages} pages free)')
+        return done
+    finally:
+        conn.close()
+
+
+def relation_sizes(cursor):
+    """Tables and indexes, largest first: {'name', 'kind', 'table', 'bytes', 'rows'}"""
+    if USE_POSTGRES:
+        cursor.execute('''
+            SELECT c.relname, c.relkind, COALESCE(t.relname, c.relname), pg_relation_size(c.oid), c.reltuples
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_index i ON i.indexrelid = c.oid
+            LEFT JOIN pg_class t ON t.oid = i.indrelid
+            WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'i')
+            ORDER BY pg_relation_size(c.oid) DESC
+        ''')
+        return [{'name': row[0], 'kind': 'index' if row[1] == 'i' else 'table', 'table': row[2],
+                 'bytes': int(row[3]), 'rows': max(int(row[4]), 0)} for row in cursor.fetchall()]
+
+    cursor.execute("SELECT name, type, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")
+    objects = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    rows = {}
+    try:
+        # Row estimates left by ANALYZE
+        cursor.execute('SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl')
+        rows = dict(cursor.fetchall())
+    except Exception:
+        pass
+    try:
+        cursor.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')
+        sizes = dict(cursor.fetchall())
+    except Exception:
+        # SQLite built without the dbstat table: only the file size is known
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return [{'name': 'database', 'kind': 'file', 'table': None, 'bytes': pages * cursor.fetchone()[0],
+                 'rows': None}]
+
+    result = []
+    for name, size in sizes.items():
+        kind, table = objects.get(name, ('table', name))
+        result.append({'name': name, 'kind': kind, 'table': table, 'bytes': int(size),
+                       'rows': rows.get(name) if kind == 'table' else None})
+    return sorted(result, key=lambda relation: relation['bytes'], reverse=True)
+
+
+def index_usage(cursor):
+    """{index name: scans since statistics were reset} - Postgres only, {} on SQLite"""
+    if not USE_POSTGRES:
+        return {}
+    cursor.execute('SELECT indexrelname, idx_scan FROM pg_stat_user_indexes')
+    return {row[0]: int(row[1]) for row in cursor.fetchall()}
+
+
+def slow_queries(cursor, limit=10):
+    """Slowest statements (pg_stat_statements) and database functions of this process (metrics)"""
+    slow = []
+    if USE_POSTGRES:
+        try:
+            cursor.execute('''
+                SELECT query, calls, mean_exec_time, total_exec_time FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                ORDER BY mean_exec_time DESC LIMIT %s
+            ''', (limit,))
+            slow = [{'source': 'pg_stat_statements', 'query': ' '.join(row[0].split()), 'calls': int(row[1]),
+                     'mean_ms': round(row[2], 2), 'total_ms': round(row[3], 1)} for row in cursor.fetchall()]
+        except Exception:
+            # Extension not installed
+            cursor.connection.rollback()
+
+    # Filled by db_timed when METRICS_ENABLED is set
+    for (function,), (_, total, count) in list(metrics.DB_QUERY_SECONDS.series.items()):
+        if count and total / count >= SLOW_QUERY_SECONDS:
+            slow.append({'source': 'db_timed', 'query': function, 'calls': count,
+                         'mean_ms': round(total / count * 1000, 2), 'total_ms': round(total * 1000, 1)})
+    return sorted(slow, key=lambda query: query['mean_ms'], reverse=True)[:limit]
+
+
+def report():
+    """Sizes, index health and slow queries as one dict"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        sizes = relation_sizes(cursor)
+        usage = index_usage(cursor)
+        present = existing_indexes(cursor)
+        return {
+            'backend': 'postgresql' if USE_POSTGRES else 'sqlite',
+            'relations': sizes,
+            'missing_indexes': sorted(set(expected_indexes()) - present),
+            'unused_indexes': sorted(name for name, scans in usage.items() if scans == 0),
+            'slow_queries': slow_queries(cursor),
+        }
+    finally:
+        conn.close()
+
+
+def run_maintenance(retention_days=INVOICE_RETENTION_DAYS):
+    """Indexes, retention, then statistics - recorded as one 'maintenance' job run"""
+    ensure_schema()
+    started_at = datetime.now()
+    created = ensure_indexes()
+    archived = archive_paid_invoices(retention_days)
+    done = optimize()
+    record_job_run('maintenance', started_at, archived, [f'index {name}' for name in created] + done)
+    return {'indexes_created': created, 'invoices_archived': archived, 'optimize': done}
+
+
+def _print_report(result):
+    print(f"📦 {result['backend']}")
+    for relation in result['relations']:
+        rows = f"{relation['rows']:>10,} rows" if relation['rows'] is not None else ''
+        print(f"   {relation['kind']:<6} {relation['name']:<44} {relation['bytes'] / 1024:>10,.0f} KB {rows}")
+    for label in ('missing_indexes', 'unused_indexes'):
+        if result[label]:
+            print(f"⚠️  {label.replace('_', ' ')}: {', '.join(result[label])}")
+    for query in result['slow_queries']:
+        print(f"🐢 {query['mean_ms']:>9} ms x{query['calls']:<7} {query['query'][:100]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Database maintenance')
+    parser.add_argument('task', choices=['indexes', 'optimize', 'retention', 'report', 'all'])
+    parser.add_argument('--days', type=int, default=INVOICE_RETENTION_DAYS,
+                        help='retention: archive invoices paid more than this many days ago')
+    parser.add_argument('--json', action='store_true', help='report: print JSON')
+    args = parser.parse_args()
+
+    ensure_schema()
+    if args.task == 'indexes':
+        print(f"🔧 {len(ensure_indexes())} missing index(es) created")
+    elif args.task == 'optimize':
+        print('🔧 ' + ', '.join(optimize()))
+    elif args.task == 'retention':
+        print(f"📦 {archive_paid_invoices(args.days)} invoice(s) archived")
+    elif args.task == 'report':
+        if args.json:
+            print(json.dumps(report(), indent=2))
+        else:
+            _print_report(report())
+    else:
+        print(json.dumps(run_maintenance(args.days), indent=2))
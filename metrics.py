@@ -0,0 +1,193 @@
+"""In-process timing metrics exposed in Prometheus text format.
+
+Enabled with METRICS_ENABLED=1. When disabled, stage_timer() hands back a
+shared no-op context manager and db_timed() returns the function unchanged,
+so instrumented code pays next to nothing.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Seconds - covers fast DB calls up to slow batch renders
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_NULL_TIMER = nullcontext()
+_lock = threading.Lock()
+_metrics = {}
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, *labels):
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = []
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le=bound)} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le="+Inf")} {count}')
+            lines.append(f'{self.name}_sum{base} {total:.6f}')
+            lines.append(f'{self.name}_count{base} {count}')
+        return lines
+
+
+class Gauge:
+    """Value that goes up and down, keyed by label values"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, amount=1, *labels):
+        with _lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def dec(self, amount=1, *labels):
+        self.inc(-amount, *labels)
+
+    def set(self, value, *labels):
+        with _lock:
+            self.series[labels] = value
+
+    def render(self):
+        return [f'{self.name}{_labels(self.label_names, labels)} {value}'
+                for labels, value in sorted(self.series.items())]
+
+
+class Counter(Gauge):
+    """Monotonic counter"""
+
+    kind = 'counter'
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _register(metric):
+    _metrics[metric.name] = metric
+    return metric
+
+
+STAGE_SECONDS = _register(Histogram(
+    'velvet_stage_duration_seconds', 'Pipeline stage duration (render, db_write, email, excel_io)', ('stage',)))
+DB_QUERY_SECONDS = _register(Histogram(
+    'velvet_db_query_duration_seconds', 'Database function latency', ('function',)))
+DB_CONNECTIONS_IN_USE = _register(Gauge(
+    'velvet_db_connections_in_use', 'Database connections currently checked out'))
+DB_ERRORS = _register(Counter(
+    'velvet_db_errors_total', 'Database functions that raised', ('function',)))
+HTTP_SECONDS = _register(Histogram(
+    'velvet_http_request_duration_seconds', 'Flask request latency', ('route', 'method', 'status')))
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+def stage_timer(stage):
+    """Context manager timing one pipeline stage"""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(STAGE_SECONDS, (stage,))
+
+
+def db_timed(func):
+    """Record latency and in-use connections for a database function"""
+    if not METRICS_ENABLED:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        DB_CONNECTIONS_IN_USE.inc()
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc(1, func.__name__)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, func.__name__)
+            DB_CONNECTIONS_IN_USE.dec()
+
+    return wrapper
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Time every Flask request and serve /metrics when metrics are enabled"""
+    if not METRICS_ENABLED:
+        return
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return app.response_class(render_prometheus(), mimetype='text/plain; version=0.0.4')
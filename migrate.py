@@ -0,0 +1,117 @@
+"""Backfill the normalized clients / invoice_items / cents / ISO date columns.
+
+Rows are converted in small batches, each in its own short transaction, so the
+invoices table is never locked for more than one batch at a time.
+
+Usage:
+    python migrate.py [--batch-size 500] [--pause 0.05]
+"""
+import argparse
+import time
+
+from database import (
+    get_connection,
+    init_db,
+    normalize_invoice,
+    upsert_client,
+    _q
+)
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+def backfill_batch(last_id, batch_size, client_ids):
+    """Convert one batch of rows after last_id, return (rows converted, new last_id)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(_q('''
+            SELECT id, client_name, client_address, amount, tax, total_amount,
+                   issue_date, due_date, month, year
+            FROM invoices
+            WHERE id > ? AND (total_cents IS NULL OR client_id IS NULL)
+            ORDER BY id
+            LIMIT ?
+        '''), (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            conn.rollback()
+            return 0, last_id
+
+        updates = []
+        items = []
+        for row in rows:
+            invoice_id, client_name = row[0], row[1]
+            normalized = normalize_invoice(row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9])
+
+            key = (client_name, '')
+            if key not in client_ids:
+                client_ids[key] = upsert_client(cursor, client_name, '', normalized['address_lines'])
+
+            updates.append((
+                client_ids[key],
+                normalized['amount_cents'],
+                normalized['tax_cents'],
+                normalized['total_cents'],
+                normalized['issue_date_iso'],
+                normalized['due_date_iso'],
+                normalized['period'],
+                invoice_id
+            ))
+            items.append((invoice_id, normalized['amount_cents'], normalized['amount_cents'],
+                          normalized['period'], invoice_id))
+
+        cursor.executemany(_q('''
+            UPDATE invoices
+            SET client_id = ?, amount_cents = ?, tax_cents = ?, total_cents = ?,
+                issue_date_iso = ?, due_date_iso = ?, period = ?
+            WHERE id = ?
+        '''), updates)
+
+        # Legacy rows never stored the line description - keep one item per invoice
+        cursor.executemany(_q('''
+            INSERT INTO invoice_items (invoice_id, position, quantity, unit_cents, line_total_cents, period)
+            SELECT ?, 1, 1, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM invoice_items WHERE invoice_id = ?)
+        '''), items)
+
+        conn.commit()
+        return len(rows), rows[-1][0]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def migrate(batch_size=500, pause=0.05):
+    """Create the new schema objects and backfill every legacy row"""
+    init_db()
+
+    client_ids = {}
+    last_id = 0
+    total = 0
+    started = time.perf_counter()
+
+    while True:
+        converted, last_id = backfill_batch(last_id, batch_size, client_ids)
+        if not converted:
+            break
+        total += converted
+        logger.info("Converted %d rows (up to id %d)", total, last_id)
+        # Give concurrent writers a chance between batches
+        time.sleep(pause)
+
+    logger.info("Migration finished: %d rows in %.1fs", total, time.perf_counter() - started)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill normalized invoice columns')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.05,
+                        help='seconds to sleep between batches')
+    args = parser.parse_args()
+    migrate(args.batch_size, args.pause)
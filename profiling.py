@@ -0,0 +1,110 @@
+"""Opt-in cProfile capture for invoice generation runs.
+
+Turned on per run from the /generate form or for every run with
+PROFILE_GENERATION=1. Each profiled run leaves two files in PROFILE_FOLDER:
+<job_id>.prof (load with pstats or snakeviz) and <job_id>.json with the run
+metadata and the top-N hotspots shown on the dashboard.
+"""
+import cProfile
+import json
+import os
+import pstats
+import time
+from datetime import datetime
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_GENERATION = os.environ.get('PROFILE_GENERATION', '').lower() in ('1', 'true', 'yes')
+PROFILE_FOLDER = os.environ.get('PROFILE_FOLDER', 'profiles')
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 15))
+
+# Keep only the most recent profiles on disk
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+
+
+def _function_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def summarize(profile, top_n=PROFILE_TOP_N):
+    """Top-N functions by cumulative time"""
+    stats = pstats.Stats(profile)
+    rows = []
+    for func, (cc, ncalls, tottime, cumtime, callers) in stats.stats.items():
+        rows.append({
+            'function': _function_label(func),
+            'calls': ncalls,
+            'own_seconds': round(tottime, 4),
+            'cumulative_seconds': round(cumtime, 4),
+        })
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return rows[:top_n]
+
+
+def run_profiled(label, func, *args, **kwargs):
+    """Run func under cProfile, store the profile and return (result, job_id)"""
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    job_id = f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    profile = cProfile.Profile()
+
+    started = time.perf_counter()
+    profile.enable()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profile.disable()
+        duration = time.perf_counter() - started
+
+        profile.dump_stats(os.path.join(PROFILE_FOLDER, f'{job_id}.prof'))
+        summary = {
+            'job_id': job_id,
+            'label': label,
+            'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_seconds': round(duration, 3),
+            'hotspots': summarize(profile),
+        }
+        with open(os.path.join(PROFILE_FOLDER, f'{job_id}.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        logger.info("Profile %s saved (%.2fs)", job_id, duration)
+        _prune()
+
+    return result, job_id
+
+
+def _prune():
+    """Delete all but the newest PROFILE_KEEP profiles"""
+    for job_id in list_profiles()[PROFILE_KEEP:]:
+        for ext in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(PROFILE_FOLDER, job_id + ext))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """Stored profile job ids, newest first"""
+    if not os.path.isdir(PROFILE_FOLDER):
+        return []
+    job_ids = [name[:-5] for name in os.listdir(PROFILE_FOLDER) if name.endswith('.json')]
+    return sorted(job_ids, key=lambda job_id: os.path.getmtime(os.path.join(PROFILE_FOLDER, job_id + '.json')),
+                  reverse=True)
+
+
+def load_summary(job_id):
+    """Summary dict of a stored profile, or None"""
+    path = os.path.join(PROFILE_FOLDER, f'{os.path.basename(job_id)}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def latest_summary():
+    """Summary of the most recent profiled run, or None"""
+    profiles = list_profiles()
+    return load_summary(profiles[0]) if profiles else None
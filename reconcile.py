@@ -0,0 +1,220 @@
+"""Match bank statement CSV lines to open invoices and mark them paid.
+
+Supports the Revolut account statement export and the Alpha Bank CSV export
+(comma or semicolon separated, English column names). Statements are read
+line by line and matched against hash indexes of the open invoices - by
+invoice number found in the description/reference, then by amount - so a
+run is linear in statement size plus open invoices.
+
+Usage:
+    python reconcile.py statement.csv [--dry-run]
+"""
+import argparse
+import csv
+import io
+import re
+from datetime import datetime
+
+from database import ensure_schema, get_open_invoices, update_invoice_statuses
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+# Column aliases per export shape
+REVOLUT_COLUMNS = {
+    'date': ['Completed Date', 'Started Date'],
+    'description': ['Description'],
+    'reference': ['Reference'],
+    'amount': ['Amount'],
+    'state': ['State'],
+}
+
+ALPHA_COLUMNS = {
+    'date': ['Value Date', 'Date', 'Transaction Date', 'Posting Date'],
+    'description': ['Description', 'Details', 'Narrative', 'Transaction Details'],
+    'reference': ['Reference', 'Payment Reference', 'Customer Reference'],
+    'amount': ['Amount'],
+    'credit': ['Credit', 'Credit Amount', 'Deposits'],
+}
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d.%m.%Y', '%d-%m-%Y')
+
+# Candidate invoice numbers in free text: "#123", "INV 123", "Invoice No: 123"
+NUMBER_PATTERN = re.compile(r'(?:#|\binv(?:oice)?\s*(?:no\.?|number)?[:\s]*)(\d{1,8})\b|\b(\d{1,8})\b',
+                            re.IGNORECASE)
+
+
+def _pick(row, names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value.strip()
+    return ''
+
+
+def _parse_amount(text):
+    """Parse '1,234.56', '1.234,56' or '-45.00' into integer cents"""
+    text = (text or '').replace('€', '').replace('EUR', '').replace(' ', '').strip()
+    if not text:
+        return None
+    if ',' in text and '.' in text:
+        # The right-most separator is the decimal point
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '.') if len(text.rsplit(',', 1)[1]) == 2 else text.replace(',', '')
+    try:
+        return int(round(float(text) * 100))
+    except ValueError:
+        return None
+
+
+def _parse_date(text):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def _invoice_key(invoice_number):
+    """Normalize '#0042' / '42' to the same lookup key"""
+    digits = ''.join(ch for ch in str(invoice_number) if ch.isdigit())
+    return digits.lstrip('0') or digits
+
+
+def read_statement(stream):
+    """Yield normalized incoming transactions from a statement CSV text stream"""
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.DictReader(stream, dialect=dialect)
+    headers = set(reader.fieldnames or [])
+    columns = REVOLUT_COLUMNS if {'Completed Date', 'State'} <= headers else ALPHA_COLUMNS
+
+    for line_no, row in enumerate(reader, start=2):
+        if columns is REVOLUT_COLUMNS and _pick(row, columns['state']).upper() not in ('', 'COMPLETED'):
+            continue
+
+        amount = _parse_amount(_pick(row, columns.get('credit', [])) or _pick(row, columns['amount']))
+        if amount is None or amount <= 0:
+            # Outgoing payments and fees never settle an invoice
+            continue
+
+        yield {
+            'line': line_no,
+            'date': _parse_date(_pick(row, columns['date'])),
+            'amount_cents': amount,
+            'description': _pick(row, columns['description']),
+            'reference': _pick(row, columns['reference']),
+        }
+
+
+class InvoiceMatcher:
+    """Hash indexes over open invoices for constant-time lookups per transaction"""
+
+    def __init__(self, open_invoices):
+        self.by_number = {}
+        self.by_amount = {}
+        for invoice_number, total_cents, client_name in open_invoices:
+            invoice = {'invoice_number': invoice_number, 'total_cents': total_cents,
+                       'client_name': client_name or ''}
+            self.by_number[_invoice_key(invoice_number)] = invoice
+            self.by_amount.setdefault(total_cents, []).append(invoice)
+        self.claimed = set()
+
+    def _claim(self, invoice):
+        self.claimed.add(invoice['invoice_number'])
+        return invoice
+
+    def match(self, txn):
+        """Return (invoice, rule) or (None, reason) for one transaction"""
+        text = f"{txn['reference']} {txn['description']}"
+
+        mismatch = None
+        for explicit, bare in NUMBER_PATTERN.findall(text):
+            invoice = self.by_number.get(_invoice_key(explicit or bare))
+            if not invoice or invoice['invoice_number'] in self.claimed:
+                continue
+            if invoice['total_cents'] == txn['amount_cents']:
+                return self._claim(invoice), 'invoice_number'
+            if explicit:
+                mismatch = invoice
+
+        candidates = [inv for inv in self.by_amount.get(txn['amount_cents'], [])
+                      if inv['invoice_number'] not in self.claimed]
+        if len(candidates) == 1:
+            return self._claim(candidates[0]), 'amount'
+        if len(candidates) > 1:
+            lowered = text.lower()
+            named = [inv for inv in candidates if inv['client_name'] and inv['client_name'].lower() in lowered]
+            if len(named) == 1:
+                return self._claim(named[0]), 'amount_and_client'
+            return None, f'{len(candidates)} open invoices with this amount'
+
+        if mismatch:
+            return None, f"mentions {mismatch['invoice_number']} but amount differs"
+        return None, 'no open invoice matches'
+
+
+def reconcile(stream, dry_run=False):
+    """Match a statement against open invoices and mark the matches paid"""
+    matcher = InvoiceMatcher(get_open_invoices())
+    matched, unmatched = [], []
+    transactions = 0
+
+    for txn in read_statement(stream):
+        transactions += 1
+        if txn['date'] is None:
+            # Marking an invoice paid needs the payment date
+            unmatched.append({'line': txn['line'], 'date': None, 'amount': txn['amount_cents'] / 100,
+                              'description': txn['description'], 'reason': 'unreadable date'})
+            continue
+        invoice, rule = matcher.match(txn)
+        if invoice:
+            matched.append({'line': txn['line'], 'invoice_number': invoice['invoice_number'],
+                            'amount': txn['amount_cents'] / 100, 'payment_date': txn['date'],
+                            'rule': rule})
+        else:
+            unmatched.append({'line': txn['line'], 'date': txn['date'], 'amount': txn['amount_cents'] / 100,
+                              'description': txn['description'], 'reason': rule})
+
+    summary = {'transactions': transactions, 'matched': matched, 'unmatched': unmatched,
+               'dry_run': dry_run, 'updated': 0}
+    if matched and not dry_run:
+        result = update_invoice_statuses([(m['invoice_number'], 'paid', m['payment_date']) for m in matched])
+        summary['updated'] = result['updated']
+
+    logger.info("Reconciled %d transaction(s): %d matched, %d unmatched",
+                transactions, len(matched), len(unmatched))
+    return summary
+
+
+def reconcile_upload(file_storage, dry_run=False):
+    """Reconcile an uploaded statement (werkzeug FileStorage) without saving it"""
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    try:
+        return reconcile(stream, dry_run)
+    finally:
+        stream.detach()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mark invoices paid from a bank statement CSV')
+    parser.add_argument('statement', help='Revolut or Alpha Bank CSV export')
+    parser.add_argument('--dry-run', action='store_true', help='match only, do not update invoices')
+    args = parser.parse_args()
+
+    ensure_schema()
+    with open(args.statement, encoding='utf-8-sig', newline='') as f:
+        result = reconcile(f, args.dry_run)
+
+    for line in result['unmatched']:
+        print(f"   line {line['line']}: {line['amount']:.2f} {line['description']!r} - {line['reason']}")
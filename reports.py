@@ -0,0 +1,286 @@
+"""Revenue, aging and days-to-pay reports built on the normalized invoice columns.
+
+Reports read the invoice_totals / invoice_day_totals rollups that triggers
+keep in step with the invoices table (see _create_rollups in database.py), so
+each one aggregates a few thousand summary rows however many invoices exist.
+Aging as of a past date replays the invoice_events log instead, since the
+rollups only know each invoice's current status. Results are cached for
+REPORT_CACHE_TTL seconds and dropped as soon as an invoice is written.
+
+Period filters (start, end) are YYYY-MM and as_of is YYYY-MM-DD; anything
+else raises ValueError, which the endpoints turn into a 400.
+"""
+import csv
+import io
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from database import ALL_INVOICE_EVENTS_SQL, ALL_INVOICES_SQL, STATUS_CODES, get_connection, on_write, _q
+
+REPORT_CACHE_TTL = float(os.environ.get('REPORT_CACHE_TTL', 30))
+# Reports take caller-supplied ranges, so the number of distinct keys is unbounded
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', 128))
+
+AGING_BUCKETS = ['0-30', '31-60', '61-90', '90+']
+DAYS_TO_PAY_BUCKETS = ['0-7', '8-14', '15-30', '31-60', '61-90', '90+']
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def invalidate(event=None):
+    """Drop every cached report"""
+    with _cache_lock:
+        _cache.clear()
+
+
+on_write(invalidate)
+
+
+def _cached(name, params, compute):
+    """Return a cached report result or compute and store it, keeping at most REPORT_CACHE_MAX_ENTRIES"""
+    key = (name, params)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+
+    result = compute()
+    with _cache_lock:
+        _cache.pop(key, None)
+        _cache[key] = (now + REPORT_CACHE_TTL, result)
+        if len(_cache) > REPORT_CACHE_MAX_ENTRIES:
+            for stale in [k for k, (expires, _) in _cache.items() if expires <= now]:
+                del _cache[stale]
+            # Still full: drop the oldest entries (dicts keep insertion order)
+            while len(_cache) > REPORT_CACHE_MAX_ENTRIES:
+                del _cache[next(iter(_cache))]
+    return result
+
+
+def _euros(cents):
+    """Format integer cents as a 2-decimal euro amount"""
+    return round(int(cents or 0) / 100, 2)
+
+
+def _fetch(query, params=()):
+    """Run a read-only report query and return all rows"""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(_q(query), params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+_PERIOD = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+
+def _check_periods(start, end):
+    """Raise ValueError unless start and end are empty or YYYY-MM"""
+    for name, value in (('start', start), ('end', end)):
+        if value and not _PERIOD.fullmatch(value):
+            raise ValueError(f'{name} must be a YYYY-MM month, got {value!r}')
+
+
+def _range_filter(column, start, end, extra=()):
+    """Build a WHERE clause for an optional [start, end] range plus fixed conditions"""
+    clauses, params = list(extra), []
+    if start:
+        clauses.append(f'{column} >= ?')
+        params.append(start)
+    if end:
+        clauses.append(f'{column} <= ?')
+        params.append(end)
+    where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    return where, tuple(params)
+
+
+def _revenue_row(label, count, invoiced, paid):
+    return {
+        **label,
+        'invoices': int(count),
+        'invoiced': _euros(invoiced),
+        'paid': _euros(paid),
+        'outstanding': _euros(int(invoiced or 0) - int(paid or 0)),
+    }
+
+
+def revenue_by_client(start=None, end=None):
+    """Invoiced / paid / outstanding totals per client, optionally for a period range"""
+    _check_periods(start, end)
+
+    def compute():
+        where, params = _range_filter('t.period', start, end)
+        rows = _fetch(f'''
+            SELECT c.id, c.name, c.vat_number, SUM(t.invoices),
+                   SUM(t.total_cents),
+                   SUM(CASE WHEN t.status = 'paid' THEN t.total_cents ELSE 0 END)
+            FROM invoice_totals t
+            JOIN clients c ON c.id = t.client_id
+            {where}
+            GROUP BY c.id, c.name, c.vat_number
+            HAVING SUM(t.invoices) > 0
+            ORDER BY SUM(t.total_cents) DESC
+        ''', params)
+        return [_revenue_row({'client_id': r[0], 'client': r[1], 'vat_number': r[2]}, r[3], r[4], r[5])
+                for r in rows]
+
+    return _cached('clients', (start, end), compute)
+
+
+def revenue_by_month(start=None, end=None):
+    """Invoiced / paid / outstanding totals per YYYY-MM period"""
+    _check_periods(start, end)
+
+    def compute():
+        where, params = _range_filter('period', start, end, ["period <> ''"])
+        rows = _fetch(f'''
+            SELECT period, SUM(invoices),
+                   SUM(total_cents),
+                   SUM(CASE WHEN status = 'paid' THEN total_cents ELSE 0 END)
+            FROM invoice_totals
+            {where}
+            GROUP BY period
+            HAVING SUM(invoices) > 0
+            ORDER BY period
+        ''', params)
+        return [_revenue_row({'period': r[0]}, r[1], r[2], r[3]) for r in rows]
+
+    return _cached('monthly', (start, end), compute)
+
+
+def revenue_by_year(start=None, end=None):
+    """Invoiced / paid / outstanding totals per calendar year"""
+    _check_periods(start, end)
+
+    def compute():
+        years = {}
+        for row in revenue_by_month(start, end):
+            year = years.setdefault(row['period'][:4], {'year': row['period'][:4], 'invoices': 0,
+                                                        'invoiced': 0, 'paid': 0, 'outstanding': 0})
+            for field in ('invoices', 'invoiced', 'paid', 'outstanding'):
+                year[field] += row[field]
+        return [{**year, **{f: round(year[f], 2) for f in ('invoiced', 'paid', 'outstanding')}}
+                for year in years.values()]
+
+    return _cached('yearly', (start, end), compute)
+
+
+def _aging_buckets(rows, as_of):
+    """Bucket (issue_date_iso, invoices, total_cents) rows by days since issue on as_of"""
+    today = date.fromisoformat(as_of)
+    d30, d60, d90 = [(today - timedelta(days=n)).isoformat() for n in (30, 60, 90)]
+    found = {bucket: [0, 0] for bucket in AGING_BUCKETS}
+    for issue_date_iso, invoices, total_cents in rows:
+        bucket = ('0-30' if issue_date_iso >= d30 else '31-60' if issue_date_iso >= d60
+                  else '61-90' if issue_date_iso >= d90 else '90+')
+        found[bucket][0] += int(invoices)
+        found[bucket][1] += int(total_cents or 0)
+    return [{'bucket': bucket, 'invoices': found[bucket][0], 'outstanding': _euros(found[bucket][1])}
+            for bucket in AGING_BUCKETS]
+
+
+def aging(as_of=None):
+    """Unpaid invoices bucketed by days outstanding since issue
+
+    For today the rollups give the answer directly. For an earlier as_of an
+    invoice counts if its last event before the end of that day left it
+    pending or overdue, so invoices paid since still show as outstanding
+    then, and archived ones count from the archive. Deleted invoices no
+    longer have an amount and are left out.
+    """
+    today = date.today().isoformat()
+    as_of = as_of or today
+    try:
+        as_of = date.fromisoformat(as_of).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f'as_of must be a YYYY-MM-DD date, got {as_of!r}')
+
+    def compute():
+        if as_of >= today:
+            rows = _fetch('''
+                SELECT issue_date_iso, SUM(invoices), SUM(total_cents)
+                FROM invoice_day_totals
+                WHERE status IN ('pending', 'overdue') AND issue_date_iso <> ''
+                GROUP BY issue_date_iso
+            ''')
+            return _aging_buckets(rows, as_of)
+
+        end_of_day = datetime.combine(date.fromisoformat(as_of) + timedelta(days=1), datetime.min.time())
+        rows = _fetch(f'''
+            SELECT i.issue_date_iso, COUNT(*), SUM(i.total_cents)
+            FROM (SELECT invoice_id, MAX(id) AS id FROM {ALL_INVOICE_EVENTS_SQL} a
+                  WHERE ts < ? GROUP BY invoice_id) latest
+            JOIN {ALL_INVOICE_EVENTS_SQL} e ON e.id = latest.id
+            JOIN {ALL_INVOICES_SQL} i ON i.id = latest.invoice_id
+            WHERE e.status IN (?, ?) AND i.issue_date_iso <> '' AND i.issue_date_iso <= ?
+            GROUP BY i.issue_date_iso
+        ''', (int(end_of_day.timestamp()), STATUS_CODES['pending'], STATUS_CODES['overdue'], as_of))
+        return _aging_buckets(rows, as_of)
+
+    return _cached('aging', (as_of,), compute)
+
+
+def days_to_pay(start=None, end=None):
+    """Distribution of days between issue and payment for paid invoices"""
+    _check_periods(start, end)
+
+    def compute():
+        # Period filters apply to the issue month here
+        where, params = _range_filter('substr(issue_date_iso, 1, 7)', start, end,
+                                      ["status = 'paid'", 'pay_days >= 0'])
+        rows = _fetch(f'''
+            SELECT CASE
+                       WHEN pay_days <= 7 THEN '0-7'
+                       WHEN pay_days <= 14 THEN '8-14'
+                       WHEN pay_days <= 30 THEN '15-30'
+                       WHEN pay_days <= 60 THEN '31-60'
+                       WHEN pay_days <= 90 THEN '61-90'
+                       ELSE '90+'
+                   END AS bucket,
+                   SUM(invoices), SUM(pay_days * invoices)
+            FROM invoice_day_totals
+            {where}
+            GROUP BY bucket
+        ''', params)
+        found = {r[0]: r for r in rows if int(r[1])}
+        return [{'bucket': bucket,
+                 'invoices': int(found[bucket][1]) if bucket in found else 0,
+                 'average_days': round(int(found[bucket][2]) / int(found[bucket][1]), 1)
+                 if bucket in found else None}
+                for bucket in DAYS_TO_PAY_BUCKETS]
+
+    return _cached('days-to-pay', (start, end), compute)
+
+
+REPORTS = {
+    'clients': revenue_by_client,
+    'monthly': revenue_by_month,
+    'yearly': revenue_by_year,
+    'aging': aging,
+    'days-to-pay': days_to_pay,
+}
+
+
+def run_report(name, args):
+    """Run a report by name with filters taken from a request args mapping"""
+    report = REPORTS[name]
+    if name == 'aging':
+        return report(as_of=args.get('as_of') or None)
+    return report(start=args.get('start') or None, end=args.get('end') or None)
+
+
+def to_csv(rows):
+    """Render report rows as CSV text"""
+    output = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(output, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return output.getvalue()
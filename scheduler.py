@@ -0,0 +1,109 @@
+"""Scheduled batch jobs - the overdue sweep, invoice event archival and database maintenance.
+
+Run once from cron:
+    python scheduler.py --once
+or keep it running:
+    python scheduler.py --interval 3600
+
+Inside the web app the same loop runs in a daemon thread when the
+OVERDUE_CHECK_INTERVAL environment variable (seconds) is set, started by
+the first request (app.py) or the ASGI lifespan (asgi.py), never on import. Each pass
+also moves invoice events older than INVOICE_EVENTS_RETENTION_DAYS to the
+archive table, and every MAINTENANCE_INTERVAL seconds runs the maintenance
+tasks (maintenance.py).
+
+Every gunicorn worker on every node then has such a loop, so each job
+first claims its slot in the database: only one loop runs it per interval,
+the others skip it. --once always runs.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+from database import archive_invoice_events, claim_run_slot, ensure_schema, mark_overdue_invoices, record_job_run
+from logs import get_logger
+from maintenance import MAINTENANCE_INTERVAL, run_maintenance
+
+logger = get_logger(__name__)
+
+OVERDUE_CHECK_INTERVAL = int(os.environ.get('OVERDUE_CHECK_INTERVAL', 0))
+
+_scheduler_thread = None
+
+
+def run_overdue_job(as_of=None):
+    """Mark overdue invoices and record the run, return the changed invoice numbers"""
+    ensure_schema()
+    started_at = datetime.now()
+    changed = mark_overdue_invoices(as_of)
+    record_job_run('mark_overdue', started_at, len(changed), changed)
+    return changed
+
+
+def run_archive_job():
+    """Archive old invoice events and record the run, return how many moved"""
+    ensure_schema()
+    started_at = datetime.now()
+    moved = archive_invoice_events()
+    record_job_run('archive_events', started_at, moved)
+    return moved
+
+
+def run_pending(interval):
+    """Run each job whose slot is free, return the names of the jobs run
+
+    The overdue and archive jobs are due every interval seconds, maintenance
+    every MAINTENANCE_INTERVAL (first one interval after the first start).
+    Slots live in the database (claim_run_slot), so however many schedulers
+    run - one per gunicorn worker, several nodes - each job runs once per
+    window.
+    """
+    ran = []
+    for job, every, first_after in ((run_overdue_job, interval, 0), (run_archive_job, interval, 0),
+                                    (run_maintenance, MAINTENANCE_INTERVAL, MAINTENANCE_INTERVAL)):
+        if every <= 0 or not claim_run_slot(job.__name__, every, first_after):
+            continue
+        try:
+            job()
+            ran.append(job.__name__)
+        except Exception as e:
+            logger.error("%s failed: %s", job.__name__, e)
+    return ran
+
+
+def run_forever(interval):
+    """Run the due jobs every interval seconds"""
+    ensure_schema()
+    while True:
+        run_pending(interval)
+        time.sleep(interval)
+
+
+def start_background_scheduler(interval=OVERDUE_CHECK_INTERVAL):
+    """Start the overdue loop in a daemon thread (once per process)"""
+    global _scheduler_thread
+    if interval <= 0 or _scheduler_thread is not None:
+        return None
+
+    _scheduler_thread = threading.Thread(target=run_forever, args=(interval,),
+                                         name='overdue-scheduler', daemon=True)
+    _scheduler_thread.start()
+    logger.info("Overdue check scheduled every %ds", interval)
+    return _scheduler_thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mark pending invoices past their due date as overdue')
+    parser.add_argument('--once', action='store_true', help='run a single sweep and exit')
+    parser.add_argument('--interval', type=int, default=OVERDUE_CHECK_INTERVAL or 3600,
+                        help='seconds between sweeps')
+    parser.add_argument('--as-of', help='treat this ISO date as today (single sweep only)')
+    args = parser.parse_args()
+
+    if args.once or args.as_of:
+        run_overdue_job(args.as_of)
+        run_archive_job()
+    else:
+        run_forever(args.interval)
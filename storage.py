@@ -0,0 +1,258 @@
+"""Storage for the workbook, generated PDFs and the email config.
+
+Keys are slash-separated paths relative to the app folder, e.g.
+'Anainvoices.xlsx' or 'generated_invoices/batches/<id>/Invoice_x.pdf'. The
+default local backend maps keys straight onto the working directory, so a
+single node behaves exactly as before.
+
+Set STORAGE_BACKEND=s3 and S3_BUCKET to share the artifacts between several
+app instances. S3_ENDPOINT_URL points at MinIO or another S3-compatible
+server, and S3_PREFIX namespaces the keys. This backend needs boto3.
+"""
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+STORAGE_ROOT = os.environ.get('STORAGE_ROOT', '.')
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_PREFIX = os.environ.get('S3_PREFIX', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to path and move it over path on success"""
+    directory, name = os.path.split(os.path.abspath(path))
+    root, ext = os.path.splitext(name)
+    # Keep the extension so writers that infer the format from it still work
+    tmp_path = os.path.join(directory, f'.{root}.{os.getpid()}.{time.monotonic_ns()}.tmp{ext}')
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class LocalStorage:
+    """Keys are files under root"""
+
+    remote = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        return os.path.join(self.root, *key.replace('\\', '/').split('/'))
+
+    def get_bytes(self, key):
+        with open(self.local_path(key), 'rb') as f:
+            return f.read()
+
+    def put_bytes(self, key, data):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+
+    def put_file(self, key, path):
+        target = self.local_path(key)
+        if os.path.abspath(target) == os.path.abspath(path):
+            return
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        with atomic_path(target) as tmp_path:
+            shutil.copyfile(path, tmp_path)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def version(self, key):
+        try:
+            stat = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def copy(self, src_key, dst_key):
+        self.put_file(dst_key, self.local_path(src_key))
+
+    def list_keys(self, prefix):
+        base = self.local_path(prefix)
+        keys = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            for name in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root)
+                keys.append(rel.replace(os.sep, '/'))
+        return sorted(keys)
+
+
+class S3Storage:
+    """Keys are objects in one bucket of an S3-compatible server"""
+
+    remote = True
+
+    def __init__(self, bucket, prefix='', endpoint_url=None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def _key(self, key):
+        return self.prefix + key.replace('\\', '/')
+
+    def local_path(self, key):
+        return None
+
+    def get_bytes(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+
+    def put_bytes(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def put_file(self, key, path):
+        self.client.upload_file(path, self.bucket, self._key(key))
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def version(self, key):
+        head = self._head(key)
+        return head['ETag'] if head else None
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def copy(self, src_key, dst_key):
+        self.client.copy_object(Bucket=self.bucket, Key=self._key(dst_key),
+                                CopySource={'Bucket': self.bucket, 'Key': self._key(src_key)})
+
+    def list_keys(self, prefix):
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            keys.extend(obj['Key'][len(self.prefix):] for obj in page.get('Contents', []))
+        return sorted(keys)
+
+
+def _make_backend():
+    if STORAGE_BACKEND == 's3':
+        if not S3_BUCKET:
+            raise RuntimeError('STORAGE_BACKEND=s3 needs S3_BUCKET')
+        logger.info("Storing artifacts in s3://%s/%s", S3_BUCKET, S3_PREFIX)
+        return S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL)
+    return LocalStorage(STORAGE_ROOT)
+
+
+_backend = _make_backend()
+
+
+def is_remote():
+    """True when artifacts are shared through object storage"""
+    return _backend.remote
+
+
+def local_path(key):
+    """Filesystem path of key for the local backend, None for remote ones"""
+    return _backend.local_path(key)
+
+
+def get_bytes(key):
+    """Contents of key, FileNotFoundError when missing"""
+    return _backend.get_bytes(key)
+
+
+def put_bytes(key, data):
+    """Store data under key, replacing any previous object in one step"""
+    _backend.put_bytes(key, data)
+
+
+def put_file(key, path):
+    """Store a local file under key"""
+    _backend.put_file(key, path)
+
+
+def exists(key):
+    return _backend.exists(key)
+
+
+def version(key):
+    """Token that changes whenever key is rewritten, None when missing"""
+    return _backend.version(key)
+
+
+def delete(key):
+    _backend.delete(key)
+
+
+def copy(src_key, dst_key):
+    _backend.copy(src_key, dst_key)
+
+
+def list_keys(prefix):
+    """All keys under a folder-like prefix"""
+    return _backend.list_keys(prefix)
+
+
+@contextmanager
+def checkout(key):
+    """Yield a local working copy of key and store it back if it was modified"""
+    path = _backend.local_path(key)
+    if path:
+        yield path
+        return
+
+    with tempfile.TemporaryDirectory(prefix='velvet-') as workdir:
+        path = os.path.join(workdir, os.path.basename(key))
+        with open(path, 'wb') as f:
+            f.write(_backend.get_bytes(key))
+        before = os.stat(path).st_mtime_ns
+
+        yield path
+
+        if os.path.exists(path) and os.stat(path).st_mtime_ns != before:
+            _backend.put_file(key, path)
+
+
+@contextmanager
+def local_copies(keys):
+    """Yield local file paths for keys (downloaded to a temp folder when remote)"""
+    if not _backend.remote:
+        yield [_backend.local_path(key) for key in keys]
+        return
+
+    with tempfile.TemporaryDirectory(prefix='velvet-') as workdir:
+        paths = []
+        for key in keys:
+            path = os.path.join(workdir, os.path.basename(key))
+            with open(path, 'wb') as f:
+                f.write(_backend.get_bytes(key))
+            paths.append(path)
+        yield paths
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Tests always run against a scratch SQLite file
+os.environ.pop('DATABASE_URL', None)
+
+import database  # noqa: E402
+
+
+def _drop_idle_connection():
+    """Close the connection database keeps for this thread, so the next one opens the new file"""
+    conn = getattr(database._idle, 'conn', None)
+    database._idle.conn = None
+    if conn is not None:
+        database.sqlite3.Connection.close(conn)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh invoices.db in a temporary working directory"""
+    monkeypatch.chdir(tmp_path)
+    _drop_idle_connection()
+    monkeypatch.setattr(database, '_schema_ready', False)
+    database.ensure_schema()
+    yield database
+    _drop_idle_connection()
+
+
+def invoice(number, client='Acme Ltd', vat='CY10000000X', total='119.00', **extra):
+    """invoice_data dict as process_invoices passes it to add_invoices"""
+    data = {
+        'invoice_number': f'#{number}',
+        'client_name': client,
+        'client_address_2': 'Main Street 1',
+        'client_address_3': 'Nicosia',
+        'client_address_4': '',
+        'vat_number': vat,
+        'date_issued': '01 October, 2026',
+        'description': 'Services',
+        'quantity': '1',
+        'month': 'October',
+        'total': '100.00',
+        'tax': '19.00',
+        'total_amount': total,
+    }
+    data.update(extra)
+    return data
+
+
+def query(sql, params=()):
+    """All rows of a read-only query on the test database"""
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(database._q(sql), params)
+        return [tuple(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
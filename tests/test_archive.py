@@ -0,0 +1,46 @@
+import invoice_index
+from conftest import invoice, query
+
+
+def _paid_long_ago(db, number):
+    assert db.add_invoice(invoice(number))
+    db.update_invoice_status(f'#{number}', 'paid', '2020-01-01')
+
+
+def test_archiving_appends_an_archived_event(db):
+    _paid_long_ago(db, 1)
+    before = query('SELECT id, event FROM invoice_events ORDER BY id')
+
+    assert db.archive_paid_invoices(retention_days=30) == 1
+
+    after = query('SELECT id, event FROM invoice_events ORDER BY id')
+    assert after[:len(before)] == before
+    assert [(e['event'], e['status']) for e in db.get_invoice_events('#1')] == \
+        [('created', 'pending'), ('status', 'paid'), ('archived', None)]
+
+
+def test_archived_invoices_are_archive_changes_not_deletes(db):
+    _paid_long_ago(db, 1)
+    assert db.add_invoice(invoice(2))
+    _, cursor, _ = db.get_invoice_changes()
+
+    db.archive_paid_invoices(retention_days=30)
+    db.delete_invoice('#2')
+
+    changes, _, more = db.get_invoice_changes(cursor)
+    assert [(c['op'], c['invoice_number']) for c in changes] == [('archive', '#1'), ('delete', '#2')]
+    assert 'archived_at' in changes[0] and 'deleted_at' in changes[1]
+    assert not more
+    assert [e['event'] for e in db.get_invoice_events('#2')][-1] == 'deleted'
+
+
+def test_index_drops_archived_invoices(db):
+    index = invoice_index.InvoiceIndex()
+    _paid_long_ago(db, 1)
+    assert db.add_invoice(invoice(2))
+    index.refresh()
+
+    db.archive_paid_invoices(retention_days=30)
+    index.mark_stale()
+    index.refresh()
+    assert [record.invoice_number for record in index.select()] == ['#2']
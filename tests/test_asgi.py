@@ -0,0 +1,80 @@
+import os
+
+import pytest
+from starlette.testclient import TestClient
+
+import app
+import asgi
+import cache
+import invoice_index
+from batches import publish_batch
+from conftest import invoice
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(invoice_index, '_index', invoice_index.InvoiceIndex())
+    cache.invalidate('invoices')
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+@pytest.fixture
+def logged_in(client):
+    # The Flask login form, served through the WSGI mount
+    response = client.post('/login', data={'password': app.LOGIN_PASSWORD}, follow_redirects=False)
+    assert response.status_code == 302
+    return client
+
+
+def test_lifespan_applies_the_schema(db, monkeypatch):
+    monkeypatch.setattr(db, '_schema_ready', False)
+    with TestClient(asgi.app):
+        assert db._schema_ready
+
+
+def test_async_routes_need_a_login(client):
+    for path in ('/api/invoices', '/api/stats', '/preview/Invoice.pdf'):
+        response = client.get(path, follow_redirects=False)
+        assert (response.status_code, response.headers['location']) == (302, '/login')
+
+
+def test_stats_match_the_sync_query(db, logged_in):
+    assert db.add_invoice(invoice(1, total='119.00'))
+    assert db.add_invoice(invoice(2, total='238.00'))
+    db.update_invoice_status('#2', 'paid', '2026-10-01')
+
+    stats = logged_in.get('/api/stats').json()
+    assert stats == db.get_invoice_stats()
+    assert stats['pending_count'] == 1
+
+
+def test_invoice_list_filters_by_status(db, logged_in):
+    assert db.add_invoice(invoice(1))
+    assert db.add_invoice(invoice(2, client='Beta Ltd'))
+    db.update_invoice_status('#2', 'paid', '2026-10-01')
+
+    body = logged_in.get('/api/invoices').json()
+    assert (body['total'], body['pages']) == (2, 1)
+    body = logged_in.get('/api/invoices', params={'status': 'paid'}).json()
+    assert [row['invoice_number'] for row in body['invoices']] == ['#2']
+
+
+def test_preview_streams_a_pdf_of_the_current_batch(logged_in):
+    folder = os.path.join(asgi.OUTPUT_FOLDER, 'batches', 'b1')
+    os.makedirs(folder)
+    with open(os.path.join(folder, 'Invoice_Acme.pdf'), 'wb') as f:
+        f.write(b'%PDF-1.4 test')
+    publish_batch(asgi.OUTPUT_FOLDER, 'b1')
+
+    response = logged_in.get('/preview/Invoice_Acme.pdf')
+    assert (response.status_code, response.content) == (200, b'%PDF-1.4 test')
+    assert response.headers['content-type'] == 'application/pdf'
+    assert logged_in.get('/preview/.generate.lock').status_code == 404
+    assert logged_in.get('/preview/missing.pdf').status_code == 404
+
+
+def test_other_routes_fall_through_to_flask(logged_in):
+    response = logged_in.get('/invoices')
+    assert response.status_code == 200
+    assert 'text/html' in response.headers['content-type']
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import batches
+from batches import current_batch_dir, publish_batch, staged_batch
+
+ROOT = 'out'
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def _stage(names):
+    with staged_batch(ROOT) as (staging, final):
+        for name in names:
+            with open(os.path.join(staging, name), 'w') as f:
+                f.write(name)
+    return final
+
+
+def _batch_dirs():
+    return sorted(os.listdir(os.path.join(ROOT, 'batches')))
+
+
+def test_readers_see_the_output_root_until_a_batch_is_published():
+    assert current_batch_dir(ROOT) == ROOT
+
+
+def test_a_finished_batch_is_renamed_into_place_and_published():
+    final = _stage(['Invoice_1.pdf', 'Invoice_2.pdf'])
+
+    assert current_batch_dir(ROOT) == batches.batch_folder(ROOT, os.path.basename(final))
+    assert sorted(os.listdir(final)) == ['Invoice_1.pdf', 'Invoice_2.pdf']
+    assert not any(name.startswith(batches.STAGING_PREFIX) for name in _batch_dirs())
+
+
+def test_a_failed_batch_leaves_the_previous_one_current():
+    published = _stage(['Invoice_1.pdf'])
+
+    with pytest.raises(RuntimeError):
+        with staged_batch(ROOT) as (staging, final):
+            open(os.path.join(staging, 'Invoice_2.pdf'), 'w').close()
+            raise RuntimeError('render failed')
+
+    assert current_batch_dir(ROOT).endswith(os.path.basename(published))
+    assert _batch_dirs() == [os.path.basename(published)]
+
+
+def test_an_empty_batch_is_not_published():
+    published = _stage(['Invoice_1.pdf'])
+    _stage([])
+
+    assert current_batch_dir(ROOT).endswith(os.path.basename(published))
+    assert _batch_dirs() == [os.path.basename(published)]
+
+
+def test_a_batch_finishing_after_a_newer_one_stays_unpublished():
+    for batch_id in ('20261001_000000_000000', '20261002_000000_000000'):
+        os.makedirs(os.path.join(ROOT, 'batches', batch_id))
+    publish_batch(ROOT, '20261002_000000_000000')
+    publish_batch(ROOT, '20261001_000000_000000')
+
+    assert current_batch_dir(ROOT) == batches.batch_folder(ROOT, '20261002_000000_000000')
+
+
+def test_a_pointer_to_a_missing_batch_falls_back_to_the_output_root():
+    publish_batch(ROOT, '20261001_000000_000000')
+    assert current_batch_dir(ROOT) == ROOT
+
+
+def test_pruning_keeps_the_newest_batches_and_drops_abandoned_staging():
+    abandoned = os.path.join(ROOT, 'batches', batches.STAGING_PREFIX + '20261001_000000_000000')
+    os.makedirs(abandoned)
+    ids = [f'2026100{day}_000000_000000' for day in range(2, 5)]
+    for batch_id in ids:
+        os.makedirs(os.path.join(ROOT, 'batches', batch_id))
+        publish_batch(ROOT, batch_id)
+    batches.prune_batches(ROOT, keep=2)
+
+    assert _batch_dirs() == ids[1:]
+    assert current_batch_dir(ROOT) == batches.batch_folder(ROOT, ids[-1])
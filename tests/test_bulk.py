@@ -0,0 +1,62 @@
+import pytest
+
+import app
+from conftest import invoice, query
+
+
+@pytest.fixture
+def client(db):
+    client = app.app.test_client()
+    assert client.post('/login', data={'password': app.LOGIN_PASSWORD}).status_code == 302
+    return client
+
+
+@pytest.mark.parametrize('path', ['/api/invoices/status', '/api/invoices/delete'])
+@pytest.mark.parametrize('body', [['#1'], '#1', 1, None])
+def test_bulk_endpoints_reject_bodies_that_are_not_objects(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+@pytest.mark.parametrize('body', [
+    {'changes': {'invoice_number': '#1', 'status': 'paid'}},
+    {'changes': ['#1']},
+    {'changes': [{'status': 'paid'}]},
+    {'invoice_numbers': '#1', 'status': 'paid'},
+])
+def test_bulk_status_rejects_malformed_changes(db, client, body):
+    assert db.add_invoice(invoice(1))
+    assert client.post('/api/invoices/status', json=body).status_code == 400
+    assert query('SELECT status FROM invoices') == [('pending',)]
+
+
+def test_bulk_status_and_delete(db, client):
+    for number in (1, 2, 3):
+        assert db.add_invoice(invoice(number))
+
+    response = client.post('/api/invoices/status', json={'changes': [
+        {'invoice_number': '#1', 'status': 'paid', 'payment_date': '2026-10-01'},
+        {'invoice_number': '#2', 'status': 'overdue'},
+        {'invoice_number': '#9', 'status': 'paid'},
+        {'invoice_number': '#3', 'status': 'lost'},
+    ]})
+    assert response.get_json() == {'updated': 2, 'not_found': ['#9'], 'invalid': ['#3']}
+    assert query('SELECT invoice_number, status, payment_date FROM invoices ORDER BY id') == \
+        [('#1', 'paid', '2026-10-01'), ('#2', 'overdue', None), ('#3', 'pending', None)]
+
+    response = client.post('/api/invoices/delete', json={'invoice_numbers': ['#1', '#9']})
+    assert response.get_json()['deleted'] == 1
+
+
+def test_status_updates_span_chunks(db, monkeypatch):
+    monkeypatch.setattr(db, 'BULK_CHUNK_SIZE', 3)
+    for number in range(1, 6):
+        assert db.add_invoice(invoice(number))
+
+    changes = [(f'#{n}', 'paid', '2026-10-01') for n in range(1, 9)]
+    assert db.update_invoice_statuses(changes) == {'updated': 5, 'not_found': ['#6', '#7', '#8'], 'invalid': []}
+    assert query("SELECT COUNT(*) FROM invoices WHERE status = 'paid' AND payment_date = '2026-10-01'") == [(5,)]
+    # An omitted payment date keeps the stored one
+    db.update_invoice_statuses([('#1', 'paid', None)])
+    assert query("SELECT payment_date FROM invoices WHERE invoice_number = '#1'") == [('2026-10-01',)]
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import app
+import cache
+import invoice_index
+from conftest import ROOT, invoice
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(cache, '_backend', cache.MemoryBackend())
+    monkeypatch.setattr(cache, '_entries', cache.OrderedDict())
+
+
+def _counting(value='v'):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return value
+    return compute, calls
+
+
+def test_any_process_that_ensures_the_schema_invalidates_the_shared_cache(db, tmp_path):
+    # A CLI that never imports cache itself
+    script = (
+        'import database, conftest\n'
+        'database.ensure_schema()\n'
+        "assert database.add_invoice(conftest.invoice(1))\n"
+    )
+    env = {'PATH': '', 'CACHE_BACKEND': 'sqlite', 'CACHE_PATH': str(tmp_path / 'cache.db'),
+           'PYTHONPATH': os.pathsep.join([ROOT, os.path.join(ROOT, 'tests')])}
+    subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, check=True, capture_output=True)
+
+    conn = sqlite3.connect(tmp_path / 'cache.db')
+    assert conn.execute("SELECT gen FROM generations WHERE namespace = 'invoices'").fetchall() == [(1,)]
+    conn.close()
+
+
+def test_ensure_schema_registers_the_listener_once(db, monkeypatch):
+    listeners = len(db._write_listeners)
+    monkeypatch.setattr(db, '_schema_ready', False)
+    db.ensure_schema()
+    assert len(db._write_listeners) == listeners
+
+
+def test_values_are_cached_until_their_namespace_is_invalidated(fresh_cache):
+    compute, calls = _counting()
+    assert cache.get_or_compute('excel', 'rows', compute) == 'v'
+    assert cache.get_or_compute('excel', 'rows', compute) == 'v'
+    cache.invalidate('invoices')
+    assert cache.get_or_compute('excel', 'rows', compute) == 'v'
+    assert len(calls) == 1
+
+    cache.invalidate('excel')
+    cache.get_or_compute('excel', 'rows', compute)
+    assert len(calls) == 2
+
+
+def test_entries_expire_and_are_bounded(fresh_cache, monkeypatch):
+    compute, calls = _counting()
+    cache.get_or_compute('excel', 'rows', compute, ttl=-1)
+    cache.get_or_compute('excel', 'rows', compute)
+    assert len(calls) == 2
+
+    monkeypatch.setattr(cache, 'CACHE_MAX_ENTRIES', 3)
+    for key in range(5):
+        cache.get_or_compute('excel', key, compute)
+    assert len(cache._entries) == 3
+
+
+def test_an_invoice_write_invalidates_the_cached_stats(db, fresh_cache):
+    cache.get_or_compute('invoices', 'stats', db.get_invoice_stats)
+    assert db.add_invoice(invoice(1))
+    assert cache.get_or_compute('invoices', 'stats', db.get_invoice_stats)['pending_count'] == 1
+
+
+def test_the_sqlite_backend_shares_generations_and_entries(tmp_path, fresh_cache, monkeypatch):
+    # Two workers using the same cache file
+    path = str(tmp_path / 'cache.db')
+    worker_a, worker_b = cache.SQLiteBackend(path), cache.SQLiteBackend(path)
+    compute, calls = _counting()
+
+    monkeypatch.setattr(cache, '_backend', worker_a)
+    cache.get_or_compute('excel', 'rows', compute)
+    cache._entries.clear()
+    monkeypatch.setattr(cache, '_backend', worker_b)
+    cache.get_or_compute('excel', 'rows', compute)
+    assert len(calls) == 1
+
+    cache.invalidate('excel')
+    cache._entries.clear()
+    monkeypatch.setattr(cache, '_backend', worker_a)
+    cache.get_or_compute('excel', 'rows', compute)
+    assert len(calls) == 2
+
+
+def test_the_invoice_list_is_paginated(db, monkeypatch):
+    monkeypatch.setattr(app, 'INVOICES_PER_PAGE', 2)
+    monkeypatch.setattr(invoice_index, '_index', invoice_index.InvoiceIndex())
+    db.add_invoices([invoice(number) for number in range(1, 6)])
+    client = app.app.test_client()
+    assert client.post('/login', data={'password': app.LOGIN_PASSWORD}).status_code == 302
+
+    body = client.get('/api/invoices?page=3').get_json()
+    assert ([i['invoice_number'] for i in body['invoices']], body['total'], body['pages']) == (['#1'], 5, 3)
+    body = client.get('/api/invoices?page=oops').get_json()
+    assert [i['invoice_number'] for i in body['invoices']] == ['#5', '#4']
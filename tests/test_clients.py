@@ -0,0 +1,58 @@
+import reports
+from conftest import invoice, query
+
+
+def test_vat_number_is_normalized(db):
+    assert db.normalize_vat(' cy-1000.0000 x ') == 'CY10000000X'
+    assert db.normalize_vat(None) == ''
+    assert db.normalize_vat(float('nan')) == ''
+    assert db.normalize_vat('nan') == ''
+
+
+def test_vat_number_fills_client_first_seen_without_one(db):
+    assert db.add_invoice(invoice(1, vat=''))
+    assert db.add_invoice(invoice(2, vat='cy 10000000x'))
+    assert db.add_invoice(invoice(3, vat=None))
+
+    assert query('SELECT name, vat_number FROM clients') == [('Acme Ltd', 'CY10000000X')]
+    assert len(set(query('SELECT client_id FROM invoices'))) == 1
+
+    reports.invalidate()
+    rows = reports.revenue_by_client()
+    assert [(row['client'], row['vat_number'], row['invoices']) for row in rows] == \
+        [('Acme Ltd', 'CY10000000X', 3)]
+
+
+def test_different_vat_numbers_stay_separate_clients(db):
+    assert db.add_invoice(invoice(1, vat='CY10000000X'))
+    assert db.add_invoice(invoice(2, vat='CY20000000Y'))
+    # Ambiguous without a VAT number: a client of its own
+    assert db.add_invoice(invoice(3, vat=''))
+
+    assert sorted(query('SELECT vat_number FROM clients')) == [('',), ('CY10000000X',), ('CY20000000Y',)]
+
+
+def test_schema_upgrade_merges_duplicate_clients(db):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO clients (name, vat_number) VALUES (?, ?)',
+                       [('Acme Ltd', ''), ('Acme Ltd', 'cy10000000x'), ('Acme Ltd', 'nan')])
+    conn.commit()
+    conn.close()
+    ids = [row[0] for row in query('SELECT id FROM clients ORDER BY id')]
+    for number, client_id in enumerate(ids, 1):
+        assert db.add_invoice(invoice(number, vat=''))
+        conn = db.get_connection()
+        conn.execute('UPDATE invoices SET client_id = ? WHERE invoice_number = ?', (client_id, f'#{number}'))
+        conn.commit()
+        conn.close()
+
+    conn = db.get_connection()
+    assert db._merge_duplicate_clients(conn.cursor()) == 2
+    conn.commit()
+    conn.close()
+
+    assert query('SELECT id, vat_number FROM clients') == [(ids[1], 'CY10000000X')]
+    assert query('SELECT DISTINCT client_id FROM invoices') == [(ids[1],)]
+    assert query('SELECT client_id, SUM(invoices) FROM invoice_totals WHERE invoices > 0 GROUP BY client_id') == \
+        [(ids[1], 3)]
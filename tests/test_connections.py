@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from conftest import query
+
+
+def test_a_closed_connection_is_reused_on_the_same_thread(db):
+    conn = db.get_connection()
+    conn.close()
+
+    again = db.get_connection()
+    assert again is conn
+    assert again.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    again.close()
+
+
+def test_nested_connections_are_distinct_and_only_one_is_kept(db):
+    outer = db.get_connection()
+    inner = db.get_connection()
+    assert inner is not outer
+
+    inner.close()
+    outer.close()
+    assert db._idle.conn is inner
+    with pytest.raises(db.sqlite3.ProgrammingError):
+        outer.execute('SELECT 1')
+
+
+def test_an_open_transaction_is_rolled_back_on_close(db):
+    conn = db.get_connection()
+    conn.execute("INSERT INTO counters (name, value) VALUES ('uncommitted', 1)")
+    conn.close()
+
+    conn = db.get_connection()
+    assert not conn.in_transaction
+    conn.close()
+    assert query("SELECT value FROM counters WHERE name = 'uncommitted'") == []
+
+
+def test_each_thread_has_its_own_connection(db):
+    conn = db.get_connection()
+    conn.close()
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(db.get_connection()))
+    thread.start()
+    thread.join()
+    assert seen[0] is not conn
+    seen[0].close()
+
+
+def test_a_connection_inherited_through_fork_is_not_reused(db):
+    conn = db.get_connection()
+    conn.close()
+    conn.pid = -1  # As in a forked child
+
+    assert db.get_connection() is not conn
+
+
+def test_untuned_mode_opens_a_connection_per_call(db, monkeypatch):
+    monkeypatch.setattr(db, 'SQLITE_TUNED', False)
+    first = db.get_connection()
+    first.close()
+
+    second = db.get_connection()
+    assert second is not first
+    second.close()
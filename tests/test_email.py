@@ -0,0 +1,124 @@
+import email
+import email.policy
+import io
+import os
+import smtplib
+
+import pytest
+
+import invoice_generator
+
+CONFIG = {'sender_email': 'billing@velvet.example', 'sender_password': 'secret'}
+
+
+class FakeSMTP:
+    """Records the SMTP conversation instead of talking to a server"""
+
+    def __init__(self, host=None, port=None, refuse=()):
+        self.calls, self.chunks, self.refuse = [], [], refuse
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def starttls(self):
+        self.calls.append('starttls')
+
+    def login(self, user, password):
+        self.calls.append(('login', user))
+
+    def mail(self, sender):
+        self.calls.append(('mail', sender))
+        return 250, b'OK'
+
+    def rcpt(self, recipient):
+        self.calls.append(('rcpt', recipient))
+        return (550, b'No such user') if recipient in self.refuse else (250, b'OK')
+
+    def docmd(self, command):
+        self.calls.append(command)
+        return 354, b'Go ahead'
+
+    def send(self, data):
+        self.chunks.append(data)
+
+    def getreply(self):
+        return 250, b'Queued'
+
+    def quit(self):
+        self.calls.append('quit')
+
+    @property
+    def data(self):
+        return b''.join(self.chunks)
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = []
+    # Sizes on and off the 57-byte base64 line boundary
+    for i, size in enumerate((0, 57, 1000, 4097)):
+        path = tmp_path / f'Invoice_{i}.pdf'
+        path.write_bytes(os.urandom(size))
+        paths.append(str(path))
+    return paths
+
+
+def _attachments(raw):
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+    return message, {part.get_filename(): part.get_content() for part in message.iter_attachments()}
+
+
+def test_the_written_message_carries_every_pdf(pdfs, monkeypatch):
+    monkeypatch.setattr(invoice_generator, 'EMAIL_CHUNK_BYTES', 100)
+    out = io.BytesIO()
+    invoice_generator.write_invoices_email(out, pdfs, 'client@example.com', 'October', CONFIG)
+    raw = out.getvalue()
+
+    message, attachments = _attachments(raw)
+    assert (message['From'], message['To']) == (CONFIG['sender_email'], 'client@example.com')
+    assert message['Subject'] == 'Velvet Lavender Invoices - October'
+    assert 'Total invoices: 4' in message.get_body().get_content()
+    assert attachments == {os.path.basename(path): open(path, 'rb').read() for path in pdfs}
+    # CRLF only, and no line beyond the SMTP limit
+    assert b'\n' not in raw.replace(b'\r\n', b'')
+    assert max(len(line) for line in raw.split(b'\r\n')) <= 78
+
+
+def test_the_message_file_is_sent_in_chunks_with_dot_stuffing(monkeypatch):
+    monkeypatch.setattr(invoice_generator, 'EMAIL_CHUNK_BYTES', 16)
+    server = FakeSMTP()
+    message = io.BytesIO(b'Subject: x\r\n\r\n.leading dot\r\n..two\r\nlast line\r\n')
+
+    invoice_generator._send_message_file(server, 'from@example.com', ['to@example.com'], message)
+
+    assert server.calls == [('mail', 'from@example.com'), ('rcpt', 'to@example.com'), 'data']
+    assert len(server.chunks) > 1
+    assert server.data == b'Subject: x\r\n\r\n..leading dot\r\n...two\r\nlast line\r\n.\r\n'
+
+
+def test_a_refused_recipient_stops_before_data():
+    server = FakeSMTP(refuse={'to@example.com'})
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        invoice_generator._send_message_file(server, 'from@example.com', ['to@example.com'], io.BytesIO(b'x\r\n'))
+    assert 'data' not in server.calls
+
+
+def test_send_invoices_email_streams_the_spooled_message(pdfs, monkeypatch):
+    servers = []
+
+    def connect(host, port):
+        servers.append(FakeSMTP(host, port))
+        return servers[-1]
+    monkeypatch.setattr(invoice_generator.smtplib, 'SMTP', connect)
+    monkeypatch.setattr(invoice_generator, 'SMTP_STARTTLS', True)
+    # Spill to disk on the first attachment
+    monkeypatch.setattr(invoice_generator, 'EMAIL_SPOOL_BYTES', 1024)
+
+    invoice_generator.send_invoices_email(pdfs, 'client@example.com', 'October', CONFIG)
+
+    server, = servers
+    assert server.calls[:3] == ['starttls', ('login', CONFIG['sender_email']), ('mail', CONFIG['sender_email'])]
+    assert server.calls[-1] == 'quit'
+    assert server.data.endswith(b'\r\n.\r\n')
+    _, attachments = _attachments(server.data[:-len(b'.\r\n')])
+    assert sorted(attachments) == [os.path.basename(path) for path in pdfs]
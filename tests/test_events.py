@@ -0,0 +1,42 @@
+from conftest import invoice
+
+
+def _without_event_log(db):
+    """Drop the event triggers and history, like a database from before the log existed"""
+    conn = db.get_connection()
+    for name in ('insert', 'delete', 'status'):
+        conn.execute(f'DROP TRIGGER trg_invoices_event_{name}')
+    conn.execute('DELETE FROM invoice_events')
+    conn.commit()
+    conn.close()
+
+
+def _create_event_log(db):
+    conn = db.get_connection()
+    db._create_event_log(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def test_backfill_records_creation_as_pending(db):
+    _without_event_log(db)
+    assert db.add_invoice(invoice(1))
+    assert db.add_invoice(invoice(2))
+    db.update_invoice_status('#2', 'paid', '2026-10-01')
+
+    _create_event_log(db)
+
+    assert [(e['event'], e['status']) for e in db.get_invoice_events('#1')] == [('created', 'pending')]
+    assert [(e['event'], e['status']) for e in db.get_invoice_events('#2')] == \
+        [('created', 'pending'), ('status', 'paid')]
+
+
+def test_status_changes_after_the_backfill_append(db):
+    _without_event_log(db)
+    assert db.add_invoice(invoice(1))
+    db.update_invoice_status('#1', 'overdue')
+    _create_event_log(db)
+
+    db.update_invoice_status('#1', 'paid', '2026-10-01')
+    assert [(e['event'], e['status']) for e in db.get_invoice_events('#1')] == \
+        [('created', 'pending'), ('status', 'overdue'), ('status', 'paid')]
@@ -0,0 +1,21 @@
+import io
+
+import openpyxl
+
+from conftest import invoice
+from export import _text_cell, stream_ledger
+
+
+def test_text_cell_drops_characters_xml_forbids():
+    assert _text_cell('A\x00c\x0bm\x0ce\x1f <Ltd>\tB\nC\rD') == \
+        '<c t="inlineStr"><is><t>Acme &lt;Ltd&gt;\tB\nC\rD</t></is></c>'
+
+
+def test_xlsx_export_with_control_characters_opens(db):
+    assert db.add_invoice(invoice(1, client='Acme\x02 Ltd\x1b'))
+
+    data = b''.join(stream_ledger('xlsx'))
+    sheet = openpyxl.load_workbook(io.BytesIO(data)).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[1][0] == '#1'
+    assert rows[1][4] == 'Acme Ltd'
@@ -0,0 +1,135 @@
+import os
+
+import pandas as pd
+import pytest
+
+import generation
+import velvet
+from conftest import query
+
+
+@pytest.fixture
+def workbook(db):
+    rows = [{
+        'Issued to': f'Client {i} Ltd\nMain Street {i}\nNicosia', 'VAT Number': f'CY{i}0000000X',
+        'Invoice No:': '#9', 'Date Issued:': '01 November, 2025', 'Description': 'Content Creation', 'Quantity': 1,
+        'Month': 'November', 'Total': 100, 'Subtotal': 100, 'Tax(19%)': 19.0, 'Total.1': 119.0,
+    } for i in range(1, 4)]
+    pd.DataFrame(rows).to_excel(generation.EXCEL_FILE, index=False)
+    return generation.EXCEL_FILE
+
+
+def _failing_render(tasks, workers):
+    # The last invoice of the batch cannot be rendered
+    for data, path, logo_path, profile in tasks[:-1]:
+        open(path, 'wb').close()
+    raise RuntimeError('render failed')
+
+
+def test_failed_render_stores_nothing(workbook, monkeypatch):
+    monkeypatch.setattr(generation, 'render_parallel', _failing_render)
+    before = pd.read_excel(workbook)
+
+    assert velvet.main(['generate']) == 1
+
+    assert query('SELECT COUNT(*) FROM invoices') == [(0,)]
+    assert pd.read_excel(workbook).equals(before)
+    assert query("SELECT status, error FROM jobs") == [('failed', 'render failed')]
+    # Nothing published, and the numbers are handed back for the next run
+    assert not os.path.exists(os.path.join(generation.OUTPUT_FOLDER, 'CURRENT'))
+    assert query("SELECT value FROM counters WHERE name = 'invoice_number'") == [(9,)]
+
+
+def test_cli_runs_the_generate_job(workbook, monkeypatch):
+    def render(tasks, workers):
+        for data, path, logo_path, profile in tasks:
+            open(path, 'wb').close()
+    monkeypatch.setattr(generation, 'render_parallel', render)
+
+    assert velvet.main(['generate', '--output', 'zip', '--out', 'batch.zip']) == 0
+
+    assert query("SELECT kind, status FROM jobs") == [('generate', 'done')]
+    assert query('SELECT invoice_number FROM invoices ORDER BY id') == [('#10',), ('#11',), ('#12',)]
+    assert list(pd.read_excel(workbook)['Invoice No:']) == ['#10', '#11', '#12']
+    assert os.path.getsize('batch.zip') > 0
+
+
+def _render_empty(tasks, workers):
+    for data, path, logo_path, profile in tasks:
+        open(path, 'wb').close()
+
+
+def _set_started_at(db, job_id, started_at):
+    conn = db.get_connection()
+    conn.execute('UPDATE jobs SET started_at = ? WHERE id = ?', (started_at, job_id))
+    conn.commit()
+    conn.close()
+
+
+def _running_job(db):
+    """A generate job running on another node"""
+    job_id = db.enqueue_job('generate', {})
+    assert db.claim_job('generate', 'other-node', job_id)
+    return job_id
+
+
+def test_cli_takes_over_when_the_running_node_dies(db, workbook, monkeypatch):
+    monkeypatch.setattr(generation, 'render_parallel', _render_empty)
+    job_id = _running_job(db)
+    # The other node dies while the CLI waits: its job outlives JOB_TIMEOUT
+    monkeypatch.setattr(velvet.time, 'sleep', lambda seconds: _set_started_at(db, job_id, '2020-01-01 00:00:00'))
+
+    assert velvet.main(['generate']) == 0
+
+    assert query('SELECT status, error FROM jobs ORDER BY id') == [('failed', 'timed out'), ('done', None)]
+    assert query('SELECT COUNT(*) FROM invoices') == [(3,)]
+
+
+def test_cli_gives_up_behind_a_live_generation(db, workbook, monkeypatch, capsys):
+    monkeypatch.setattr(velvet, 'JOB_POLL_INTERVAL', 0)
+    _running_job(db)
+
+    assert velvet.main(['generate', '--wait', '0']) == 1
+
+    assert 'Gave up waiting' in capsys.readouterr().out
+    assert query('SELECT status FROM jobs ORDER BY id') == [('running',), ('queued',)]
+
+
+def test_excel_must_be_a_storage_key(workbook, tmp_path, capsys):
+    for path in (str(tmp_path / workbook), '../Anainvoices.xlsx', 'C:\\data\\Anainvoices.xlsx'):
+        with pytest.raises(SystemExit):
+            velvet.main(['generate', '--excel', path])
+        assert 'is not a storage key' in capsys.readouterr().err
+
+    assert velvet.main(['generate', '--excel', 'missing.xlsx']) == 1
+    assert velvet.main(['generate', '--dry-run', '--excel', 'missing.xlsx']) == 1
+    assert query('SELECT COUNT(*) FROM jobs') == [(0,)]
+
+
+def test_generate_and_dry_run_read_the_same_key(workbook, monkeypatch, capsys):
+    monkeypatch.setattr(generation, 'render_parallel', _render_empty)
+    os.makedirs('workbooks')
+    os.replace(workbook, 'workbooks/november.xlsx')
+
+    assert velvet.main(['generate', '--dry-run', '--excel', 'workbooks/november.xlsx']) == 0
+    assert '3 valid' in capsys.readouterr().out
+    assert velvet.main(['generate', '--excel', 'workbooks/november.xlsx']) == 0
+    assert list(pd.read_excel('workbooks/november.xlsx')['Invoice No:']) == ['#10', '#11', '#12']
+
+
+def test_queued_renders_use_the_jobs_pdf_profile(workbook, monkeypatch):
+    import worker
+
+    rendered = []
+
+    def render(data, path, logo_path, profile=None):
+        rendered.append(profile)
+        open(path, 'wb').close()
+    monkeypatch.setattr(worker, 'create_invoice_pdf', render)
+
+    result = generation.run_generation({'render_mode': 'queue', 'pdf_profile': 'compact'})
+    assert worker.run_worker('w', once=True) == 3
+
+    assert rendered == ['compact'] * 3
+    assert query('SELECT status FROM render_batches WHERE batch_id = ?', (result['render_batch'],)) == \
+        [('published',)]
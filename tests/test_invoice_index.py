@@ -0,0 +1,74 @@
+import pytest
+
+import invoice_index
+from conftest import invoice
+
+
+@pytest.fixture
+def index(db, monkeypatch):
+    index = invoice_index.InvoiceIndex()
+    monkeypatch.setattr(invoice_index, '_index', index)
+    # Only writes made by this process refresh it within the interval
+    monkeypatch.setattr(invoice_index, 'INVOICE_INDEX_REFRESH', 3600)
+    return index
+
+
+def _numbers(**filters):
+    records, count = invoice_index.list_invoices(**filters)
+    assert count == len(records)
+    return [record.invoice_number for record in records]
+
+
+def test_refresh_applies_inserts_updates_and_deletes(db, index):
+    db.add_invoices([invoice(1), invoice(2, client='Beta Ltd'), invoice(3)])
+    assert _numbers() == ['#3', '#2', '#1']
+
+    db.update_invoice_status('#2', 'paid', '2026-10-02')
+    db.delete_invoice('#3')
+    assert _numbers() == ['#2', '#1']
+    assert _numbers(status='paid') == ['#2']
+    assert index.records[max(index.records)].payment_date == '2026-10-02'
+
+    db.delete_invoices(['#1', '#2'])
+    assert _numbers() == []
+    assert index.records == {}
+
+
+def test_changes_from_other_processes_show_up_after_the_interval(db, index, monkeypatch):
+    assert db.add_invoice(invoice(1))
+    assert _numbers() == ['#1']
+
+    # A write by another node does not notify this process
+    monkeypatch.setattr(db, '_notify_write', lambda *args, **kwargs: None)
+    db.delete_invoice('#1')
+    assert _numbers() == ['#1']
+
+    monkeypatch.setattr(invoice_index, 'INVOICE_INDEX_REFRESH', 0)
+    assert _numbers() == []
+
+
+def test_sorts_are_rebuilt_after_a_change(db, index):
+    db.add_invoices([invoice(9, client='beta', total='50.00'), invoice(10, client='Alpha', total='119.00')])
+    assert _numbers(sort='number') == ['#10', '#9']
+    assert _numbers(sort='client') == ['#10', '#9']
+    assert _numbers(sort='amount') == ['#10', '#9']
+
+    db.delete_invoice('#10')
+    db.add_invoice(invoice(11, client='Gamma', total='20.00'))
+    assert _numbers(sort='amount') == ['#9', '#11']
+    assert _numbers(sort='number') == ['#11', '#9']
+
+
+def test_search_matches_number_or_client(db, index):
+    db.add_invoices([invoice(1, client='Acme Ltd'), invoice(12, client='Beta Ltd')])
+    assert _numbers(search='acme') == ['#1']
+    assert _numbers(search='#1') == ['#12', '#1']
+    page, count = invoice_index.list_invoices(limit=1, offset=1)
+    assert ([record.invoice_number for record in page], count) == (['#1'], 2)
+
+
+def test_records_share_repeated_strings(db, index):
+    db.add_invoices([invoice(1), invoice(2)])
+    first, second = invoice_index.list_invoices()[0]
+    assert first.client_name is second.client_name
+    assert first.total_cents == 11900 and first.as_dict()['total_amount'] == 119.0
@@ -0,0 +1,39 @@
+import pytest
+
+from conftest import invoice, query
+
+
+def _store(db, *numbers):
+    for i, number in enumerate(numbers):
+        assert db.add_invoice(invoice(0, vat=f'CY{i}X', invoice_number=number))
+
+
+@pytest.mark.parametrize('number, value', [
+    ('#42', 42), ('42', 42), ('#0042', 42), ('##7', 7),
+    ('INV-0042', None), ('#42a', None), ('#', None), ('', None), ('#٤٢', None), ('#' + '9' * 19, None),
+])
+def test_invoice_number_value(db, number, value):
+    assert db.invoice_number_value(number) == value
+
+
+def test_counter_seeds_from_numbers_in_the_allocated_format_only(db):
+    _store(db, '#7', '12', 'INV-0099', '2024-0500', '#0009', '#50x', '#' + '9' * 19)
+
+    assert db.allocate_invoice_numbers(2) == 13
+    assert db.allocate_invoice_numbers(1) == 15
+
+
+def test_counter_seed_matches_the_python_rule(db):
+    numbers = ['#3', '8', 'INV-0042', 'A7', '#12-1', '#0011']
+    _store(db, *numbers)
+
+    expected = max(v for v in map(db.invoice_number_value, numbers) if v is not None)
+    assert query(db._MAX_INVOICE_NUMBER_SQL) == [(expected,)]
+
+
+def test_counter_seed_counts_archived_invoices(db):
+    _store(db, '#30', '#5')
+    db.update_invoice_status('#30', 'paid', '2020-01-01')
+    assert db.archive_paid_invoices(retention_days=30) == 1
+
+    assert db.allocate_invoice_numbers(1) == 31
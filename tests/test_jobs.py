@@ -0,0 +1,65 @@
+import pytest
+
+import jobs
+from conftest import query
+
+
+@pytest.fixture
+def ran(db, monkeypatch):
+    """Payloads run by the 'test' job handler, in order"""
+    ran = []
+
+    def run(payload):
+        if payload.get('fail'):
+            raise RuntimeError('boom')
+        ran.append(payload['n'])
+        return {'n': payload['n']}
+    monkeypatch.setitem(jobs._handlers, 'test', run)
+    return ran
+
+
+def test_submit_runs_the_job_on_this_node(ran):
+    job = jobs.submit('test', {'n': 1})
+
+    assert ran == [1]
+    assert (job['status'], job['result'], job['node']) == ('done', {'n': 1}, jobs.NODE_NAME)
+
+
+def test_a_failing_job_records_its_error(ran):
+    job = jobs.submit('test', {'fail': True})
+    assert (job['status'], job['error']) == ('failed', 'boom')
+
+
+def test_only_one_job_of_a_kind_runs_at_a_time(db, ran):
+    running = db.claim_job('test', 'node-a', db.enqueue_job('test', {'n': 1}))
+    assert running is not None
+
+    queued = jobs.submit('test', {'n': 2})
+    assert queued['status'] == 'queued'
+    assert db.claim_job('test', 'node-b') is None
+    # Other kinds have their own slot
+    assert db.claim_job('other', 'node-b', db.enqueue_job('other')) is not None
+    assert ran == []
+
+
+def test_the_node_finishing_a_job_runs_the_queue_in_order(db, ran):
+    with jobs.exclusive('test'):
+        second = jobs.submit('test', {'n': 2})
+        third = jobs.submit('test', {'n': 3})
+        assert ran == []
+
+    assert ran == [2, 3]
+    assert db.get_job(second['id'])['status'] == db.get_job(third['id'])['status'] == 'done'
+
+
+def test_a_job_left_running_by_a_dead_node_times_out(db, ran):
+    stale = db.claim_job('test', 'node-a', db.enqueue_job('test', {'n': 1}))
+    conn = db.get_connection()
+    conn.execute('UPDATE jobs SET started_at = ? WHERE id = ?', (db._now_text(-db.JOB_TIMEOUT - 1), stale['id']))
+    conn.commit()
+    conn.close()
+
+    job = jobs.submit('test', {'n': 2})
+
+    assert job['status'] == 'done'
+    assert query('SELECT status, error FROM jobs WHERE id = ?', (stale['id'],)) == [('failed', 'timed out')]
@@ -0,0 +1,82 @@
+import logging
+
+import pytest
+from flask import Flask
+
+import metrics
+from logs import RateLimitFilter
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram('test_seconds', 'Test', ('stage',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, 'render')
+
+    assert histogram.render() == [
+        'test_seconds_bucket{stage="render",le="0.1"} 1',
+        'test_seconds_bucket{stage="render",le="1"} 3',
+        'test_seconds_bucket{stage="render",le="+Inf"} 4',
+        'test_seconds_sum{stage="render"} 4.250000',
+        'test_seconds_count{stage="render"} 4',
+    ]
+
+
+def test_disabled_metrics_cost_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', False)
+
+    def query():
+        pass
+    assert metrics.db_timed(query) is query
+    assert metrics.stage_timer('render') is metrics.stage_timer('email')
+
+
+def test_enabled_metrics_time_stages_and_database_calls(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    for metric in (metrics.STAGE_SECONDS, metrics.DB_QUERY_SECONDS, metrics.DB_ERRORS):
+        monkeypatch.setattr(metric, 'series', {})
+
+    @metrics.db_timed
+    def broken_query():
+        raise RuntimeError('gone')
+
+    with metrics.stage_timer('render'):
+        pass
+    with pytest.raises(RuntimeError):
+        broken_query()
+
+    assert metrics.STAGE_SECONDS.series[('render',)][2] == 1
+    assert metrics.DB_QUERY_SECONDS.series[('broken_query',)][2] == 1
+    assert metrics.DB_ERRORS.series == {('broken_query',): 1}
+    assert metrics.DB_CONNECTIONS_IN_USE.series.get((), 0) == 0
+
+
+def test_metrics_endpoint_serves_request_latency(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(metrics.HTTP_SECONDS, 'series', {})
+    app = Flask(__name__)
+    app.add_url_rule('/hello', 'hello', lambda: 'hi')
+    metrics.init_app(app)
+
+    client = app.test_client()
+    assert client.get('/hello').status_code == 200
+    response = client.get('/metrics')
+
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE velvet_http_request_duration_seconds histogram' in body
+    assert 'velvet_http_request_duration_seconds_count{route="/hello",method="GET",status="200"} 1' in body
+
+
+def test_row_logging_is_rate_limited(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('logs.time.monotonic', lambda: clock[0])
+    limit = RateLimitFilter(burst=2, window=10)
+
+    def record(message):
+        return logging.LogRecord('rows', logging.INFO, __file__, 1, message, None, None)
+
+    assert [limit.filter(record(f'row {i}')) for i in range(4)] == [True, True, False, False]
+    clock[0] += 10
+    summary = record('row 4')
+    assert limit.filter(summary)
+    assert summary.getMessage() == 'row 4 (2 similar messages suppressed)'
@@ -0,0 +1,23 @@
+import importlib
+
+import invoice_generator
+from conftest import invoice
+
+
+def test_default_profile_is_legacy(monkeypatch):
+    monkeypatch.delenv('PDF_PROFILE', raising=False)
+    assert importlib.reload(invoice_generator).PDF_PROFILE == 'legacy'
+
+
+def test_no_profile_claims_pdfa():
+    assert 'archive' not in invoice_generator.PDF_PROFILES
+    assert not any('pdfa' in options for options in invoice_generator.PDF_PROFILES.values())
+
+
+def test_metadata_profile_sets_document_info(tmp_path):
+    output = tmp_path / 'invoice.pdf'
+    invoice_generator.create_invoice_pdf(invoice(7, subtotal='100.00'), str(output), logo_path=str(tmp_path / 'missing.jpg'),
+                                         profile='metadata')
+    pdf = output.read_bytes()
+    assert pdf.startswith(b'%PDF-1.4')
+    assert b'(Invoice #7)' in pdf
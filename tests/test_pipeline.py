@@ -0,0 +1,65 @@
+import importlib.util
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT, query
+from invoice_generator import build_invoice_data, invoice_pdf_filename, next_invoice_number, zip_invoices
+
+
+@pytest.fixture(scope='module')
+def bench():
+    path = os.path.join(ROOT, 'benchmarks', 'bench_pipeline.py')
+    spec = importlib.util.spec_from_file_location('bench_pipeline', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_a_row_becomes_invoice_data_and_a_file_name():
+    row = pd.Series({'Issued to': 'Acme, Ltd.\nMain Street 1\nNicosia', 'VAT Number': 'CY60071105E',
+                     'Description': 'Content Creation', 'Quantity': 1, 'Total': 100, 'Subtotal': 100,
+                     'Tax(19%)': 19.0, 'Total.1': 119.0})
+    data = build_invoice_data(row, 12, '01 October, 2026', 'October')
+
+    assert (data['client_name'], data['client_address_3'], data['client_address_4']) == ('Acme, Ltd.', 'Nicosia', '')
+    assert (data['invoice_number'], data['total_amount']) == ('#12', '119.0')
+    assert invoice_pdf_filename('out', data, 'October', 2026) == 'out/Invoice_Acme_Ltd_October_2026.pdf'
+
+
+def test_the_next_number_ignores_cells_that_are_not_numbers():
+    df = pd.DataFrame({'Invoice No:': ['#7', 'twelve', None, '#3']})
+    assert next_invoice_number(df) == 8
+    assert next_invoice_number(df.iloc[1:3]) == 1
+
+
+def test_zip_invoices_stores_each_pdf_by_name(tmp_path):
+    pdfs = []
+    for name in ('a.pdf', 'b.pdf'):
+        (tmp_path / name).write_bytes(name.encode())
+        pdfs.append(str(tmp_path / name))
+
+    with zipfile.ZipFile(zip_invoices(pdfs, str(tmp_path / 'all.zip'))) as archive:
+        assert {name: archive.read(name) for name in archive.namelist()} == {'a.pdf': b'a.pdf', 'b.pdf': b'b.pdf'}
+
+
+def test_the_benchmark_times_every_stage_and_cleans_up(db, bench, tmp_path):
+    results = bench.run_stages([3], 1, str(tmp_path))
+
+    assert [(r['stage'], r['items']) for r in results] == [
+        ('excel_load', 3), ('normalize', 3), ('remove_white_background', 1), ('create_invoice_pdf', 1),
+        ('add_invoice', 3), ('zip', 1), ('email_mime', 1)]
+    assert query('SELECT COUNT(*) FROM invoices') == [(0,)]
+
+
+def test_compare_flags_only_slow_regressions(bench):
+    def result(stage, per_item_ms, seconds):
+        return {'backend': 'sqlite', 'rows': 10, 'stage': stage, 'per_item_ms': per_item_ms, 'seconds': seconds}
+
+    baseline = {'meta': {}, 'results': [result('render', 10, 0.1), result('zip', 1, 0.01), result('email', 5, 0.05)]}
+    current = {'results': [result('render', 13, 0.13), result('zip', 2, 0.02), result('email', 5.5, 0.055),
+                           result('new_stage', 1, 1)]}
+
+    assert [r['stage'] for r in bench.compare(current, baseline, threshold=0.2)] == ['render']
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pytest
+
+import generation
+import profiling
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_FOLDER', str(tmp_path / 'profiles'))
+    return tmp_path / 'profiles'
+
+
+def _busy(n):
+    return sum(i * i for i in range(n))
+
+
+def test_a_profiled_run_stores_the_profile_and_its_hotspots(folder):
+    result, job_id = profiling.run_profiled('test', _busy, 1000)
+
+    assert result == _busy(1000)
+    assert (folder / f'{job_id}.prof').exists()
+    summary = profiling.latest_summary()
+    assert (summary['job_id'], summary['label']) == (job_id, 'test')
+    assert any('_busy' in hotspot['function'] for hotspot in summary['hotspots'])
+    assert len(summary['hotspots']) <= profiling.PROFILE_TOP_N
+
+
+def test_a_failed_run_is_still_profiled(folder):
+    def fail():
+        raise RuntimeError('render failed')
+
+    with pytest.raises(RuntimeError):
+        profiling.run_profiled('test', fail)
+    assert len(profiling.list_profiles()) == 1
+
+
+def test_only_the_newest_profiles_are_kept(folder, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_KEEP', 2)
+    first = profiling.run_profiled('test', _busy, 10)[1]
+    second = profiling.run_profiled('test', _busy, 10)[1]
+    for age, job_id in ((200, first), (100, second)):
+        for ext in ('.prof', '.json'):
+            path = folder / f'{job_id}{ext}'
+            os.utime(path, (path.stat().st_mtime - age,) * 2)
+
+    third = profiling.run_profiled('test', _busy, 10)[1]
+
+    assert profiling.list_profiles() == [third, second]
+    assert sorted(os.listdir(folder)) == sorted(f'{job_id}{ext}' for job_id in (second, third)
+                                                for ext in ('.prof', '.json'))
+
+
+def test_summaries_are_read_from_the_profile_folder_only(folder, tmp_path):
+    (tmp_path / 'secret.json').write_text('{}')
+    assert profiling.load_summary('../secret') is None
+    assert profiling.latest_summary() is None
+
+
+def test_a_generate_job_can_be_profiled(db, folder):
+    rows = [{
+        'Issued to': 'Client Ltd\nMain Street 1\nNicosia', 'VAT Number': 'CY60071105E', 'Invoice No:': '#1',
+        'Date Issued:': '01 November, 2025', 'Description': 'Content Creation', 'Quantity': 1, 'Month': 'November',
+        'Total': 100, 'Subtotal': 100, 'Tax(19%)': 19.0, 'Total.1': 119.0,
+    }]
+    pd.DataFrame(rows).to_excel(generation.EXCEL_FILE, index=False)
+
+    result = generation.run_generation({'profile': True})
+
+    assert result['generated'] == 1
+    assert profiling.load_summary(result['profile_id'])['label'] == 'generate'
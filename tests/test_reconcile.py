@@ -0,0 +1,99 @@
+import io
+
+import pytest
+
+from conftest import invoice, query
+from reconcile import InvoiceMatcher, _parse_amount, read_statement, reconcile
+
+REVOLUT = '''Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance
+TRANSFER,Current,2026-10-01 09:00:00,2026-10-01 09:05:00,Payment from Acme Ltd,119.00,0.00,EUR,COMPLETED,119.00
+TRANSFER,Current,2026-10-02 09:00:00,,Payment from Beta Ltd,238.00,0.00,EUR,PENDING,119.00
+CARD_PAYMENT,Current,2026-10-03 09:00:00,2026-10-03 09:00:00,Coffee,-3.50,0.00,EUR,COMPLETED,115.50
+'''
+
+ALPHA = '''Value Date;Description;Reference;Debit;Credit
+01/10/2026;TRANSFER ACME LTD;INV 12;;1.234,56
+02/10/2026;BANK FEE;;2,00;
+'''
+
+
+def _txn(amount, description='', reference=''):
+    return {'line': 2, 'date': '2026-10-01', 'amount_cents': amount, 'description': description,
+            'reference': reference}
+
+
+@pytest.fixture
+def matcher():
+    return InvoiceMatcher([('#12', 11900, 'Acme Ltd'), ('#13', 23800, 'Beta Ltd'), ('#14', 23800, 'Gamma Ltd'),
+                           ('#15', 5000, 'Delta Ltd')])
+
+
+def test_invoice_number_with_the_same_amount_matches(matcher):
+    invoice, rule = matcher.match(_txn(11900, reference='Invoice #12'))
+    assert (invoice['invoice_number'], rule) == ('#12', 'invoice_number')
+
+
+def test_single_open_invoice_with_the_amount_matches(matcher):
+    invoice, rule = matcher.match(_txn(5000, 'Transfer'))
+    assert (invoice['invoice_number'], rule) == ('#15', 'amount')
+
+
+def test_shared_amount_is_resolved_by_the_client_name(matcher):
+    invoice, rule = matcher.match(_txn(23800, 'PAYMENT GAMMA LTD'))
+    assert (invoice['invoice_number'], rule) == ('#14', 'amount_and_client')
+
+
+def test_shared_amount_without_a_client_is_ambiguous(matcher):
+    assert matcher.match(_txn(23800, 'Transfer')) == (None, '2 open invoices with this amount')
+
+
+def test_explicit_number_with_another_amount_is_not_matched(matcher):
+    assert matcher.match(_txn(12000, reference='#12')) == (None, 'mentions #12 but amount differs')
+
+
+def test_an_invoice_is_matched_once(matcher):
+    assert matcher.match(_txn(5000))[0]['invoice_number'] == '#15'
+    assert matcher.match(_txn(5000)) == (None, 'no open invoice matches')
+
+
+@pytest.mark.parametrize('text, cents', [
+    ('1.234,56', 123456), ('1,234.56', 123456), ('12,50', 1250), ('1,234', 123400), ('-45.00', -4500),
+    ('€ 1 000.00', 100000), ('119.00 EUR', 11900), ('', None), ('n/a', None),
+])
+def test_parse_amount(text, cents):
+    assert _parse_amount(text) == cents
+
+
+def test_revolut_statement_keeps_completed_incoming_lines():
+    rows = list(read_statement(io.StringIO(REVOLUT)))
+    assert [(r['line'], r['date'], r['amount_cents'], r['description']) for r in rows] == \
+        [(2, '2026-10-01', 11900, 'Payment from Acme Ltd')]
+
+
+def test_alpha_statement_reads_the_credit_column():
+    rows = list(read_statement(io.StringIO(ALPHA)))
+    assert [(r['line'], r['date'], r['amount_cents'], r['reference']) for r in rows] == \
+        [(2, '2026-10-01', 123456, 'INV 12')]
+
+
+def test_line_without_a_readable_date_is_left_unmatched(db):
+    assert db.add_invoice(invoice(12, total='119.00'))
+    statement = 'Value Date;Description;Reference;Credit\nsoon;ACME;#12;119,00\n'
+
+    result = reconcile(io.StringIO(statement))
+
+    assert result['matched'] == []
+    assert result['unmatched'][0]['reason'] == 'unreadable date'
+    assert query('SELECT status, payment_date FROM invoices') == [('pending', None)]
+
+
+def test_reconcile_marks_matches_paid_on_the_statement_date(db):
+    assert db.add_invoice(invoice(1, total='119.00'))
+    assert db.add_invoice(invoice(2, client='Beta Ltd', vat='CY20000000X', total='238.00'))
+
+    result = reconcile(io.StringIO(REVOLUT))
+
+    assert [(m['invoice_number'], m['rule']) for m in result['matched']] == [('#1', 'amount')]
+    assert result['updated'] == 1
+    assert query('SELECT invoice_number, status, payment_date FROM invoices ORDER BY id') == \
+        [('#1', 'paid', '2026-10-01'), ('#2', 'pending', None)]
@@ -0,0 +1,109 @@
+import pytest
+
+from conftest import query
+
+
+@pytest.fixture
+def batch(db):
+    db.enqueue_render_batch('b1', 'out', [('out/batches/b1/a.pdf', {'n': 1}), ('out/batches/b1/b.pdf', {'n': 2})])
+    return 'b1'
+
+
+def _claim_all(db):
+    """Lease every task of the batch to worker w, return {file name: task}"""
+    return {task['output_key'].rsplit('/', 1)[1]: task for task in db.claim_render_tasks('w', limit=2)}
+
+
+def _complete(db, task):
+    return db.complete_render_task(task['id'], 'w', task['attempts'])
+
+
+def _fail_for_good(db, task):
+    """Fail a leased task on every attempt, return the batch outcome of the last failure"""
+    while True:
+        outcome = db.fail_render_task(task['id'], 'w', task['attempts'], 'boom')
+        if query('SELECT status FROM render_tasks WHERE id = ?', (task['id'],)) == [('failed',)]:
+            return outcome
+        (task,) = db.claim_render_tasks('w')
+
+
+def test_batch_with_every_task_done_is_published(db, batch):
+    tasks = _claim_all(db)
+    assert _complete(db, tasks['a.pdf']) is None
+    assert _complete(db, tasks['b.pdf'])['batch_id'] == batch
+    assert db.get_render_batch_progress(batch)['status'] == 'published'
+
+
+def test_permanently_failing_task_settles_batch_as_partial(db, batch):
+    tasks = _claim_all(db)
+    assert _complete(db, tasks['a.pdf']) is None
+    assert _fail_for_good(db, tasks['b.pdf']) == 'partial'
+
+    progress = db.get_render_batch_progress(batch)
+    assert progress['status'] == 'partial'
+    assert progress['failed'] == 1
+    assert progress['published_at'] is None
+    assert progress['errors'] == [{'output_key': 'out/batches/b1/b.pdf', 'error': 'boom'}]
+
+
+def test_failure_before_the_last_completion_settles_on_completion(db, batch):
+    tasks = _claim_all(db)
+    assert _fail_for_good(db, tasks['b.pdf']) is None
+    # The last outstanding task succeeds, but the batch is incomplete - nobody publishes it
+    assert _complete(db, tasks['a.pdf']) is None
+    assert db.get_render_batch_progress(batch)['status'] == 'partial'
+
+
+def test_expired_leases_settle_the_batch(db, batch):
+    for _ in range(db.RENDER_MAX_ATTEMPTS):
+        tasks = db.claim_render_tasks('w', limit=2, lease_seconds=-10)
+        assert len(tasks) == 2
+    # The next claim fails both tasks for good
+    assert db.claim_render_tasks('w', limit=2) == []
+    assert db.get_render_batch_progress(batch)['status'] == 'failed'
+
+
+def test_retry_requeues_failed_tasks(db, batch):
+    tasks = _claim_all(db)
+    assert _complete(db, tasks['a.pdf']) is None
+    _fail_for_good(db, tasks['b.pdf'])
+
+    assert db.retry_render_batch(batch) == 1
+    assert db.get_render_batch_progress(batch)['status'] == 'rendering'
+    (task,) = db.claim_render_tasks('w')
+    assert task['id'] == tasks['b.pdf']['id']
+    assert _complete(db, task)['batch_id'] == batch
+    assert query('SELECT status, failed FROM render_batches') == [('published', 0)]
+
+
+def test_newest_batch_is_reported_without_an_id(db, batch):
+    assert db.get_render_batch_progress()['batch_id'] == batch
+
+
+def test_worker_that_lost_its_lease_cannot_complete(db, batch):
+    stale = db.claim_render_tasks('w1', limit=2, lease_seconds=-10)
+    fresh = {task['id']: task for task in db.claim_render_tasks('w2', limit=2)}
+    task = stale[0]
+
+    # Reclaimed by w2: neither w1 nor w1's attempt counts any more
+    assert db.complete_render_task(task['id'], 'w1', task['attempts']) is None
+    assert db.fail_render_task(task['id'], 'w1', task['attempts'], 'boom') is None
+    assert db.complete_render_task(task['id'], 'w2', task['attempts']) is None
+    assert query('SELECT status, worker FROM render_tasks WHERE id = ?', (task['id'],)) == [('running', 'w2')]
+
+    for task in fresh.values():
+        db.complete_render_task(task['id'], 'w2', task['attempts'])
+    assert db.get_render_batch_progress(batch)['status'] == 'published'
+
+
+def test_late_outcome_does_not_touch_a_settled_task(db, batch):
+    tasks = _claim_all(db)
+    assert _fail_for_good(db, tasks['b.pdf']) is None
+    assert _complete(db, tasks['a.pdf']) is None
+    assert db.get_render_batch_progress(batch)['status'] == 'partial'
+
+    # The first attempt's worker reports in late: the batch stays settled
+    assert db.complete_render_task(tasks['b.pdf']['id'], 'w', 1) is None
+    assert query('SELECT status FROM render_tasks ORDER BY id') == [('done',), ('failed',)]
+    assert db.fail_render_task(tasks['a.pdf']['id'], 'w', 1, 'boom') is None
+    assert query('SELECT status FROM render_tasks ORDER BY id') == [('done',), ('failed',)]
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+
+import app
+import reports
+from conftest import invoice, query
+
+
+def test_unparseable_payment_date_does_not_block_status_update(db):
+    assert db.add_invoice(invoice(1))
+    db.update_invoice_status('#1', 'paid', '2025-02-32')
+
+    assert query("SELECT status FROM invoices WHERE invoice_number = '#1'") == [('paid',)]
+    assert query("SELECT pay_days FROM invoice_day_totals WHERE status = 'paid' AND invoices > 0") == [(-1,)]
+
+
+def test_postgres_pay_days_uses_the_guarded_date_parse(db, monkeypatch):
+    monkeypatch.setattr(db, 'USE_POSTGRES', True)
+    sql = db._pay_days_sql('NEW')
+    assert '::date' not in sql
+    assert 'velvet_try_date(NEW.payment_date)' in sql
+
+
+def test_report_cache_is_bounded(db, monkeypatch):
+    monkeypatch.setattr(reports, 'REPORT_CACHE_MAX_ENTRIES', 5)
+    reports.invalidate()
+    for year in range(2001, 2021):
+        reports.revenue_by_month(start=f'{year}-01')
+    assert len(reports._cache) == 5
+    # The newest ranges are the ones kept
+    assert ('monthly', ('2020-01', None)) in reports._cache
+    assert ('monthly', ('2001-01', None)) not in reports._cache
+
+
+def test_report_cache_drops_expired_entries_first(db, monkeypatch):
+    monkeypatch.setattr(reports, 'REPORT_CACHE_MAX_ENTRIES', 3)
+    reports.invalidate()
+    monkeypatch.setattr(reports, 'REPORT_CACHE_TTL', -1)
+    reports.revenue_by_month(start='2026-01')
+    reports.revenue_by_month(start='2026-02')
+    monkeypatch.setattr(reports, 'REPORT_CACHE_TTL', 30)
+    for start in ('2026-03', '2026-04'):
+        reports.revenue_by_month(start=start)
+    assert sorted(key[1][0] for key in reports._cache) == ['2026-03', '2026-04']
+
+
+def _epoch(day):
+    return int(datetime.fromisoformat(day).timestamp())
+
+
+def test_past_aging_counts_archived_invoices(db):
+    reports.invalidate()
+    assert db.add_invoice(invoice(1, date_issued='05 January, 2020'))
+    db.update_invoice_status('#1', 'paid', '2020-02-01')
+    conn = db.get_connection()
+    conn.execute('UPDATE invoice_events SET ts = ? WHERE event = ?', (_epoch('2020-01-05'), db.EVENT_CREATED))
+    conn.execute('UPDATE invoice_events SET ts = ? WHERE event = ?', (_epoch('2020-02-01'), db.EVENT_STATUS))
+    conn.commit()
+    conn.close()
+    before = reports.aging('2020-01-20')
+
+    assert db.archive_paid_invoices(retention_days=30) == 1
+    assert reports.aging('2020-01-20') == before
+    assert before[0] == {'bucket': '0-30', 'invoices': 1, 'outstanding': 119.0}
+
+
+@pytest.mark.parametrize('args', [{'start': '2026-13'}, {'end': '2026-1'}, {'start': 'x'}, {'end': '2026-01-01'}])
+def test_invalid_periods_are_rejected(db, args):
+    client = app.app.test_client()
+    client.post('/login', data={'password': app.LOGIN_PASSWORD})
+    for name in ('clients', 'monthly', 'yearly', 'days-to-pay'):
+        assert client.get(f'/api/reports/{name}', query_string=args).status_code == 400
+        assert client.get(f'/reports/{name}.csv', query_string=args).status_code == 400
+    assert client.get('/api/reports/monthly', query_string={'start': '2026-01', 'end': '2026-12'}).status_code == 200
+
+
+def test_invalid_as_of_is_rejected(db):
+    client = app.app.test_client()
+    client.post('/login', data={'password': app.LOGIN_PASSWORD})
+    for as_of in ('2026-02-30', '2026-13', 'today'):
+        assert client.get('/api/reports/aging', query_string={'as_of': as_of}).status_code == 400
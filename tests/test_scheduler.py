@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+import scheduler
+from conftest import ROOT
+
+
+def test_run_slot_is_claimed_once_per_window(db):
+    assert db.claim_run_slot('job', 3600)
+    assert not db.claim_run_slot('job', 3600)
+    assert db.claim_run_slot('other', 3600)
+
+
+def test_first_run_can_be_deferred(db):
+    assert not db.claim_run_slot('deferred', 3600, first_after=3600)
+
+
+def test_only_one_scheduler_runs_each_job_per_interval(db, monkeypatch):
+    calls = []
+    for name in ('run_overdue_job', 'run_archive_job', 'run_maintenance'):
+        job = (lambda name: lambda: calls.append(name))(name)
+        job.__name__ = name
+        monkeypatch.setattr(scheduler, name, job)
+
+    # Two gunicorn workers waking at the same time
+    assert scheduler.run_pending(3600) == ['run_overdue_job', 'run_archive_job']
+    assert scheduler.run_pending(3600) == []
+    assert calls == ['run_overdue_job', 'run_archive_job']
+
+
+def test_web_app_starts_the_scheduler_on_its_first_request_not_on_import(tmp_path):
+    script = (
+        'import app, asgi, scheduler\n'
+        'assert scheduler._scheduler_thread is None\n'
+        "app.app.test_client().get('/login')\n"
+        'assert scheduler._scheduler_thread.is_alive()\n'
+    )
+    env = dict(os.environ, OVERDUE_CHECK_INTERVAL='3600', PYTHONPATH=ROOT)
+    env.pop('DATABASE_URL', None)
+    subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, check=True, capture_output=True)
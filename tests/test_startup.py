@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from conftest import ROOT, query
+
+
+def test_importing_the_app_loads_no_heavy_dependencies_and_no_database(tmp_path):
+    script = (
+        'import json, sys, app\n'
+        "print(json.dumps([m for m in ('pandas', 'reportlab', 'PIL', 'openpyxl') if m in sys.modules]))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('DATABASE_URL', None)
+    proc = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, check=True,
+                          capture_output=True, text=True)
+
+    assert json.loads(proc.stdout.splitlines()[-1]) == []
+    assert not (tmp_path / 'invoices.db').exists()
+
+
+def test_the_schema_is_applied_once_per_process(db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(db, 'init_db', lambda: calls.append(1))
+
+    # Current schema: nothing to apply
+    monkeypatch.setattr(db, '_schema_ready', False)
+    db.ensure_schema()
+    assert calls == []
+
+    conn = db.get_connection()
+    conn.execute('DELETE FROM schema_version')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, '_schema_ready', False)
+    threads = [threading.Thread(target=db.ensure_schema) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.ensure_schema()
+    assert calls == [1]
+
+
+def test_an_outdated_schema_is_upgraded(db, monkeypatch):
+    conn = db.get_connection()
+    conn.execute('UPDATE schema_version SET version = ?', (db.SCHEMA_VERSION - 1,))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, '_schema_ready', False)
+    db.ensure_schema()
+    assert query('SELECT MAX(version) FROM schema_version') == [(db.SCHEMA_VERSION,)]
@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+import generation
+import velvet
+from conftest import query
+from validation import WorkbookInvalid, check_workbook, validate_workbook
+
+
+def _rows(count=3, **changes):
+    return [{
+        'Issued to': f'Client {i} Ltd\nMain Street {i}\nNicosia', 'VAT Number': 'CY60071105E',
+        'Invoice No:': f'#{i}', 'Description': 'Content Creation', 'Quantity': 1,
+        'Total': 100, 'Subtotal': 100, 'Tax(19%)': 19.0, 'Total.1': 119.0, **changes,
+    } for i in range(1, count + 1)]
+
+
+def _problems(problems):
+    return [(problem['row'], problem['column']) for problem in problems]
+
+
+def test_a_clean_workbook_passes():
+    report = check_workbook(pd.DataFrame(_rows()))
+    assert report == {'rows': 3, 'errors': [], 'warnings': []}
+
+
+def test_missing_columns_stop_the_other_checks():
+    report = validate_workbook(pd.DataFrame(_rows()).drop(columns=['VAT Number', 'Total.1']))
+    assert _problems(report['errors']) == [(1, 'VAT Number'), (1, 'Total.1')]
+
+
+def test_row_errors_use_excel_row_numbers():
+    rows = _rows(5)
+    rows[1]['Issued to'] = 'Client 1 Ltd\nElsewhere'
+    rows[2]['Quantity'] = 0
+    rows[3]['Total.1'] = 120.0
+    rows[4]['Invoice No:'] = 'twelve'
+    report = validate_workbook(pd.DataFrame(rows))
+
+    assert _problems(report['errors']) == [(3, 'Issued to'), (4, 'Quantity'), (5, 'Total.1'), (6, 'Invoice No:')]
+    assert report['errors'][0]['message'].startswith('same client as row 2')
+    assert report['errors'][2]['message'] == 'Subtotal + Tax(19%) is 119.00, not 120.00'
+
+
+def test_amounts_may_be_formatted_text_within_rounding():
+    report = validate_workbook(pd.DataFrame(_rows(1, **{'Subtotal': '1,000.00', 'Tax(19%)': '€ 190.004',
+                                                       'Total.1': 1190})))
+    assert report['errors'] == []
+
+
+def test_the_vat_number_column_is_the_issuers():
+    rows = _rows(4)
+    rows[1]['VAT Number'] = 'cy 6007-1105.e'  # Same number, written differently
+    rows[2]['VAT Number'] = 'CY99999999X'
+    rows[3]['VAT Number'] = None
+    report = validate_workbook(pd.DataFrame(rows))
+
+    assert _problems(report['errors']) == [(5, 'VAT Number')]
+    assert report['errors'][0]['message'] == 'the issuer VAT number is missing'
+    assert _problems(report['warnings']) == [(4, 'VAT Number')]
+    assert report['warnings'][0]['message'] == "issuer VAT differs from 'CY60071105E' on the other rows"
+
+
+def test_client_vat_is_checked_per_row_when_the_sheet_has_it():
+    rows = _rows(3)
+    rows[0]['Client VAT'] = 'CY10000000X'
+    rows[1]['Client VAT'] = None
+    rows[2]['Client VAT'] = 'not-a-vat'
+    report = validate_workbook(pd.DataFrame(rows))
+
+    assert _problems(report['errors']) == [(4, 'Client VAT')]
+    assert _problems(report['warnings']) == [(3, 'Client VAT')]
+    assert report['warnings'][0]['message'] == 'no client VAT number'
+
+
+def test_generation_refuses_a_workbook_with_errors(db):
+    rows = _rows()
+    rows[1]['Quantity'] = -1
+    pd.DataFrame(rows).to_excel(generation.EXCEL_FILE, index=False)
+
+    with pytest.raises(WorkbookInvalid, match='row 3 Quantity: must be a positive number'):
+        generation.run_generation({})
+    assert query('SELECT COUNT(*) FROM invoices') == [(0,)]
+
+
+def test_dry_run_skips_error_rows_and_renders_the_rest(db, monkeypatch, capsys):
+    rendered = []
+
+    def render(tasks, workers):
+        for data, path, logo_path, profile in tasks:
+            rendered.append(data['client_name'])
+            open(path, 'wb').close()
+    monkeypatch.setattr(generation, 'render_parallel', render)
+    rows = _rows(4, **{'Client VAT': 'CY10000000X'})
+    rows[1]['Total.1'] = 200.0
+    rows[3]['Client VAT'] = None  # A warning only
+    pd.DataFrame(rows).to_excel(generation.EXCEL_FILE, index=False)
+
+    # Errors fail the dry run, but every valid row is still rendered and timed
+    assert velvet.main(['generate', '--dry-run']) == 1
+
+    assert rendered == ['Client 1 Ltd', 'Client 3 Ltd', 'Client 4 Ltd']
+    out = capsys.readouterr().out
+    assert '4 row(s), 3 valid, 1 with errors' in out
+    assert 'row 3 Total.1' in out and 'row 5 Client VAT: no client VAT number' in out
+    assert query('SELECT COUNT(*) FROM invoices') == [(0,)]
@@ -0,0 +1,71 @@
+import io
+
+import pandas as pd
+import pytest
+
+import app
+import generation
+from conftest import query
+
+
+def _workbook_bytes(clients=2):
+    rows = [{
+        'Issued to': f'Client {i} Ltd\nMain Street {i}\nNicosia', 'VAT Number': f'CY{i}0000000X',
+        'Invoice No:': '#9', 'Date Issued:': '01 November, 2025', 'Description': 'Content Creation', 'Quantity': 1,
+        'Month': 'November', 'Total': 100, 'Subtotal': 100, 'Tax(19%)': 19.0, 'Total.1': 119.0,
+    } for i in range(1, clients + 1)]
+    buffer = io.BytesIO()
+    pd.DataFrame(rows).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(db):
+    client = app.app.test_client()
+    assert client.post('/login', data={'password': app.LOGIN_PASSWORD}).status_code == 302
+    return client
+
+
+def _upload(client, data):
+    return client.post('/upload-excel', data={'excel_file': (io.BytesIO(data), 'new.xlsx')},
+                       content_type='multipart/form-data')
+
+
+def _generation_elsewhere(db):
+    """A generate job running on another node"""
+    job_id = db.enqueue_job('generate', {})
+    assert db.claim_job('generate', 'other-node', job_id)
+    return job_id
+
+
+def test_upload_and_delete_wait_for_no_generation_on_any_node(db, client):
+    with open(generation.EXCEL_FILE, 'wb') as f:
+        f.write(_workbook_bytes(1))
+    _generation_elsewhere(db)
+
+    _upload(client, _workbook_bytes(3))
+    assert len(pd.read_excel(generation.EXCEL_FILE)) == 1
+    client.post('/delete-excel')
+    assert len(pd.read_excel(generation.EXCEL_FILE)) == 1
+    assert query('SELECT node, status FROM jobs') == [('other-node', 'running')]
+
+
+def test_upload_holds_the_generate_slot_then_runs_queued_generations(db, client, monkeypatch):
+    seen = []
+
+    def generate(payload):
+        seen.append(len(pd.read_excel(generation.EXCEL_FILE)))
+        return {}
+    monkeypatch.setitem(generation.jobs._handlers, 'generate', generate)
+
+    def put_bytes(key, data, put=app.storage.put_bytes):
+        # A generation submitted while the workbook is being replaced queues behind it
+        assert generation.jobs.submit('generate')['status'] == 'queued'
+        put(key, data)
+    monkeypatch.setattr(app.storage, 'put_bytes', put_bytes)
+
+    _upload(client, _workbook_bytes(3))
+
+    assert seen == [3]
+    assert query('SELECT payload, status FROM jobs ORDER BY id') == \
+        [('{"action": "upload-excel"}', 'done'), ('{}', 'done')]
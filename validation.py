@@ -0,0 +1,137 @@
+"""Pre-flight checks for the invoice workbook.
+
+Every check runs on whole columns at once, so a full report for a workbook
+of thousands of rows takes milliseconds. process_invoices refuses a workbook
+with errors before it allocates numbers, renders or inserts anything, and
+the dashboard refuses to upload one. Warnings are reported but do not block.
+
+Row numbers in the report are Excel row numbers (the header is row 1).
+"""
+import os
+
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Issued to', 'VAT Number', 'Invoice No:', 'Description', 'Quantity',
+                    'Total', 'Subtotal', 'Tax(19%)', 'Total.1']
+AMOUNT_COLUMNS = ['Total', 'Subtotal', 'Tax(19%)', 'Total.1']
+# 'VAT Number' is the issuer's own VAT (printed under "Issued by"); the
+# client's, when the sheet has it, is in one of these
+CLIENT_VAT_COLUMNS = ['Client VAT', 'Client VAT Number']
+
+# Optional two-letter country prefix, then 8-12 letters/digits (CY: 8 digits and a letter)
+VAT_PATTERN = os.environ.get('VAT_PATTERN', r'([A-Z]{2})?[0-9A-Z]{8,12}')
+# Subtotal + tax may differ from the total by this much (rounding in the sheet)
+TOTAL_TOLERANCE = 0.01
+
+
+class WorkbookInvalid(ValueError):
+    """The workbook failed validation; .report holds every problem found"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(format_report(report))
+
+
+def _numbers(column):
+    """Column as floats ('1,234.50', '€ 85' allowed), NaN where a cell is not a number"""
+    values = pd.to_numeric(column, errors='coerce')
+    # Only text cells need cleaning - numeric columns skip the string work entirely
+    text = values.isna() & column.notna()
+    if text.any():
+        cleaned = column[text].astype(str).str.replace(r'[,€\s]', '', regex=True)
+        values[text] = pd.to_numeric(cleaned, errors='coerce')
+    return values
+
+
+def _vat(column):
+    """VAT numbers upper-cased without spaces, dots or dashes; '' where blank"""
+    vat = column.astype(str).str.replace(r'[\s.\-]', '', regex=True).str.upper()
+    return vat.where(column.notna(), '')
+
+
+def _flag(problems, mask, column, message):
+    """Add one problem per row where mask is True; message may be a Series"""
+    for index in mask[mask].index:
+        problems.append({
+            'row': int(index) + 2,
+            'column': column,
+            'message': message[index] if isinstance(message, pd.Series) else message,
+        })
+
+
+def validate_workbook(df):
+    """Check the whole workbook, return {'rows', 'errors', 'warnings'}"""
+    report = {'rows': len(df), 'errors': [], 'warnings': []}
+    errors, warnings = report['errors'], report['warnings']
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        errors.extend({'row': 1, 'column': column, 'message': 'missing column'} for column in missing)
+        return report
+
+    # Positional index, so row numbers match the sheet
+    df = df.reset_index(drop=True)
+
+    issued = df['Issued to']
+    is_text = issued.map(lambda value: isinstance(value, str))
+    client = issued.where(is_text, '').astype(str).str.split('\n').str[0].str.strip()
+    _flag(errors, ~is_text, 'Issued to', 'must be text (client name, then address lines)')
+    _flag(errors, is_text & client.eq(''), 'Issued to', 'first line must be the client name')
+
+    first_row = pd.Series(df.index, index=df.index).groupby(client).transform('min') + 2
+    _flag(errors, client.ne('') & client.duplicated(), 'Issued to',
+          'same client as row ' + first_row.astype(str) + ' - their PDFs would overwrite each other')
+
+    number = df['Invoice No:'].astype(str).str.strip()
+    blank_number = df['Invoice No:'].isna() | number.eq('')
+    _flag(errors, ~blank_number & ~number.str.fullmatch(r'#?\d+'), 'Invoice No:',
+          'must be an invoice number like #12 (or empty)')
+
+    quantity = _numbers(df['Quantity'])
+    _flag(errors, ~(quantity > 0), 'Quantity', 'must be a positive number')
+
+    amounts = {column: _numbers(df[column]) for column in AMOUNT_COLUMNS}
+    for column, values in amounts.items():
+        _flag(errors, values.isna(), column, 'must be a number')
+        _flag(errors, values < 0, column, 'must not be negative')
+
+    difference = (amounts['Subtotal'] + amounts['Tax(19%)'] - amounts['Total.1']).abs()
+    _flag(errors, difference > TOTAL_TOLERANCE + 1e-9, 'Total.1',
+          'Subtotal + Tax(19%) is ' + (amounts['Subtotal'] + amounts['Tax(19%)']).map('{:.2f}'.format) +
+          ', not ' + amounts['Total.1'].map('{:.2f}'.format))
+
+    issuer_vat = _vat(df['VAT Number'])
+    _flag(errors, issuer_vat.eq(''), 'VAT Number', 'the issuer VAT number is missing')
+    _flag(errors, issuer_vat.ne('') & ~issuer_vat.str.fullmatch(VAT_PATTERN), 'VAT Number',
+          "'" + df['VAT Number'].astype(str) + "' is not a valid VAT number")
+    given = issuer_vat[issuer_vat.ne('')]
+    if given.nunique() > 1:
+        usual = given.mode().iloc[0]
+        _flag(warnings, issuer_vat.ne('') & issuer_vat.ne(usual), 'VAT Number',
+              "issuer VAT differs from '" + usual + "' on the other rows")
+
+    client_vat_column = next((column for column in CLIENT_VAT_COLUMNS if column in df.columns), None)
+    if client_vat_column:
+        client_vat = _vat(df[client_vat_column])
+        _flag(warnings, client_vat.eq(''), client_vat_column, 'no client VAT number')
+        _flag(errors, client_vat.ne('') & ~client_vat.str.fullmatch(VAT_PATTERN), client_vat_column,
+              "'" + df[client_vat_column].astype(str) + "' is not a valid VAT number")
+
+    errors.sort(key=lambda problem: problem['row'])
+    return report
+
+
+def check_workbook(df):
+    """Raise WorkbookInvalid if the workbook has errors, return the report otherwise"""
+    report = validate_workbook(df)
+    if report['errors']:
+        raise WorkbookInvalid(report)
+    return report
+
+
+def format_report(report, limit=5):
+    """One-line summary of the first few errors"""
+    errors = report['errors']
+    shown = '; '.join(f"row {e['row']} {e['column']}: {e['message']}" for e in errors[:limit])
+    more = f' (and {len(errors) - limit} more)' if len(errors) > limit else ''
+    return f"{len(errors)} problem(s) in the workbook - {shown}{more}"
@@ -0,0 +1,309 @@
+"""Command line entry point for batch work outside the web app.
+
+    python velvet.py generate [--workers 4] [--dry-run] [--incremental] [--output dir|zip|merged]
+    python velvet.py stats
+    python velvet.py reconcile statement.csv [--dry-run]
+    python velvet.py export [--file invoices.csv] [--format csv|ndjson|xlsx] [--start/--end/--status/--client]
+    python velvet.py bench pipeline|import|pdf [benchmark options]
+
+generate submits the same 'generate' job as the dashboard (see
+generation.py): it allocates numbers from the database, renders every PDF,
+then writes the invoice rows and publishes a batch that the dashboard
+serves. While another node is generating, the job queues behind it and the
+command waits, so it is safe to run from cron while the web app is up.
+--excel names the workbook by storage key (see storage.py), in dry runs too:
+the job may run on another node, which cannot read a local path.
+"""
+import argparse
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from logs import get_logger
+
+logger = get_logger('velvet')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Same locations the web app uses (generation.EXCEL_FILE / LOGO_PATH); the
+# workbook is a storage key, like every artifact the job reads or writes
+EXCEL_FILE = 'Anainvoices.xlsx'
+LOGO_PATH = 'image.jpg'
+
+BENCHMARKS = {
+    'pipeline': 'bench_pipeline.py',
+    'import': 'bench_import.py',
+    'pdf': 'bench_pdf_profiles.py',
+}
+
+
+# Seconds between checks on a job queued behind another node's generation
+JOB_POLL_INTERVAL = 1.0
+# Longest wait for a queued job: a dead node's job times out after
+# database.JOB_TIMEOUT, then ours still has to run
+JOB_WAIT_TIMEOUT = float(os.environ.get('JOB_WAIT_TIMEOUT', 3600))
+
+
+def storage_key(value):
+    """argparse type for --excel: a key relative to the storage root, not a filesystem path"""
+    key = value.replace('\\', '/')
+    if key.startswith('/') or ':' in key.split('/')[0] or '..' in key.split('/'):
+        raise argparse.ArgumentTypeError(
+            f"{value!r} is not a storage key - copy the workbook into the app folder (or bucket) "
+            "and pass its path relative to it")
+    return key
+
+
+def _wait_for_job(job, timeout=JOB_WAIT_TIMEOUT):
+    """Wait for a queued or running job until it is done or failed
+
+    Queued jobs are claimed here as soon as the running one finishes or has
+    run past database.JOB_TIMEOUT (claim_job fails it then), so a node that
+    died mid-generation cannot keep ours queued forever. Raises TimeoutError
+    after timeout seconds.
+    """
+    import jobs
+    from database import get_job
+
+    if job['status'] in ('queued', 'running'):
+        print(f"⏳ Another generation is running - job {job['id']} is queued and will run right after it")
+    deadline = time.monotonic() + timeout
+    while job['status'] in ('queued', 'running'):
+        if job['status'] == 'queued':
+            jobs.drain(job['kind'])
+            job = get_job(job['id'])
+            if job['status'] not in ('queued', 'running'):
+                break
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"job {job['id']} still {job['status']} after {timeout:.0f}s")
+        time.sleep(JOB_POLL_INTERVAL)
+        job = get_job(job['id'])
+    return job
+
+
+def generate(args):
+    """Generate invoices from the workbook through the same job as the dashboard"""
+    import generation  # noqa: F401 - registers the 'generate' job handler
+    import jobs
+    import storage
+    from database import ensure_schema
+    from invoice_generator import load_email_settings
+
+    if args.dry_run:
+        return dry_run(args)
+
+    if args.send_email and not load_email_settings():
+        print("❌ Email is not configured - set it up on the dashboard first")
+        return 1
+
+    if not storage.exists(args.excel):
+        print(f"❌ No workbook at storage key {args.excel!r}")
+        return 1
+
+    ensure_schema()
+    started = time.perf_counter()
+    payload = {
+        'send_email': args.send_email,
+        'pdf_profile': args.profile,
+        'workers': args.workers,
+        'incremental': args.incremental,
+        # Packaging and email need the PDFs, so the CLI always renders them in the job
+        'render_mode': 'inline',
+        'package': args.output if args.output != 'dir' else None,
+        'excel': args.excel,
+        'logo': args.logo,
+    }
+    try:
+        job = _wait_for_job(jobs.submit('generate', payload), args.wait)
+    except TimeoutError as e:
+        print(f"❌ Gave up waiting: {e} - the job stays queued and runs when the current generation ends")
+        return 1
+    if job['status'] == 'failed':
+        print(f"❌ Job {job['id']} failed: {job['error']}")
+        return 1
+
+    result = job['result']
+    if not result['generated']:
+        print("✅ Nothing to generate")
+        return 0
+
+    print(f"✅ Generated {result['generated']} invoice(s) into {result['batch']} "
+          f"in {time.perf_counter() - started:.1f}s")
+    if result.get('package'):
+        # The job may have run on another node - the package is in storage
+        package = args.out or os.path.basename(result['package'])
+        with storage.local_copies([result['package']]) as (local_file,):
+            shutil.copyfile(local_file, package)
+        print(f"📦 {package}")
+    if result.get('emailed_to'):
+        print(f"📧 Invoices sent to {result['emailed_to']}")
+    return 0
+
+
+def dry_run(args):
+    """Validate the workbook and time rendering without writing anything"""
+    import pandas as pd
+    import storage
+    from generation import render_parallel
+    from invoice_generator import build_invoice_data, invoice_pdf_filename, next_invoice_number
+    from validation import validate_workbook
+
+    timings = {}
+    if not storage.exists(args.excel):
+        print(f"❌ No workbook at storage key {args.excel!r}")
+        return 1
+
+    started = time.perf_counter()
+    # The same workbook the job would read
+    with storage.local_copies([args.excel]) as (excel_path,):
+        df = pd.read_excel(excel_path)
+    timings['excel_load'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    report = validate_workbook(df)
+    timings['validate'] = time.perf_counter() - started
+
+    today = datetime.now()
+    invoice_date, month = today.strftime('%d %B, %Y'), today.strftime('%B')
+    number = next_invoice_number(df)
+    bad_rows = {problem['row'] for problem in report['errors']}
+
+    with tempfile.TemporaryDirectory(prefix='velvet-dry-') as workdir:
+        tasks = []
+        for offset, (index, row) in enumerate(df.iterrows()):
+            if offset + 2 in bad_rows:
+                continue
+            data = build_invoice_data(row, number + offset, invoice_date, month)
+            # Unique names here - the real names may collide and must not hide rows
+            path = invoice_pdf_filename(workdir, data, month, f'{today.year}_{offset}')
+            tasks.append((data, path, args.logo, args.profile))
+
+        started = time.perf_counter()
+        render_parallel(tasks, args.workers)
+        timings['render'] = time.perf_counter() - started
+        total_bytes = sum(os.path.getsize(task[1]) for task in tasks)
+
+    print(f"🧪 Dry run: {len(df)} row(s), {len(tasks)} valid, {len(bad_rows)} with errors - nothing was written")
+    for stage, seconds in timings.items():
+        print(f"   {stage:<12} {seconds * 1000:8.1f} ms")
+    if tasks:
+        print(f"   {'pdf size':<12} {total_bytes / len(tasks) / 1024:8.1f} KB per invoice")
+    for problem in report['errors']:
+        print(f"   ❌ row {problem['row']} {problem['column']}: {problem['message']}")
+    for problem in report['warnings']:
+        print(f"   ⚠️  row {problem['row']} {problem['column']}: {problem['message']}")
+    return 1 if report['errors'] else 0
+
+
+def stats(args):
+    """Print invoice counts and amounts by status"""
+    from database import ensure_schema, get_invoice_stats
+
+    ensure_schema()
+    print(json.dumps(get_invoice_stats(), indent=2, default=str))
+    return 0
+
+
+def reconcile_statement(args):
+    """Mark invoices paid from a bank statement CSV"""
+    from database import ensure_schema
+    from reconcile import reconcile
+
+    ensure_schema()
+    with open(args.statement, encoding='utf-8-sig', newline='') as f:
+        result = reconcile(f, args.dry_run)
+
+    print(f"🏦 {result['transactions']} transaction(s): {len(result['matched'])} matched, "
+          f"{len(result['unmatched'])} unmatched, {result['updated']} invoice(s) marked paid")
+    for line in result['unmatched']:
+        print(f"   line {line['line']}: {line['amount']:.2f} {line['description']!r} - {line['reason']}")
+    return 0
+
+
+def export(args):
+    """Stream the invoice ledger as CSV, NDJSON or Excel"""
+    from database import ensure_schema
+    from export import ledger_filters, stream_ledger
+
+    ensure_schema()
+    filters = ledger_filters(vars(args))
+    if args.format == 'xlsx':
+        out = open(args.file, 'wb') if args.file else sys.stdout.buffer
+    else:
+        out = open(args.file, 'w', newline='', encoding='utf-8') if args.file else sys.stdout
+    try:
+        for chunk in stream_ledger(args.format, filters):
+            out.write(chunk)
+    finally:
+        if args.file:
+            out.close()
+    return 0
+
+
+def bench(args):
+    """Run one of the benchmark scripts with the remaining arguments"""
+    script = os.path.join(ROOT, 'benchmarks', BENCHMARKS[args.suite])
+    sys.argv = [script] + args.bench_args
+    runpy.run_path(script, run_name='__main__')
+    return 0
+
+
+def build_parser():
+    from database import VALID_STATUSES
+    from invoice_generator import PDF_PROFILE, PDF_PROFILES
+
+    parser = argparse.ArgumentParser(prog='velvet', description='Velvet Lavender invoicing')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='generate invoices from the workbook')
+    gen.add_argument('--excel', type=storage_key, default=EXCEL_FILE,
+                     help='workbook storage key, relative to the app folder or S3_PREFIX')
+    gen.add_argument('--logo', default=LOGO_PATH)
+    gen.add_argument('--workers', type=int, default=1, help='render processes')
+    gen.add_argument('--dry-run', action='store_true', help='validate and time rendering, write nothing')
+    gen.add_argument('--incremental', action='store_true',
+                     help='skip rows whose client already has an invoice this month')
+    gen.add_argument('--output', choices=['dir', 'zip', 'merged'], default='dir',
+                     help='also package the batch as one ZIP or one merged PDF')
+    gen.add_argument('--out', help='path of the ZIP / merged PDF')
+    gen.add_argument('--profile', choices=sorted(PDF_PROFILES), default=PDF_PROFILE)
+    gen.add_argument('--send-email', action='store_true', help='email the PDFs with the dashboard settings')
+    gen.add_argument('--wait', type=float, default=JOB_WAIT_TIMEOUT,
+                     help='seconds to wait behind another generation before giving up')
+    gen.set_defaults(func=generate)
+
+    commands.add_parser('stats', help='invoice totals by status').set_defaults(func=stats)
+
+    rec = commands.add_parser('reconcile', help='mark invoices paid from a bank statement')
+    rec.add_argument('statement', help='Revolut or Alpha Bank CSV export')
+    rec.add_argument('--dry-run', action='store_true', help='match only, do not update invoices')
+    rec.set_defaults(func=reconcile_statement)
+
+    exp = commands.add_parser('export', help='export the invoice ledger')
+    exp.add_argument('--file', help='write here instead of stdout')
+    exp.add_argument('--format', choices=['csv', 'ndjson', 'xlsx'], default='csv')
+    exp.add_argument('--start', help='first issue date, YYYY-MM-DD')
+    exp.add_argument('--end', help='last issue date, YYYY-MM-DD')
+    exp.add_argument('--status', choices=VALID_STATUSES)
+    exp.add_argument('--client', help='part of the client name')
+    exp.set_defaults(func=export)
+
+    ben = commands.add_parser('bench', help='run a benchmark suite')
+    ben.add_argument('suite', choices=sorted(BENCHMARKS))
+    ben.add_argument('bench_args', nargs=argparse.REMAINDER)
+    ben.set_defaults(func=bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Render worker: pull invoice render tasks from the database and store the PDFs.
+
+Run as many as needed, on any machine sharing the database and the storage
+backend (STORAGE_BACKEND=s3 when they are separate machines). The web app
+only queues tasks when RENDER_MODE=queue.
+
+Workers lease a few tasks at a time with SELECT ... FOR UPDATE SKIP LOCKED,
+so they never wait on each other and throughput grows with their number. A
+task whose worker dies is handed out again once its lease runs out, up to
+RENDER_MAX_ATTEMPTS times. The worker that finishes the last task of a batch
+publishes it, and emails it when the generation asked for that. A batch
+with tasks that failed for good is settled as partial or failed instead and
+stays unpublished until `--retry BATCH_ID` queues those tasks again.
+
+Usage:
+    python worker.py [--processes 4] [--prefetch 2] [--lease 120] [--once]
+    python worker.py --retry BATCH_ID
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from datetime import datetime
+
+import storage
+from batches import publish_batch
+from database import claim_render_tasks, complete_render_task, ensure_schema, fail_render_task, retry_render_batch
+from invoice_generator import create_invoice_pdf, load_email_settings, send_invoices_email
+from logs import get_logger, get_row_logger
+from metrics import stage_timer
+
+logger = get_logger(__name__)
+row_logger = get_row_logger(__name__)
+
+RENDER_LEASE_SECONDS = int(os.environ.get('RENDER_LEASE_SECONDS', 120))
+RENDER_PREFETCH = int(os.environ.get('RENDER_PREFETCH', 2))
+WORKER_IDLE_SLEEP = float(os.environ.get('WORKER_IDLE_SLEEP', 1.0))
+
+
+def render_task(task):
+    """Render one queued invoice with the job's PDF profile and store it under the task's output key"""
+    payload = task['payload']
+    key = task['output_key']
+
+    path = storage.local_path(key)
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A retried task may still be written by its first worker - never expose a partial file
+        with storage.atomic_path(path) as tmp_path:
+            create_invoice_pdf(payload['invoice'], tmp_path, payload['logo_path'], payload.get('pdf_profile'))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='velvet-render-') as workdir:
+        path = os.path.join(workdir, os.path.basename(key))
+        create_invoice_pdf(payload['invoice'], path, payload['logo_path'], payload.get('pdf_profile'))
+        storage.put_file(key, path)
+
+
+def _email_batch(batch):
+    """Send every PDF of a finished batch with the stored email settings"""
+    email_config = load_email_settings()
+    if not email_config:
+        logger.warning("Batch %s asked for email but no email configuration is stored", batch['batch_id'])
+        return
+
+    folder = f"{batch['output_root']}/batches/{batch['batch_id']}"
+    keys = [key for key in storage.list_keys(folder) if key.endswith('.pdf')]
+    today = datetime.now()
+    with storage.local_copies(keys) as pdf_files:
+        send_invoices_email(pdf_files, email_config['recipient_email'], f"{today.strftime('%B')} {today.year}",
+                            email_config)
+
+
+def _finish_batch(batch):
+    publish_batch(batch['output_root'], batch['batch_id'])
+    if batch['send_email']:
+        _email_batch(batch)
+
+
+def run_worker(name=None, prefetch=RENDER_PREFETCH, lease=RENDER_LEASE_SECONDS, once=False):
+    """Render tasks until stopped (or until the queue is empty with once), return tasks rendered"""
+    name = name or f'{socket.gethostname()}:{os.getpid()}'
+    ensure_schema()
+    rendered = 0
+    logger.info("Render worker %s started", name)
+
+    while True:
+        tasks = claim_render_tasks(name, prefetch, lease)
+        if not tasks:
+            if once:
+                return rendered
+            time.sleep(WORKER_IDLE_SLEEP)
+            continue
+
+        for task in tasks:
+            try:
+                with stage_timer('render'):
+                    render_task(task)
+            except Exception as e:
+                logger.exception("Render task %d failed (attempt %d)", task['id'], task['attempts'])
+                outcome = fail_render_task(task['id'], name, task['attempts'], str(e))
+                if outcome:
+                    logger.error("Render batch %s finished %s - see /api/render-batches/%s, "
+                                 "then python worker.py --retry %s", task['batch_id'], outcome,
+                                 task['batch_id'], task['batch_id'])
+                continue
+
+            rendered += 1
+            row_logger.info("Rendered %s", task['output_key'])
+            batch = complete_render_task(task['id'], name, task['attempts'])
+            if batch:
+                _finish_batch(batch)
+
+
+def _worker_process(prefetch, lease, once):
+    run_worker(prefetch=prefetch, lease=lease, once=once)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render queued invoices')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes on this machine')
+    parser.add_argument('--prefetch', type=int, default=RENDER_PREFETCH, help='tasks leased per claim')
+    parser.add_argument('--lease', type=int, default=RENDER_LEASE_SECONDS,
+                        help='seconds before a claimed task is handed to another worker')
+    parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+    parser.add_argument('--retry', metavar='BATCH_ID', help='queue the failed tasks of a batch again and exit')
+    args = parser.parse_args()
+
+    if args.retry:
+        ensure_schema()
+        print(f"🔁 {retry_render_batch(args.retry)} failed task(s) of batch {args.retry} queued again")
+    elif args.processes == 1:
+        run_worker(prefetch=args.prefetch, lease=args.lease, once=args.once)
+    else:
+        processes = [multiprocessing.Process(target=_worker_process, args=(args.prefetch, args.lease, args.once))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()